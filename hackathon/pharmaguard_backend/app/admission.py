@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import asyncio
+import os
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, Tuple
+
+from fastapi import HTTPException, status
+
+from .metrics import ADMISSION_REJECTIONS, timed_stage
+
+
+# Analyses allowed to run at once per server process; 0 disables the limit.
+ANALYZE_MAX_IN_FLIGHT = int(os.getenv("ANALYZE_MAX_IN_FLIGHT", "32"))
+# Requests allowed to wait for a slot, and for how long, before a 503.
+ANALYZE_QUEUE_DEPTH = int(os.getenv("ANALYZE_QUEUE_DEPTH", "64"))
+ANALYZE_QUEUE_TIMEOUT_SECONDS = float(
+    os.getenv("ANALYZE_QUEUE_TIMEOUT_SECONDS", "10")
+)
+ANALYZE_RETRY_AFTER_SECONDS = int(os.getenv("ANALYZE_RETRY_AFTER_SECONDS", "2"))
+
+
+class AdmissionController:
+    """
+    Bounds the analyses running at once and sheds load beyond that.
+
+    Up to `max_in_flight` requests run; the next `queue_depth` wait at most
+    `queue_timeout` seconds for a slot, and anything beyond is rejected at
+    once with a 503 and `Retry-After`. A finishing request hands its slot
+    straight to a waiter, deterministic ones (no LLM call to wait on) ahead
+    of LLM-bound ones, so cheap requests keep flowing while slow LLM calls
+    hold the rest.
+
+    All state lives on the event loop, so no lock is needed.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int,
+        queue_depth: int,
+        queue_timeout: float,
+        retry_after: int,
+    ) -> None:
+        self.max_in_flight = max_in_flight
+        self.queue_depth = queue_depth
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.in_flight = 0
+        # Waiters by priority: deterministic first, then LLM-bound.
+        self._waiters: Tuple[Deque[asyncio.Future], Deque[asyncio.Future]] = (
+            deque(),
+            deque(),
+        )
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_in_flight > 0
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters[0]) + len(self._waiters[1])
+
+    @asynccontextmanager
+    async def admit(self, deterministic: bool) -> AsyncIterator[None]:
+        """
+        Hold an analysis slot for the duration of the block.
+        """
+        if not self.enabled:
+            yield
+            return
+        with timed_stage("admission"):
+            await self._acquire(deterministic)
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def _acquire(self, deterministic: bool) -> None:
+        if self.in_flight < self.max_in_flight and not self.waiting:
+            self.in_flight += 1
+            self.admitted += 1
+            return
+        if self.waiting >= self.queue_depth:
+            self.rejected += 1
+            ADMISSION_REJECTIONS.inc(reason="queue_full")
+            raise self._busy()
+
+        waiter = asyncio.get_running_loop().create_future()
+        queue = self._waiters[0 if deterministic else 1]
+        queue.append(waiter)
+        self.queued += 1
+        try:
+            await asyncio.wait_for(waiter, timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            # A slot handed over just as the deadline passed is still taken.
+            if not (waiter.done() and not waiter.cancelled()):
+                self.timed_out += 1
+                ADMISSION_REJECTIONS.inc(reason="timeout")
+                raise self._busy() from None
+        except asyncio.CancelledError:
+            # The client went away; pass on a slot that was already ours.
+            if waiter.done() and not waiter.cancelled():
+                self._release()
+            raise
+        finally:
+            if not waiter.done() or waiter.cancelled():
+                try:
+                    queue.remove(waiter)
+                except ValueError:
+                    pass
+        self.admitted += 1
+
+    def _release(self) -> None:
+        for queue in self._waiters:
+            while queue:
+                waiter = queue.popleft()
+                if not waiter.done():
+                    # The slot moves to the waiter; in_flight is unchanged.
+                    waiter.set_result(None)
+                    return
+        self.in_flight -= 1
+
+    def _busy(self) -> HTTPException:
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail={"error": "Server is at capacity; retry shortly"},
+            headers={"Retry-After": str(self.retry_after)},
+        )
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "max_in_flight": self.max_in_flight,
+            "queue_depth": self.queue_depth,
+            "in_flight": self.in_flight,
+            "waiting_deterministic": len(self._waiters[0]),
+            "waiting_llm": len(self._waiters[1]),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
+
+
+analyze_admission = AdmissionController(
+    max_in_flight=ANALYZE_MAX_IN_FLIGHT,
+    queue_depth=ANALYZE_QUEUE_DEPTH,
+    queue_timeout=ANALYZE_QUEUE_TIMEOUT_SECONDS,
+    retry_after=ANALYZE_RETRY_AFTER_SECONDS,
+)
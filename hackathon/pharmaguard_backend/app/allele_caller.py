@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import AbstractSet, Dict, List, Optional, Sequence, Tuple
+
+from .gene_rules import construct_diplotype_from_alleles
+
+
+ALLELE_DEFINITIONS_PATH = Path(__file__).parent / "data" / "allele_definitions.json"
+
+# (rsid, position, alt, dosage) of one record; dosage is the number of
+# non-reference copies (0 for records the sample does not carry).
+Observation = Tuple[str, int, str, int]
+
+
+def _is_rs_number(rsid: str) -> bool:
+    return rsid.startswith("rs") and rsid[2:].isdigit()
+
+
+class GeneAlleleIndex:
+    """
+    Star-allele definitions of one gene, indexed for calling.
+
+    Every distinct defining variant gets a bit, and every allele is stored
+    as the bitset of its core variants. Variants are indexed by rsID and by
+    (position, alt), and each variant maps to the bitset of alleles that
+    use it. Calling therefore only touches the observed variants and the
+    alleles they can complete, however many alleles the gene defines.
+
+    Alleles are numbered by decreasing number of core variants, so scanning
+    candidate bits from the lowest up visits the most specific alleles first.
+    """
+
+    def __init__(
+        self, gene: str, reference: str, alleles: Dict[str, List[Dict[str, object]]]
+    ) -> None:
+        self.gene = gene
+        self.reference = reference
+
+        variant_bits: Dict[Tuple[Optional[str], int, Optional[str]], int] = {}
+        self._variant_rsids: List[Optional[str]] = []
+        self._by_rsid: Dict[str, int] = {}
+        self._by_position: Dict[Tuple[int, Optional[str]], int] = {}
+        # Records with an rsID of their own may only match, by position,
+        # variants defined without one.
+        self._by_position_unnamed: Dict[Tuple[int, Optional[str]], int] = {}
+
+        definitions: List[Tuple[str, int]] = []
+        for name, variants in alleles.items():
+            mask = 0
+            for variant in variants:
+                rsid = variant.get("rsid") or None
+                position = int(variant.get("position") or 0)
+                alt = variant.get("alt") or None
+                key = (rsid, position, alt)
+                bit = variant_bits.get(key)
+                if bit is None:
+                    bit = len(self._variant_rsids)
+                    variant_bits[key] = bit
+                    self._variant_rsids.append(rsid)
+                    if rsid:
+                        self._by_rsid[str(rsid)] = bit
+                    if position:
+                        self._by_position[(position, alt)] = bit
+                        if not rsid:
+                            self._by_position_unnamed[(position, alt)] = bit
+                mask |= 1 << bit
+            if mask:
+                definitions.append((name, mask))
+
+        definitions.sort(key=lambda item: -bin(item[1]).count("1"))
+        self.allele_names: List[str] = [name for name, _ in definitions]
+        self.allele_masks: List[int] = [mask for _, mask in definitions]
+        self._alleles_by_variant: List[int] = [0] * len(self._variant_rsids)
+        for allele, mask in enumerate(self.allele_masks):
+            while mask:
+                low = mask & -mask
+                self._alleles_by_variant[low.bit_length() - 1] |= 1 << allele
+                mask ^= low
+
+    def _variant_bit(self, rsid: str, position: int, alt: str) -> Optional[int]:
+        # Position lookup for records whose rsID is not in the table. Two
+        # different rsIDs at one position are different variants.
+        by_position = (
+            self._by_position_unnamed if _is_rs_number(rsid) else self._by_position
+        )
+        if not by_position:
+            return None
+        bit = by_position.get((position, alt))
+        if bit is None:
+            bit = by_position.get((position, None))
+        return bit
+
+    def call(
+        self,
+        observations: Sequence[Observation],
+        allowed: Optional[AbstractSet[str]] = None,
+    ) -> Tuple[List[Tuple[int, str]], List[int]]:
+        """
+        Call complete alleles (unphased) from carried records.
+
+        Complete alleles, i.e. those whose core variants were all observed,
+        are assigned most specific first, at most two; each assignment
+        consumes its variants, so a variant shared by nested definitions is
+        not counted twice. A record counts once whatever its dosage, as its
+        STAR annotation does. With `allowed`, other alleles are never
+        called.
+
+        Returns the called alleles, each with the index of its first
+        observation, and the indexes of the observations they leave
+        unexplained: records outside the definition table, and variants of
+        alleles that were only partly observed (or not allowed).
+        """
+        observed = 0
+        candidates = 0
+        by_rsid = self._by_rsid
+        alleles_by_variant = self._alleles_by_variant
+        has_positions = bool(self._by_position)
+        # Definition bit per observation: None outside the table; records
+        # that are not carried get a bit no allele uses.
+        bits: List[Optional[int]] = []
+        add_bit = bits.append
+        for rsid, position, alt, dosage in observations:
+            # Most records are looked up by rsID alone.
+            bit = by_rsid.get(rsid)
+            if bit is None and has_positions:
+                bit = self._variant_bit(rsid, position, alt)
+            if bit is None or dosage <= 0:
+                add_bit(None if dosage > 0 else len(alleles_by_variant))
+                continue
+            add_bit(bit)
+            observed |= 1 << bit
+            candidates |= alleles_by_variant[bit]
+
+        haplotypes: List[Tuple[int, str]] = []
+        remaining = observed
+        while candidates and len(haplotypes) < 2:
+            low = candidates & -candidates
+            candidates ^= low
+            allele = low.bit_length() - 1
+            mask = self.allele_masks[allele]
+            name = self.allele_names[allele]
+            if mask & ~remaining or (allowed is not None and name not in allowed):
+                continue
+            first = next(
+                i for i, bit in enumerate(bits) if bit is not None and mask >> bit & 1
+            )
+            haplotypes.append((first, name))
+            remaining &= ~mask
+
+        unexplained = [
+            i for i, bit in enumerate(bits) if bit is None or remaining >> bit & 1
+        ]
+        return haplotypes, unexplained
+
+
+def compile_allele_definitions(
+    table: Dict[str, object],
+) -> Tuple[str, Dict[str, GeneAlleleIndex]]:
+    """
+    Compile a definition table into per-gene indexes, plus its version.
+
+    Table format (see data/allele_definitions.json):
+        {
+          "version": "2024.1",
+          "genes": {
+            "CYP2D6": {
+              "reference_allele": "*1",
+              "alleles": {
+                "*4": [{"rsid": "rs3892097", "position": 42128945, "alt": "T"},
+                       ...],
+                ...
+              }
+            }
+          }
+        }
+
+    A variant needs an `rsid`, a `position` or both; `alt` is optional.
+    """
+    indexes: Dict[str, GeneAlleleIndex] = {}
+    genes = table.get("genes") or {}
+    for gene, spec in genes.items():  # type: ignore[union-attr]
+        gene = str(gene).upper()
+        indexes[gene] = GeneAlleleIndex(
+            gene, str(spec.get("reference_allele", "*1")), spec.get("alleles") or {}
+        )
+    return str(table.get("version", "unversioned")), indexes
+
+
+def load_allele_definitions(path: Path = ALLELE_DEFINITIONS_PATH) -> Dict[str, object]:
+    with open(path, "r", encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+ALLELE_DEFINITIONS_VERSION, _GENE_INDEXES = compile_allele_definitions(
+    load_allele_definitions()
+)
+
+
+def call_diplotype(
+    gene: str,
+    observations: Sequence[Observation],
+    stars: Sequence[str],
+    mapped: Optional[AbstractSet[str]] = None,
+) -> str:
+    """
+    Diplotype such as "*1/*4" of one gene's carried records; `stars` holds
+    the records' STAR annotations, parallel to `observations`.
+
+    An allele completed by the observed variants stands in for the records
+    it explains, at the place of the first one; the other records (all of
+    them when nothing is called, or the gene has no definitions) keep their
+    STAR annotations. With `mapped` (the alleles the phenotype table knows,
+    see `RuleSet.alleles_for`) only those alleles are called, so a
+    definition never turns a mappable annotation into an unmapped allele.
+    The diplotype is built from the list, in record order, as
+    `construct_diplotype_from_alleles` does.
+    """
+    index = _GENE_INDEXES.get(gene.upper())
+    if index is None:
+        return construct_diplotype_from_alleles(list(stars))
+    called, unexplained = index.call(observations, mapped)
+    alleles = sorted(called + [(i, stars[i]) for i in unexplained])
+    return construct_diplotype_from_alleles([allele for _, allele in alleles])
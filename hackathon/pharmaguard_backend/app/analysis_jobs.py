@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from fastapi import HTTPException, status
+
+from .metrics import RequestTimings, collect_stage_timings
+
+
+ANALYSIS_JOB_WORKERS = int(os.getenv("ANALYSIS_JOB_WORKERS", "2"))
+# Jobs allowed to wait for a worker; beyond this submissions get a 503.
+ANALYSIS_JOB_QUEUE_DEPTH = int(os.getenv("ANALYSIS_JOB_QUEUE_DEPTH", "64"))
+# Finished jobs are kept this long for polling.
+ANALYSIS_JOB_TTL_SECONDS = float(os.getenv("ANALYSIS_JOB_TTL_SECONDS", "3600"))
+ANALYSIS_JOB_MAX_ENTRIES = int(os.getenv("ANALYSIS_JOB_MAX_ENTRIES", "1000"))
+ANALYSIS_JOB_RETRY_AFTER_SECONDS = int(
+    os.getenv("ANALYSIS_JOB_RETRY_AFTER_SECONDS", "5")
+)
+
+JobRunner = Callable[[], Awaitable[Dict[str, object]]]
+
+
+class AnalysisJob:
+    """
+    One submitted analysis. `state` moves from "queued" to "running" to
+    "succeeded" (with `result`) or "failed" (with `error`); `timings` holds
+    the pipeline stages completed so far.
+    """
+
+    def __init__(
+        self, job_id: str, run: JobRunner, cleanup: Optional[Callable[[], None]]
+    ) -> None:
+        self.job_id = job_id
+        self.state = "queued"
+        self.submitted_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.timings: Optional[RequestTimings] = None
+        self.result: Optional[Dict[str, object]] = None
+        self.error: Optional[str] = None
+        self._run: Optional[JobRunner] = run
+        self._cleanup = cleanup
+
+    @property
+    def finished(self) -> bool:
+        return self.finished_at is not None
+
+    def stage_durations_ms(self) -> Dict[str, float]:
+        if self.timings is None:
+            return {}
+        return {
+            stage: round(seconds * 1000, 3)
+            for stage, seconds in self.timings.stages.items()
+        }
+
+    def _finish(self, state: str) -> None:
+        self.state = state
+        self.finished_at = time.monotonic()
+        self._run = None
+        if self._cleanup is not None:
+            self._cleanup()
+            self._cleanup = None
+
+
+class AnalysisJobQueue:
+    """
+    In-process queue of analyses run by a fixed number of worker tasks, so
+    large uploads and LLM calls finish outside the submitting request.
+
+    Workers are asyncio tasks started on the first submission; the CPU-bound
+    parsing inside each job still runs on the parse pool. At most
+    `queue_depth` jobs wait for a worker, after which `submit` fails fast
+    with a 503. Finished jobs are kept for `ttl_seconds` (and at most
+    `max_entries` jobs overall) so their results can be polled.
+    """
+
+    def __init__(
+        self, workers: int, queue_depth: int, ttl_seconds: float, max_entries: int
+    ) -> None:
+        self.workers = max(1, workers)
+        self.queue_depth = queue_depth
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._jobs: "OrderedDict[str, AnalysisJob]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue[AnalysisJob]] = None
+        self._worker_tasks: List[asyncio.Task] = []
+        self.running = 0
+        self.submitted = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def submit(
+        self, run: JobRunner, cleanup: Optional[Callable[[], None]] = None
+    ) -> AnalysisJob:
+        """
+        Queue `run` (a coroutine function returning the result payload).
+        `cleanup` is called once the job has finished, e.g. to remove its
+        spooled upload.
+        """
+        self._prune()
+        queue = self._ensure_workers()
+        if queue.qsize() >= self.queue_depth:
+            self.rejected += 1
+            if cleanup is not None:
+                cleanup()
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail={"error": "Too many queued analysis jobs; retry shortly"},
+                headers={"Retry-After": str(ANALYSIS_JOB_RETRY_AFTER_SECONDS)},
+            )
+        job = AnalysisJob(str(uuid.uuid4()), run, cleanup)
+        self._jobs[job.job_id] = job
+        queue.put_nowait(job)
+        self.submitted += 1
+        return job
+
+    def get(self, job_id: str) -> Optional[AnalysisJob]:
+        """
+        The job, or None if the id is unknown or its result has expired.
+        """
+        self._prune()
+        return self._jobs.get(job_id)
+
+    def _ensure_workers(self) -> asyncio.Queue[AnalysisJob]:
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        self._worker_tasks = [t for t in self._worker_tasks if not t.done()]
+        while len(self._worker_tasks) < self.workers:
+            self._worker_tasks.append(asyncio.create_task(self._work(self._queue)))
+        return self._queue
+
+    async def _work(self, queue: asyncio.Queue[AnalysisJob]) -> None:
+        while True:
+            job = await queue.get()
+            try:
+                await self._run_job(job)
+            finally:
+                queue.task_done()
+
+    async def _run_job(self, job: AnalysisJob) -> None:
+        run = job._run
+        if run is None:
+            return
+        job.state = "running"
+        self.running += 1
+        state = "failed"
+        try:
+            with collect_stage_timings() as timings:
+                job.timings = timings
+                job.result = await run()
+            state = "succeeded"
+        except HTTPException as exc:
+            detail = exc.detail
+            job.error = (
+                str(detail.get("error", detail))
+                if isinstance(detail, dict)
+                else str(detail)
+            )
+        except Exception:
+            job.error = "Internal analysis error"
+        finally:
+            self.running -= 1
+            # shutdown() may already have failed the job before its
+            # cancellation landed.
+            if not job.finished:
+                if state == "succeeded":
+                    self.succeeded += 1
+                else:
+                    self.failed += 1
+                    if job.error is None:
+                        job.error = "Analysis was cancelled"
+                job._finish(state)
+
+    def _prune(self) -> None:
+        # Jobs are kept in submission order; unfinished jobs at the front
+        # (bounded by workers plus queue depth) are never dropped.
+        cutoff = time.monotonic() - self.ttl_seconds
+        while self._jobs:
+            job = next(iter(self._jobs.values()))
+            if job.finished_at is None:
+                break
+            if job.finished_at > cutoff and len(self._jobs) < self.max_entries:
+                break
+            del self._jobs[job.job_id]
+
+    def shutdown(self) -> None:
+        """
+        Stop the workers; jobs still queued or running are marked failed.
+        """
+        for task in self._worker_tasks:
+            task.cancel()
+        self._worker_tasks = []
+        self._queue = None
+        for job in self._jobs.values():
+            if not job.finished:
+                job.error = "Server shut down before the analysis finished"
+                self.failed += 1
+                job._finish("failed")
+
+    def stats(self) -> Dict[str, object]:
+        queued = self._queue.qsize() if self._queue is not None else 0
+        return {
+            "workers": self.workers,
+            "queue_depth": self.queue_depth,
+            "queued": queued,
+            "running": self.running,
+            "size": len(self._jobs),
+            "submitted": self.submitted,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
+
+
+analysis_jobs = AnalysisJobQueue(
+    workers=ANALYSIS_JOB_WORKERS,
+    queue_depth=ANALYSIS_JOB_QUEUE_DEPTH,
+    ttl_seconds=ANALYSIS_JOB_TTL_SECONDS,
+    max_entries=ANALYSIS_JOB_MAX_ENTRIES,
+)
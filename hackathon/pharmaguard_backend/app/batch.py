@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import mmap
+import os
+import shutil
+import zipfile
+from contextlib import ExitStack
+from typing import TYPE_CHECKING, BinaryIO, Iterator, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+
+from .utils import (
+    VCF_STREAM_CHUNK_SIZE,
+    is_compressed_vcf_filename,
+    iter_vcf_file_chunks,
+)
+from .vcf_parser import (
+    VariantTable,
+    parse_vcf_buffer,
+    parse_vcf_lines,
+    screen_vcf_chunks,
+)
+
+if TYPE_CHECKING:
+    from concurrent.futures import Executor
+
+
+# Number of worker processes used to parse batch uploads (defaults to all cores).
+BATCH_PARSE_WORKERS = int(os.getenv("BATCH_PARSE_WORKERS", "0")) or os.cpu_count() or 1
+# VCFs allowed in one batch, counting each one inside a zip archive.
+BATCH_MAX_ENTRIES = int(os.getenv("BATCH_MAX_ENTRIES", "1000"))
+# Uncompressed bytes allowed per VCF and for the whole batch (0: no limit).
+BATCH_MAX_ENTRY_BYTES = int(os.getenv("BATCH_MAX_ENTRY_BYTES", str(1024**3)))
+BATCH_MAX_TOTAL_BYTES = int(os.getenv("BATCH_MAX_TOTAL_BYTES", str(8 * 1024**3)))
+
+# (filename, path of the spooled upload, zip member name or None)
+BatchEntry = Tuple[str, str, Optional[str]]
+# (filename, parse result, error, uncompressed bytes read)
+BatchResult = Tuple[str, Optional[Tuple[bool, VariantTable]], Optional[str], int]
+
+_executor: Optional[Executor] = None
+
+
+def get_batch_executor() -> Executor:
+    """
+    Return the shared batch parsing pool, creating it on first use.
+    Falls back to threads where process pools are unavailable (e.g. some
+    serverless runtimes without shared memory support).
+    """
+    global _executor
+    if _executor is None:
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+        try:
+            _executor = ProcessPoolExecutor(max_workers=BATCH_PARSE_WORKERS)
+        except (OSError, NotImplementedError):
+            _executor = ThreadPoolExecutor(max_workers=BATCH_PARSE_WORKERS)
+    return _executor
+
+
+def shutdown_batch_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _is_vcf_filename(filename: str) -> bool:
+    return filename.lower().endswith(".vcf") or is_compressed_vcf_filename(filename)
+
+
+def _batch_error(message: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST, detail={"error": message}
+    )
+
+
+def spool_batch_uploads(
+    uploads: List[Tuple[str, BinaryIO]], directory: str
+) -> List[BatchEntry]:
+    """
+    Copy uploaded files into `directory` and list the VCFs they hold: zip
+    archives contribute one entry per VCF member (read from the central
+    directory only), other files are one entry each.
+
+    Raises a 400 when the batch holds more than BATCH_MAX_ENTRIES VCFs or
+    the sizes known up front (plain files and zip members) already exceed
+    BATCH_MAX_TOTAL_BYTES; gzip streams are counted as they are read.
+    """
+    entries: List[BatchEntry] = []
+    known_bytes = 0
+    for n, (filename, fileobj) in enumerate(uploads):
+        path = os.path.join(directory, str(n))
+        fileobj.seek(0)
+        with open(path, "wb") as out:
+            shutil.copyfileobj(fileobj, out, VCF_STREAM_CHUNK_SIZE)
+
+        members: List[Tuple[str, Optional[str], int]] = []
+        if filename.lower().endswith(".zip") and zipfile.is_zipfile(path):
+            with zipfile.ZipFile(path) as archive:
+                for info in archive.infolist():
+                    if info.is_dir() or not _is_vcf_filename(info.filename):
+                        continue
+                    if len(entries) + len(members) >= BATCH_MAX_ENTRIES:
+                        raise _batch_error(
+                            f"Batch holds more than {BATCH_MAX_ENTRIES} VCF files"
+                        )
+                    members.append((info.filename, info.filename, info.file_size))
+        else:
+            members.append((filename, None, os.path.getsize(path)))
+
+        for name, member, size in members:
+            if len(entries) >= BATCH_MAX_ENTRIES:
+                raise _batch_error(
+                    f"Batch holds more than {BATCH_MAX_ENTRIES} VCF files"
+                )
+            if not is_compressed_vcf_filename(name):
+                known_bytes += size
+            if BATCH_MAX_TOTAL_BYTES and known_bytes > BATCH_MAX_TOTAL_BYTES:
+                raise _batch_error("Batch exceeds the total size limit")
+            entries.append((name, path, member))
+    return entries
+
+
+def _parse_entry_stream(
+    stream: BinaryIO, compressed: bool, in_zip: bool
+) -> Tuple[Tuple[bool, VariantTable], int]:
+    if not compressed and not in_zip:
+        # Plain spooled files are screened in place, as for /analyze.
+        size = os.fstat(stream.fileno()).st_size
+        if BATCH_MAX_ENTRY_BYTES and size > BATCH_MAX_ENTRY_BYTES:
+            raise _batch_error("VCF file exceeds configured size limit")
+        if not size:
+            raise _batch_error("VCF file is empty")
+        with mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            return parse_vcf_buffer(buf), size
+
+    read = 0
+
+    def counted(chunks: Iterator[bytes]) -> Iterator[bytes]:
+        nonlocal read
+        for chunk in chunks:
+            read += len(chunk)
+            yield chunk
+
+    chunks = iter_vcf_file_chunks(stream, compressed, max_bytes=BATCH_MAX_ENTRY_BYTES)
+    return parse_vcf_lines(screen_vcf_chunks(counted(chunks))), read
+
+
+def parse_batch_vcf(filename: str, path: str, member: Optional[str]) -> BatchResult:
+    """
+    Parse one patient VCF inside a worker process, streaming it from the
+    spooled upload at `path` (or its zip `member`) so a compressed entry is
+    never decompressed into memory as a whole.
+
+    Errors are returned as plain strings because HTTPException does not
+    round-trip through pickling.
+    """
+    if not _is_vcf_filename(filename):
+        return filename, None, "Uploaded file must be a VCF file", 0
+
+    try:
+        with ExitStack() as stack:
+            stream: BinaryIO = stack.enter_context(open(path, "rb"))
+            if member is not None:
+                archive = stack.enter_context(zipfile.ZipFile(stream))
+                stream = stack.enter_context(archive.open(member))  # type: ignore
+            parsed, read = _parse_entry_stream(
+                stream, is_compressed_vcf_filename(filename), member is not None
+            )
+        return filename, parsed, None, read
+    except HTTPException as exc:
+        detail = exc.detail
+        if isinstance(detail, dict):
+            detail = detail.get("error", str(detail))
+        return filename, None, str(detail), 0
+    except (OSError, EOFError, zipfile.BadZipFile):
+        return filename, None, "Invalid compressed VCF file", 0
+    except Exception:  # pragma: no cover - defensive
+        return filename, None, "Internal VCF parsing error", 0
@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from fastapi import HTTPException, status
+
+from .allele_caller import Observation, call_diplotype
+from .gene_rules import SUPPORTED_GENES
+from .risk_engine import assess_risk_bulk
+from .rule_set import RuleSet, active_rules
+from .vcf_parser import _parse_info_field, genotype_dosage, parse_position
+
+
+@dataclass
+class CohortGenotypes:
+    """
+    Pharmacogene records of a multi-sample VCF.
+
+    `carriers` is a (variants × samples) uint8 matrix of allele dosages:
+    1 or 2 where the sample carries the variant (same rule as the
+    single-sample parser), else 0. Row metadata (gene, rsid, star,
+    position, alt) is kept in parallel lists in file order.
+    """
+
+    sample_ids: List[str]
+    genes: List[str]
+    rsids: List[str]
+    stars: List[str]
+    carriers: np.ndarray
+    positions: List[int]
+    alts: List[str]
+
+    def gene_rows(self, gene: str) -> np.ndarray:
+        return np.flatnonzero(np.asarray(self.genes, dtype=object) == gene)
+
+
+@dataclass
+class CohortPhenotypes:
+    """
+    Per-sample diplotype/phenotype for one gene, stored as codes into small
+    lookup lists so each distinct diplotype is only mapped once.
+    """
+
+    gene: str
+    diplotypes: List[str]
+    phenotypes: List[str]
+    codes: np.ndarray
+
+    def diplotype_of(self, sample_index: int) -> str:
+        return self.diplotypes[int(self.codes[sample_index])]
+
+    def phenotype_of(self, sample_index: int) -> str:
+        return self.phenotypes[int(self.codes[sample_index])]
+
+
+def parse_vcf_cohort_lines(lines: Iterable[str]) -> CohortGenotypes:
+    """
+    Parse all sample columns of a VCF into a genotype carrier matrix,
+    keeping only records annotated with a supported gene and star allele.
+    """
+    sample_ids: List[str] = []
+    has_header = False
+    genes: List[str] = []
+    rsids: List[str] = []
+    stars: List[str] = []
+    positions: List[int] = []
+    alts: List[str] = []
+    rows: List[bytes] = []
+
+    for line in lines:
+        if not line:
+            continue
+        if line.startswith("#"):
+            if line.startswith("#CHROM"):
+                has_header = True
+                sample_ids = line.split("\t")[9:]
+            continue
+
+        cols = line.split("\t")
+        if len(cols) < 10:
+            continue
+
+        info_dict = _parse_info_field(cols[7].strip())
+        gene = info_dict.get("GENE")
+        star = info_dict.get("STAR")
+        if not gene or not star:
+            continue
+        gene = gene.upper()
+        if gene not in SUPPORTED_GENES:
+            continue
+
+        rsid = info_dict.get("RS") or cols[2].strip()
+        if not rsid or rsid == ".":
+            rsid = "unknown"
+
+        sample_cols = cols[9:]
+        if len(sample_cols) != len(sample_ids):
+            # Pad/truncate malformed rows to the header's sample count.
+            sample_cols = (sample_cols + ["./."] * len(sample_ids))[: len(sample_ids)]
+
+        rows.append(
+            bytes(genotype_dosage(sample.split(":")[0]) for sample in sample_cols)
+        )
+        genes.append(gene)
+        rsids.append(rsid)
+        stars.append(star)
+        positions.append(parse_position(cols[1]))
+        alts.append(cols[4].strip().split(",", 1)[0])
+
+    if not has_header:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"error": "Invalid VCF: missing #CHROM header"},
+        )
+    if not sample_ids:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"error": "VCF has no sample columns"},
+        )
+
+    carriers = np.frombuffer(b"".join(rows), dtype=np.uint8).reshape(
+        len(rows), len(sample_ids)
+    )
+    return CohortGenotypes(
+        sample_ids=sample_ids,
+        genes=genes,
+        rsids=rsids,
+        stars=stars,
+        carriers=carriers,
+        positions=positions,
+        alts=alts,
+    )
+
+
+def determine_cohort_phenotypes(
+    gene: str, cohort: CohortGenotypes, rules: Optional[RuleSet] = None
+) -> CohortPhenotypes:
+    """
+    Vectorized equivalent of `determine_gene_phenotype` over every sample.
+
+    Samples are grouped by their genotype pattern over the gene's records
+    and each distinct pattern is called once (see `call_diplotype`), so the
+    cost grows with the number of distinct patterns, not samples.
+    """
+    rules = rules or active_rules()
+    gene = gene.upper()
+    n_samples = len(cohort.sample_ids)
+    rows = cohort.gene_rows(gene).tolist()
+    if not rows:
+        diplotype = "*1/*1"
+        return CohortPhenotypes(
+            gene=gene,
+            diplotypes=[diplotype],
+            phenotypes=[rules.phenotype_for(gene, diplotype)[0]],
+            codes=np.zeros(n_samples, dtype=np.int64),
+        )
+
+    mapped = rules.alleles_for(gene)
+    patterns, pattern_codes = np.unique(
+        cohort.carriers[rows].T, axis=0, return_inverse=True
+    )
+    diplotypes: List[str] = []
+    phenotypes: List[str] = []
+    diplotype_codes: Dict[str, int] = {}
+    pattern_to_code: List[int] = []
+    for pattern in patterns.tolist():
+        carried = [(row, dosage) for row, dosage in zip(rows, pattern) if dosage]
+        observations: List[Observation] = [
+            (cohort.rsids[row], cohort.positions[row], cohort.alts[row], dosage)
+            for row, dosage in carried
+        ]
+        stars = [cohort.stars[row] for row, _dosage in carried]
+        diplotype = call_diplotype(gene, observations, stars, mapped)
+        code = diplotype_codes.get(diplotype)
+        if code is None:
+            code = diplotype_codes[diplotype] = len(diplotypes)
+            phenotype, _description = rules.phenotype_for(gene, diplotype)
+            diplotypes.append(diplotype)
+            phenotypes.append(phenotype)
+        pattern_to_code.append(code)
+
+    return CohortPhenotypes(
+        gene=gene,
+        diplotypes=diplotypes,
+        phenotypes=phenotypes,
+        codes=np.asarray(pattern_to_code, dtype=np.int64)[pattern_codes.reshape(-1)],
+    )
+
+
+def assess_cohort_risk(
+    drug: str, phenotypes: CohortPhenotypes, rules: Optional[RuleSet] = None
+) -> List[Dict[str, object]]:
+    """
+    Risk assessment per distinct phenotype code; index with
+    `phenotypes.codes[sample]` to get a sample's result.
+    """
+    names = phenotypes.phenotypes
+    scored = assess_risk_bulk([drug] * len(names), names, rules or active_rules())
+    return [
+        {column: values[i] for column, values in scored.items()}
+        for i in range(len(names))
+    ]
+
+
+def carried_rsids_by_sample(
+    gene: str, cohort: CohortGenotypes
+) -> Tuple[np.ndarray, List[List[str]]]:
+    """
+    Return per-sample counts of carried variants across all supported genes,
+    and the rsids each sample carries for `gene`.
+    """
+    total_counts = np.count_nonzero(cohort.carriers, axis=0).astype(np.int64)
+
+    rows = cohort.gene_rows(gene.upper())
+    gene_rsids: List[List[str]] = [[] for _ in cohort.sample_ids]
+    if len(rows):
+        # Transposed so hits come out grouped by sample, rows in file order.
+        sample_idx, row_idx = np.nonzero(cohort.carriers[rows].T)
+        for sample, row in zip(sample_idx.tolist(), row_idx.tolist()):
+            gene_rsids[sample].append(cohort.rsids[rows[row]])
+    return total_counts, gene_rsids
@@ -1,21 +1,16 @@
 from __future__ import annotations
 
-from typing import Dict, Optional
+from typing import Optional
 
+from .rule_set import RuleSet, active_rules
 
-DRUG_TO_GENE: Dict[str, str] = {
-    "CODEINE": "CYP2D6",
-    "CLOPIDOGREL": "CYP2C19",
-    "WARFARIN": "CYP2C9",
-    "SIMVASTATIN": "SLCO1B1",
-    "AZATHIOPRINE": "TPMT",
-    "FLUOROURACIL": "DPYD",
-}
 
+# The drug → gene table is part of the versioned rule set
+# (data/rule_tables.json); see `rule_set`.
 
-def map_drug_to_gene(drug_name: str) -> Optional[str]:
+
+def map_drug_to_gene(drug_name: str, rules: Optional[RuleSet] = None) -> Optional[str]:
     """
     Map a (normalized, uppercase) drug name to its primary pharmacogene.
     """
-    return DRUG_TO_GENE.get(drug_name.upper())
-
+    return (rules or active_rules()).gene_for_drug(drug_name)
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+
+ExplanationKey = Tuple[str, str, str, str, str]
+CacheEntry = Tuple[float, Dict[str, str]]
+
+
+class ExplanationCache:
+    """
+    Bounded LRU cache for LLM explanations with per-entry TTL.
+
+    Keys are (model, gene, diplotype, phenotype, drug). When `path` is set,
+    the cache is loaded from and written back to a local JSON file so
+    entries survive restarts. Expiry uses wall-clock time for the same reason.
+
+    Puts only mark the cache dirty. A timer thread writes the file
+    `flush_seconds` after the first unsaved put, so a burst of puts costs
+    one write and none of them blocks the caller; `flush` writes any
+    remaining changes at shutdown.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        ttl_seconds: float = 7 * 24 * 3600,
+        path: Optional[str] = None,
+        flush_seconds: float = 5.0,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.path = path
+        self.flush_seconds = flush_seconds
+        self._entries: "OrderedDict[ExplanationKey, CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._dirty = False
+        self._flush_timer: Optional[threading.Timer] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        if self.path:
+            self._load()
+
+    @staticmethod
+    def make_key(
+        model: str, gene: str, diplotype: str, phenotype: str, drug: str
+    ) -> ExplanationKey:
+        return (model, gene.upper(), diplotype, phenotype, drug.upper())
+
+    def get(self, key: ExplanationKey) -> Optional[Dict[str, str]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, value = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(value)
+
+    def put(self, key: ExplanationKey, value: Dict[str, str]) -> None:
+        if self.max_entries <= 0:
+            return
+
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl_seconds, dict(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            if self.path:
+                self._dirty = True
+                if self._flush_timer is None:
+                    self._flush_timer = threading.Timer(self.flush_seconds, self.flush)
+                    self._flush_timer.daemon = True
+                    self._flush_timer.start()
+
+    def flush(self) -> None:
+        """Write unsaved entries to `path` (blocking; keep off the event loop)."""
+        with self._save_lock:
+            with self._lock:
+                if self._flush_timer is not None:
+                    self._flush_timer.cancel()
+                    self._flush_timer = None
+                if not self._dirty:
+                    return
+                self._dirty = False
+                snapshot = list(self._entries.items())
+            self._save(snapshot)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as fh:
+                raw = json.load(fh)
+        except (OSError, ValueError):
+            return
+
+        now = time.time()
+        for item in raw if isinstance(raw, list) else []:
+            try:
+                key = tuple(item["key"])
+                expires_at = float(item["expires_at"])
+                value = dict(item["value"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            if len(key) == 5 and expires_at > now:
+                self._entries[key] = (expires_at, value)  # type: ignore[index]
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _save(self, snapshot: List[Tuple[ExplanationKey, CacheEntry]]) -> None:
+        payload = [
+            {"key": list(key), "expires_at": expires_at, "value": value}
+            for key, (expires_at, value) in snapshot
+        ]
+        directory = os.path.dirname(os.path.abspath(self.path))
+        try:
+            # Write-then-rename so a crash never leaves a truncated cache file.
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                json.dump(payload, fh)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            # Persistence is best-effort; the in-memory cache stays valid.
+            pass
+
+
+explanation_cache = ExplanationCache(
+    max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "512")),
+    ttl_seconds=float(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600))),
+    path=os.getenv("LLM_CACHE_PATH") or None,
+    flush_seconds=float(os.getenv("LLM_CACHE_FLUSH_SECONDS", "5")),
+)
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from .explanation_cache import ExplanationKey
+from .llm_service import explanation_key, fallback_explanation, generate_explanation
+
+
+# Finished (or abandoned) explanations are kept this long for polling.
+EXPLANATION_JOB_TTL_SECONDS = float(os.getenv("EXPLANATION_JOB_TTL_SECONDS", "600"))
+EXPLANATION_JOB_MAX_ENTRIES = int(os.getenv("EXPLANATION_JOB_MAX_ENTRIES", "1000"))
+
+
+class _Job(NamedTuple):
+    created_at: float
+    key: ExplanationKey
+    args: Tuple[str, str, str, str]  # gene, diplotype, phenotype, drug
+    task: "asyncio.Task[Dict[str, str]]"
+
+
+async def _explain(
+    gene: str, diplotype: str, phenotype: str, drug: str
+) -> Dict[str, str]:
+    try:
+        return await generate_explanation(
+            gene=gene, diplotype=diplotype, phenotype=phenotype, drug=drug
+        )
+    except Exception:
+        # Nobody awaits the task inline: report the template, not a 500.
+        return fallback_explanation("job_failed", gene, diplotype, phenotype, drug)
+
+
+class ExplanationJobStore:
+    """
+    In-process registry of explanations generated in the background after
+    `/analyze` has already returned its deterministic result.
+
+    Identical requests (same explanation-cache key) submitted while a job
+    is still running share that job, so a burst makes one LLM call. A job
+    whose task failed or was cancelled reports the static template, as a
+    failed inline LLM call would.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._jobs: "OrderedDict[str, _Job]" = OrderedDict()
+        self._running: Dict[ExplanationKey, str] = {}
+
+    def submit(self, gene: str, diplotype: str, phenotype: str, drug: str) -> str:
+        self._prune()
+        key = explanation_key(gene, diplotype, phenotype, drug)
+        job_id = self._running.get(key)
+        if job_id is not None and not self._jobs[job_id].task.done():
+            return job_id
+        job_id = str(uuid.uuid4())
+        args = (gene, diplotype, phenotype, drug)
+        task = asyncio.create_task(_explain(*args))
+        self._jobs[job_id] = _Job(time.monotonic(), key, args, task)
+        self._running[key] = job_id
+        return job_id
+
+    def status(self, job_id: str) -> Optional[Tuple[str, Optional[Dict[str, str]]]]:
+        """
+        Return ("pending", None) or ("ready", explanation), or None if the
+        id is unknown or expired.
+        """
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        if not job.task.done():
+            return "pending", None
+        return "ready", self._outcome(job)
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[Dict[str, str]]:
+        """
+        Wait up to `timeout` seconds for an explanation; None if still pending.
+        """
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        try:
+            await asyncio.wait_for(asyncio.shield(job.task), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+        except asyncio.CancelledError:
+            # The job was pruned while we waited; our own caller is fine.
+            if not job.task.cancelled():
+                raise
+            if job_id not in self._jobs:
+                return None
+        return self._outcome(job)
+
+    @staticmethod
+    def _outcome(job: _Job) -> Dict[str, str]:
+        # Callers check that the task is done; `_explain` never raises, but
+        # a task cancelled before it ran (e.g. at shutdown) has no result.
+        if job.task.cancelled():
+            return fallback_explanation("job_failed", *job.args)
+        return job.task.result()
+
+    def _prune(self) -> None:
+        cutoff = time.monotonic() - self.ttl_seconds
+        while self._jobs:
+            job_id, job = next(iter(self._jobs.items()))
+            if job.created_at > cutoff and len(self._jobs) < self.max_entries:
+                break
+            if not job.task.done():
+                job.task.cancel()
+            del self._jobs[job_id]
+            if self._running.get(job.key) == job_id:
+                del self._running[job.key]
+
+
+explanation_jobs = ExplanationJobStore(
+    ttl_seconds=EXPLANATION_JOB_TTL_SECONDS,
+    max_entries=EXPLANATION_JOB_MAX_ENTRIES,
+)
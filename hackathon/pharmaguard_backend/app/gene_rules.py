@@ -13,62 +13,26 @@ SUPPORTED_GENES: List[str] = [
 ]
 
 
-# Diplotype → phenotype mappings (minimal, deterministic examples)
-# Phenotype codes:
-# PM = Poor Metabolizer
-# IM = Intermediate Metabolizer
-# NM = Normal Metabolizer
-# RM = Rapid Metabolizer
-# URM = Ultra Rapid Metabolizer
-
-GENE_DIPLOTYPE_TO_PHENOTYPE: Dict[str, Dict[str, str]] = {
-    "CYP2C19": {
-        "*1/*1": "NM",
-        "*1/*2": "IM",
-        "*2/*2": "PM",
-        "*1/*17": "RM",
-        "*17/*17": "URM",
-    },
-    "CYP2D6": {
-        "*1/*1": "NM",
-        "*1/*2": "NM",
-        "*2/*2": "RM",
-        "*4/*4": "PM",
-        "*1/*4": "IM",
-    },
-    "CYP2C9": {
-        "*1/*1": "NM",
-        "*1/*2": "IM",
-        "*1/*3": "IM",
-        "*2/*2": "PM",
-        "*3/*3": "PM",
-    },
-    "SLCO1B1": {
-        "*1/*1": "NM",
-        "*1/*5": "IM",
-        "*5/*5": "PM",
-    },
-    "TPMT": {
-        "*1/*1": "NM",
-        "*1/*3A": "IM",
-        "*3A/*3A": "PM",
-    },
-    "DPYD": {
-        "*1/*1": "NM",
-        "*1/*2A": "IM",
-        "*2A/*2A": "PM",
-    },
+# Genomic loci of the supported pharmacogenes (GRCh38, 1-based inclusive).
+# Used to query only these regions from bgzipped, tabix-indexed VCFs.
+# Contig names are given without a "chr" prefix; both styles are resolved.
+PHARMACOGENE_LOCI: Dict[str, Tuple[str, int, int]] = {
+    "CYP2D6": ("22", 42126499, 42130881),
+    "CYP2C19": ("10", 94762681, 94855547),
+    "CYP2C9": ("10", 94938658, 94989390),
+    "SLCO1B1": ("12", 21128193, 21239796),
+    "TPMT": ("6", 18128311, 18155305),
+    "DPYD": ("1", 97077743, 97921049),
 }
 
+# Flanking bases added on each side of a locus so upstream/promoter
+# variants (e.g. CYP2C19*17) are included in region queries.
+PHARMACOGENE_LOCUS_FLANK = 10_000
 
-# Optional full phenotype descriptions if needed elsewhere.
-PHENOTYPE_DESCRIPTIONS: Dict[str, str] = {
-    "PM": "Poor Metabolizer",
-    "IM": "Intermediate Metabolizer",
-    "NM": "Normal Metabolizer",
-    "RM": "Rapid Metabolizer",
-    "URM": "Ultra Rapid Metabolizer",
-}
+
+# Diplotype → phenotype mappings, phenotype descriptions and the drug
+# tables live in the versioned rule set (data/rule_tables.json); see
+# `rule_set`.
 
 
 # gene_rules.py - Improved allele selection
@@ -87,27 +51,3 @@ def construct_diplotype_from_alleles(alleles: List[str]) -> str:
     # Sort to ensure *2/*4 is the same as *4/*2
     first_two = sorted(variants[:2])
     return f"{first_two[0]}/{first_two[1]}"
-
-
-def map_diplotype_to_phenotype(gene: str, diplotype: str) -> Tuple[str, str]:
-    """
-    Map (gene, diplotype) to a phenotype code.
-
-    Returns:
-        (phenotype_code, description)
-    """
-    gene = gene.upper()
-    mapping = GENE_DIPLOTYPE_TO_PHENOTYPE.get(gene, {})
-    phenotype = mapping.get(diplotype)
-
-    if phenotype is None:
-        # Fallback: assume normal metabolism for default diplotype,
-        # otherwise mark as Unknown.
-        if diplotype == "*1/*1":
-            phenotype = "NM"
-        else:
-            phenotype = "Unknown"
-
-    description = PHENOTYPE_DESCRIPTIONS.get(phenotype, "Unknown phenotype")
-    return phenotype, description
-
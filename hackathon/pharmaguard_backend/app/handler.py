@@ -1,5 +1,7 @@
 from mangum import Mangum
 from.main import app # Import your FastAPI app instance
 
-# This is the entry point for Netlify
-handler = Mangum(app)
\ No newline at end of file
+# This is the entry point for Netlify.
+# Lifespan events are off: Mangum would otherwise run startup/shutdown on every
+# invocation, tearing down the pooled LLM client between warm requests.
+handler = Mangum(app, lifespan="off")
@@ -1,9 +1,137 @@
 from __future__ import annotations
 
+import asyncio
+import importlib.util
 import os
-from typing import Dict
+import time
+from typing import TYPE_CHECKING, Dict, Optional
 
-import httpx
+from .explanation_cache import ExplanationKey, explanation_cache
+from .metrics import LLM_FALLBACKS, timed_stage
+
+if TYPE_CHECKING:
+    import httpx
+
+
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "20"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "10"))
+LLM_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("LLM_KEEPALIVE_EXPIRY_SECONDS", "30"))
+
+# At most this many LLM calls run at once; callers wait up to
+# LLM_ACQUIRE_TIMEOUT_SECONDS for a slot before using the static template.
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_ACQUIRE_TIMEOUT_SECONDS = float(os.getenv("LLM_ACQUIRE_TIMEOUT_SECONDS", "5"))
+
+LLM_BREAKER_FAILURE_THRESHOLD = int(os.getenv("LLM_BREAKER_FAILURE_THRESHOLD", "5"))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    After `failure_threshold` failures in a row the circuit opens and calls
+    are refused for `reset_seconds`; then a single probe call is allowed
+    (half-open) and its outcome closes or re-opens the circuit. A probe
+    that ends without an outcome (cancelled, or never sent) must call
+    `abort_probe` so the next probe is allowed after another reset period.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.rejected_calls = 0
+
+    def allow_request(self) -> bool:
+        if self.state == "closed":
+            return True
+        elapsed = time.monotonic() - self.opened_at
+        if self.state == "open" and elapsed >= self.reset_seconds:
+            self.state = "half_open"
+            return True
+        # Open, or half-open with the probe call still in flight.
+        self.rejected_calls += 1
+        return False
+
+    def record_success(self) -> None:
+        self.state = "closed"
+        self.consecutive_failures = 0
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        tripped = self.consecutive_failures >= self.failure_threshold
+        if self.state == "half_open" or tripped:
+            self._open()
+
+    def abort_probe(self) -> None:
+        if self.state == "half_open":
+            self._open()
+
+    def _open(self) -> None:
+        self.state = "open"
+        self.opened_at = time.monotonic()
+
+
+_client: Optional[httpx.AsyncClient] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+_breaker = CircuitBreaker(LLM_BREAKER_FAILURE_THRESHOLD, LLM_BREAKER_RESET_SECONDS)
+
+
+def _http2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+
+async def start_llm_client() -> None:
+    """
+    Create the app-scoped pooled HTTP client. Called from the FastAPI
+    lifespan hook outside serverless runtimes; `_get_client` also creates it
+    lazily on the first LLM call.
+    """
+    global _client, _semaphore
+    if _client is None:
+        # Imported here so cold starts that never reach the LLM skip httpx.
+        import httpx
+
+        _client = httpx.AsyncClient(
+            timeout=LLM_TIMEOUT_SECONDS,
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=LLM_KEEPALIVE_EXPIRY_SECONDS,
+            ),
+            http2=_http2_available(),
+        )
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+
+
+async def close_llm_client() -> None:
+    global _client, _semaphore
+    if _client is not None:
+        await _client.aclose()
+    _client = None
+    _semaphore = None
+
+
+async def _get_client() -> httpx.AsyncClient:
+    if _client is None:
+        await start_llm_client()
+    assert _client is not None
+    return _client
+
+
+def llm_client_stats() -> Dict[str, object]:
+    return {
+        "circuit_state": _breaker.state,
+        "consecutive_failures": _breaker.consecutive_failures,
+        "rejected_calls": _breaker.rejected_calls,
+        "max_concurrency": LLM_MAX_CONCURRENCY,
+        "http2": _client is not None and _http2_available(),
+    }
 
 
 def _build_prompt(gene: str, diplotype: str, phenotype: str, drug: str) -> str:
@@ -36,19 +164,63 @@ def _static_explanation_template(
     }
 
 
+def fallback_explanation(
+    reason: str, gene: str, diplotype: str, phenotype: str, drug: str
+) -> Dict[str, str]:
+    LLM_FALLBACKS.inc(reason=reason)
+    return _static_explanation_template(gene, diplotype, phenotype, drug)
+
+
+def explanation_key(
+    gene: str, diplotype: str, phenotype: str, drug: str
+) -> ExplanationKey:
+    """
+    Key of the explanation the configured model gives for these inputs.
+    """
+    model = os.getenv("LLM_MODEL", "gpt-4o-mini")
+    return explanation_cache.make_key(model, gene, diplotype, phenotype, drug)
+
+
+def llm_configured() -> bool:
+    """
+    Whether explanations come from an LLM at all (otherwise the static
+    template is returned without any network call).
+    """
+    return bool(os.getenv("LLM_API_KEY") and os.getenv("LLM_API_BASE"))
+
+
+def get_ready_explanation(
+    gene: str, diplotype: str, phenotype: str, drug: str
+) -> Optional[Dict[str, str]]:
+    """
+    Return an explanation that is available without calling the LLM: the
+    static template when no LLM is configured, or a cached LLM response.
+    Returns None when an LLM call would be needed.
+    """
+    if not llm_configured():
+        return fallback_explanation("not_configured", gene, diplotype, phenotype, drug)
+    return explanation_cache.get(explanation_key(gene, diplotype, phenotype, drug))
+
+
 async def generate_explanation(
     gene: str, diplotype: str, phenotype: str, drug: str
 ) -> Dict[str, str]:
     """
     Optionally call an external LLM to generate an explanation.
     If no API key/base URL/model is provided, returns a static template.
+    Successful LLM responses are memoized in `explanation_cache`.
     """
     api_key = os.getenv("LLM_API_KEY")
     api_base = os.getenv("LLM_API_BASE")
     model = os.getenv("LLM_MODEL", "gpt-4o-mini")
 
     if not api_key or not api_base:
-        return _static_explanation_template(gene, diplotype, phenotype, drug)
+        return fallback_explanation("not_configured", gene, diplotype, phenotype, drug)
+
+    cache_key = explanation_key(gene, diplotype, phenotype, drug)
+    cached = explanation_cache.get(cache_key)
+    if cached is not None:
+        return cached
 
     prompt = _build_prompt(gene, diplotype, phenotype, drug)
 
@@ -65,14 +237,41 @@ async def generate_explanation(
         "temperature": 0.2,
     }
 
+    # Fail fast while the backend is known to be unhealthy
+    if not _breaker.allow_request():
+        return fallback_explanation("breaker_open", gene, diplotype, phenotype, drug)
+    probe = _breaker.state == "half_open"
+
     try:
-        async with httpx.AsyncClient(timeout=20.0) as client:
-            response = await client.post(api_base, headers=headers, json=payload)
-            response.raise_for_status()
-            data = response.json()
-    except Exception:
-        # On any failure, return static deterministic explanation
-        return _static_explanation_template(gene, diplotype, phenotype, drug)
+        client = await _get_client()
+        semaphore = _semaphore
+        assert semaphore is not None
+        try:
+            await asyncio.wait_for(
+                semaphore.acquire(), timeout=LLM_ACQUIRE_TIMEOUT_SECONDS
+            )
+        except asyncio.TimeoutError:
+            # Concurrency limit saturated; don't queue behind slow LLM calls.
+            return fallback_explanation("saturated", gene, diplotype, phenotype, drug)
+
+        try:
+            with timed_stage("llm"):
+                response = await client.post(api_base, headers=headers, json=payload)
+                response.raise_for_status()
+                data = response.json()
+        except Exception:
+            # On any failure, return static deterministic explanation
+            _breaker.record_failure()
+            return fallback_explanation("error", gene, diplotype, phenotype, drug)
+        finally:
+            semaphore.release()
+
+        _breaker.record_success()
+    finally:
+        # A half-open probe that never ran or was cancelled has no outcome;
+        # re-open the circuit so another probe is allowed after the reset.
+        if probe:
+            _breaker.abort_probe()
 
     # Try to extract the generated text; fall back gracefully if structure differs
     summary_text = None
@@ -82,9 +281,9 @@ async def generate_explanation(
         summary_text = None
 
     if not summary_text:
-        return _static_explanation_template(gene, diplotype, phenotype, drug)
+        return fallback_explanation("empty_response", gene, diplotype, phenotype, drug)
 
-    return {
+    explanation = {
         "summary": summary_text.strip(),
         "mechanism": (
             "Mechanistic details are described in the generated summary above; "
@@ -92,4 +291,7 @@ async def generate_explanation(
         ),
         "clinical_guideline_reference": "CPIC Level A",
     }
+    # Only genuine LLM output is cached so failures are retried next time.
+    explanation_cache.put(cache_key, explanation)
+    return explanation
 
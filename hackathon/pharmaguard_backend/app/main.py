@@ -1,39 +1,145 @@
 from __future__ import annotations
 
+import asyncio
+import io
 import os
+import re
+import shutil
+import tempfile
+from contextlib import AsyncExitStack, asynccontextmanager
+from datetime import datetime, timezone
+from typing import (
+    Any,
+    AsyncIterator,
+    BinaryIO,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+    Union,
+)
 
-from dotenv import load_dotenv
 from fastapi import FastAPI, File, Form, HTTPException, UploadFile, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
 
+from .admission import analyze_admission
+from .allele_caller import ALLELE_DEFINITIONS_VERSION
+from .analysis_jobs import AnalysisJob, analysis_jobs
+from .batch import (
+    BATCH_MAX_TOTAL_BYTES,
+    BATCH_PARSE_WORKERS,
+    BatchResult,
+    get_batch_executor,
+    parse_batch_vcf,
+    shutdown_batch_executor,
+    spool_batch_uploads,
+)
 from .drug_rules import map_drug_to_gene
-from .llm_service import generate_explanation
+from .explanation_cache import explanation_cache
+from .explanation_jobs import explanation_jobs
+from .gene_rules import SUPPORTED_GENES
+from .llm_service import (
+    close_llm_client,
+    generate_explanation,
+    get_ready_explanation,
+    llm_client_stats,
+    llm_configured,
+    start_llm_client,
+)
+from .metrics import (
+    REGISTRY,
+    VARIANTS_PARSED,
+    MetricsMiddleware,
+    instrumented,
+    stats_collector,
+    timed_stage,
+)
 from .models import (
+    AnalysisJobResponse,
     AnalysisResponse,
-    ClinicalRecommendation,
-    DetectedVariant,
+    BatchAnalysisItem,
+    CohortAnalysisResponse,
+    ExplanationStatusResponse,
     LLMExplanation,
-    PharmacogenomicProfile,
-    QualityMetrics,
-    RiskAssessment,
+    MultiDrugAnalysisResponse,
+    PatientProfileResponse,
+)
+from .offset_index import offset_index_store
+from .parse_executor import (
+    VcfSource,
+    parse_executor,
+    parse_vcf_cohort_source,
+    parse_vcf_source,
 )
-from .phenotype_mapper import determine_gene_phenotype
+from .phenotype_mapper import PhenotypeResult, determine_gene_phenotype
+from .profile_store import GeneProfile, StoredProfile, profile_store
+from .responses import encode_line, json_timestamp, respond
+from .result_cache import result_cache
 from .risk_engine import assess_risk
+from .rule_set import RuleSet, active_rules, rule_registry
 from .utils import (
+    VCF_STREAM_CHUNK_SIZE,
+    check_streamed_vcf_size,
     generate_patient_id,
     get_current_timestamp,
+    hash_upload_file,
+    is_compressed_vcf_filename,
+    is_vcf_index_filename,
+    is_serverless_runtime,
     normalize_drug_input,
-    read_and_validate_vcf_file,
 )
-from .vcf_parser import ParsedVariant, parse_vcf_contents
+from .vcf_parser import VariantTable
+
+
+def _load_local_env() -> None:
+    """
+    Load `.env` for local development. Serverless deployments get their
+    configuration from the environment, so the file lookup is skipped there.
+    """
+    if is_serverless_runtime() or os.getenv("PHARMAGUARD_SKIP_DOTENV"):
+        return
+    from dotenv import load_dotenv
 
+    load_dotenv()
+
+
+_load_local_env()
+
+SSE_KEEPALIVE_SECONDS = 15.0
+
+PATIENT_ID_PATTERN = re.compile(r"[A-Za-z0-9._-]{1,128}")
+
+T = TypeVar("T")
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI) -> AsyncIterator[None]:
+    # Long-running servers warm the LLM client up front; on serverless cold
+    # starts it is created on the first LLM call instead.
+    if not is_serverless_runtime():
+        await start_llm_client()
+    rule_registry.start()
+    yield
+    rule_registry.stop()
+    await close_llm_client()
+    shutdown_batch_executor()
+    analysis_jobs.shutdown()
+    parse_executor.shutdown()
+    await asyncio.to_thread(profile_store.close)
+    await asyncio.to_thread(result_cache.flush)
+    await asyncio.to_thread(explanation_cache.flush)
 
-load_dotenv()
 
 app = FastAPI(
     title="PharmaGuard Backend",
     description="Rule-based pharmacogenomic risk prediction API",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # CORS configuration: allow local frontends and future production domain
@@ -49,6 +155,25 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
+)
+app.add_middleware(MetricsMiddleware)
+
+REGISTRY.register_collector(
+    stats_collector(
+        "pharmaguard_cache",
+        "cache",
+        {
+            "result": result_cache.stats,
+            "explanation": explanation_cache.stats,
+            "offset_index": offset_index_store.stats,
+        },
+    )
+)
+REGISTRY.register_collector(
+    stats_collector(
+        "pharmaguard_profile_store", "store", {"profiles": profile_store.stats}
+    )
 )
 
 
@@ -57,21 +182,716 @@ app.add_middleware(
     response_model=AnalysisResponse,
     response_model_exclude_none=True,
 )
+@instrumented
 async def analyze(
     file: UploadFile = File(...),
     drug: str = Form(...),
-) -> AnalysisResponse:
+    index: Optional[UploadFile] = File(None),
+    explanation_mode: str = Form("inline"),
+) -> Union[AnalysisResponse, Response]:
     """
     Analyze a VCF file and a target drug to return a structured
     pharmacogenomic risk assessment.
+
+    A bgzipped `.vcf.gz` may be sent together with its `.tbi`/`.csi`
+    `index`, in which case only the pharmacogene loci are read.
+
+    With `explanation_mode=deferred` the deterministic result is returned
+    without waiting for the LLM; the explanation is delivered later via
+    `/explanations/{id}` (poll) or `/explanations/{id}/events` (SSE).
+    """
+    _validate_explanation_mode(explanation_mode)
+    _validate_vcf_upload(file, index)
+    # Deferred explanations never wait on the LLM, so they go first.
+    deterministic = explanation_mode == "deferred" or not llm_configured()
+    async with analyze_admission.admit(deterministic):
+        payload = await _analyze_upload(file, index, drug, explanation_mode)
+    return respond(payload, AnalysisResponse)
+
+
+async def _analyze_upload(
+    file: UploadFile,
+    index: Optional[UploadFile],
+    drug: str,
+    explanation_mode: str,
+) -> Dict[str, object]:
+    """
+    The `/analyze` pipeline (hash, parse, phenotype, risk, explanation) for
+    a validated upload. Returns an `AnalysisResponse`-shaped payload.
+    """
+    # One rule set for the whole request, even if a reload lands mid-way.
+    rules = active_rules()
+    primary_drug, primary_gene = _resolve_primary_drug(drug, rules)
+
+    upload_key = await _upload_cache_key(file, index)
+
+    async def compute_profile() -> Dict[str, object]:
+        vcf_parsing_success, variants = await _parse_vcf_upload(
+            file, index, upload_key
+        )
+
+        # Filter variants for primary gene
+        if not variants.has_gene(primary_gene):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail={
+                    "error": f"No pharmacogenomic variants found for {primary_gene}"
+                },
+            )
+
+        # Determine diplotype and phenotype
+        with timed_stage("phenotype"):
+            return _build_gene_profile(
+                primary_gene, vcf_parsing_success, variants, rules
+            )
+
+    # Re-uploads of the same VCF for the same drug skip parsing entirely
+    profile = await result_cache.get_or_compute(
+        _profile_cache_key(rules, upload_key, primary_drug), compute_profile
+    )
+    return await _assess_profile(
+        patient_id=generate_patient_id(),
+        drug=drug,
+        primary_drug=primary_drug,
+        primary_gene=primary_gene,
+        profile=profile,
+        explanation_mode=explanation_mode,
+        rules=rules,
+    )
+
+
+def _build_gene_profile(
+    gene: str, vcf_parsing_success: bool, variants: VariantTable, rules: RuleSet
+) -> Dict[str, object]:
+    """
+    The cached per-drug profile: `gene`'s diplotype, phenotype and
+    detected rsIDs plus the quality metrics.
+    """
+    phenotype_result = determine_gene_phenotype(gene, variants, rules)
+    return {
+        "diplotype": phenotype_result["diplotype"],
+        "phenotype": phenotype_result["phenotype"],
+        "detected_rsids": variants.rsids_for_gene(gene),
+        "vcf_parsing_success": vcf_parsing_success,
+        "variants_detected_count": len(variants),
+    }
+
+
+def _profile_cache_key(rules: RuleSet, upload_key: str, drug: str) -> str:
+    return result_cache.make_key(
+        "profile", ALLELE_DEFINITIONS_VERSION, rules.cache_key, upload_key, drug
+    )
+
+
+def _warm_profile_cache(rules: RuleSet) -> None:
+    """
+    Rule reload hook: recompute the profiles cached under the active rule
+    set for `rules`, from the (rule-independent) cached variants, so recent
+    uploads stay cache hits once `rules` goes live.
+    """
+    prefix = _profile_cache_key(active_rules(), "", "")[:-1]
+    for key in result_cache.keys(prefix):
+        upload_key, drug = key[len(prefix) :].rsplit(":", 1)
+        gene = rules.gene_for_drug(drug)
+        cached = result_cache.get(
+            result_cache.make_key("variants", VariantTable.ROW_FORMAT, upload_key)
+        )
+        if gene is None or cached is None:
+            continue
+        variants = VariantTable.from_rows(cached["variants"])
+        if variants.has_gene(gene):
+            result_cache.put(
+                _profile_cache_key(rules, upload_key, drug),
+                _build_gene_profile(
+                    gene, bool(cached["vcf_parsing_success"]), variants, rules
+                ),
+            )
+
+
+rule_registry.add_warmup(_warm_profile_cache)
+
+
+@app.post(
+    "/profiles",
+    response_model=PatientProfileResponse,
+    response_model_exclude_none=True,
+)
+@instrumented
+async def store_profile(
+    file: UploadFile = File(...),
+    index: Optional[UploadFile] = File(None),
+    patient_id: Optional[str] = Form(None),
+) -> Union[PatientProfileResponse, Response]:
+    """
+    Parse a VCF once and store the patient's diplotype and phenotype for
+    every supported gene with variants, under `patient_id` (default: the
+    VCF's SHA-256). Storing again under the same ID replaces the profile.
     """
-    if not file.filename.lower().endswith(".vcf"):
+    if patient_id is not None and not PATIENT_ID_PATTERN.fullmatch(patient_id):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail={"error": "Uploaded file must be a VCF file"},
+            detail={
+                "error": "patient_id must be 1-128 letters, digits, '.', '_' or '-'"
+            },
         )
+    _validate_vcf_upload(file, index)
 
-    # Normalize and validate drug input
+    rules = active_rules()
+    upload_key = await _upload_cache_key(file, index)
+    vcf_parsing_success, variants = await _parse_vcf_upload(file, index, upload_key)
+
+    genes: List[GeneProfile] = []
+    with timed_stage("phenotype"):
+        for gene in SUPPORTED_GENES:
+            if variants.has_gene(gene):
+                result = determine_gene_phenotype(gene, variants, rules)
+                genes.append(
+                    GeneProfile(
+                        gene,
+                        result["diplotype"],
+                        result["phenotype"],
+                        variants.rsids_for_gene(gene),
+                    )
+                )
+
+    key = patient_id or upload_key.split(":", 1)[0]
+    stored = await asyncio.to_thread(
+        profile_store.save,
+        key,
+        genes,
+        vcf_parsing_success,
+        len(variants),
+        ALLELE_DEFINITIONS_VERSION,
+    )
+    return respond(_build_profile_payload(stored), PatientProfileResponse)
+
+
+@app.get(
+    "/profiles/{patient_id}",
+    response_model=PatientProfileResponse,
+    response_model_exclude_none=True,
+)
+async def get_profile(patient_id: str) -> Union[PatientProfileResponse, Response]:
+    """
+    The stored genotype profile of a patient.
+    """
+    stored = await asyncio.to_thread(profile_store.get, patient_id)
+    if stored is None:
+        raise _unknown_patient()
+    return respond(_build_profile_payload(stored), PatientProfileResponse)
+
+
+@app.delete("/profiles/{patient_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_profile(patient_id: str) -> Response:
+    if not await asyncio.to_thread(profile_store.delete, patient_id):
+        raise _unknown_patient()
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@app.get(
+    "/profiles/{patient_id}/analyze",
+    response_model=AnalysisResponse,
+    response_model_exclude_none=True,
+)
+@instrumented
+async def analyze_profile(
+    patient_id: str,
+    drug: str,
+    explanation_mode: str = "deferred",
+) -> Union[AnalysisResponse, Response]:
+    """
+    Drug-risk query against a stored profile: one indexed lookup, no
+    upload or parsing. The response matches `/analyze`, with `patient_id`
+    set to the stored key. Explanations are deferred by default so the
+    call never waits for the LLM.
+    """
+    _validate_explanation_mode(explanation_mode)
+    rules = active_rules()
+    primary_drug, primary_gene = _resolve_primary_drug(drug, rules)
+
+    with timed_stage("profile_lookup"):
+        stored = await asyncio.to_thread(
+            profile_store.lookup, patient_id, primary_gene
+        )
+    if stored is None:
+        raise _unknown_patient()
+    if stored.gene is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"error": f"No pharmacogenomic variants found for {primary_gene}"},
+        )
+
+    payload = await _assess_profile(
+        patient_id=patient_id,
+        drug=drug,
+        primary_drug=primary_drug,
+        primary_gene=primary_gene,
+        profile={
+            "diplotype": stored.gene.diplotype,
+            # Re-mapped so stored profiles follow rule updates.
+            "phenotype": rules.phenotype_for(primary_gene, stored.gene.diplotype)[0],
+            "detected_rsids": stored.gene.detected_rsids,
+            "vcf_parsing_success": stored.vcf_parsing_success,
+            "variants_detected_count": stored.variants_detected_count,
+        },
+        explanation_mode=explanation_mode,
+        rules=rules,
+    )
+    return respond(payload, AnalysisResponse)
+
+
+async def _assess_profile(
+    *,
+    patient_id: str,
+    drug: str,
+    primary_drug: str,
+    primary_gene: str,
+    profile: Dict[str, object],
+    explanation_mode: str,
+    rules: RuleSet,
+) -> Dict[str, object]:
+    """
+    Risk, recommendation and explanation for one drug given the primary
+    gene's profile (diplotype, phenotype, detected rsIDs and quality
+    metrics). Returns an `AnalysisResponse`-shaped payload.
+    """
+    diplotype = profile["diplotype"]
+    phenotype = profile["phenotype"]
+
+    # Assess risk using deterministic rules
+    with timed_stage("risk"):
+        risk = assess_risk(primary_drug, phenotype, rules)
+
+    # Clinical recommendation text (simple deterministic mapping)
+    recommendation_text = _build_clinical_recommendation(primary_drug, phenotype, risk)
+
+    # LLM explanation (optional)
+    llm_result_dict: Optional[Dict[str, str]] = None
+    pending_explanation: Optional[Dict[str, str]] = None
+    if explanation_mode == "deferred":
+        # Serve static/cached explanations inline; only real LLM calls are deferred
+        llm_result_dict = get_ready_explanation(
+            primary_gene, diplotype, phenotype, primary_drug
+        )
+        if llm_result_dict is None:
+            explanation_id = explanation_jobs.submit(
+                primary_gene, diplotype, phenotype, primary_drug
+            )
+            pending_explanation = {
+                "explanation_id": explanation_id,
+                "status": "pending",
+                "poll_url": f"/explanations/{explanation_id}",
+                "stream_url": f"/explanations/{explanation_id}/events",
+            }
+    else:
+        llm_result_dict = await generate_explanation(
+            gene=primary_gene,
+            diplotype=diplotype,
+            phenotype=phenotype,
+            drug=primary_drug,
+        )
+
+    return _build_analysis_payload(
+        patient_id=patient_id,
+        drug=drug,
+        timestamp=json_timestamp(get_current_timestamp()),
+        gene=primary_gene,
+        diplotype=diplotype,
+        phenotype=phenotype,
+        risk=risk,
+        recommendation=recommendation_text,
+        explanation=llm_result_dict,
+        pending_explanation=pending_explanation,
+        detected_rsids=profile["detected_rsids"],
+        vcf_parsing_success=profile["vcf_parsing_success"],
+        variants_detected_count=profile["variants_detected_count"],
+        rule_set_version=rules.version,
+    )
+
+
+@app.post(
+    "/analyze/multi",
+    response_model=MultiDrugAnalysisResponse,
+    response_model_exclude_none=True,
+)
+@instrumented
+async def analyze_multi(
+    file: UploadFile = File(...),
+    drug: str = Form(...),
+    index: Optional[UploadFile] = File(None),
+) -> Union[MultiDrugAnalysisResponse, Response]:
+    """
+    Analyze a VCF file against every drug in a comma-separated list.
+
+    The VCF is parsed once and each gene's phenotype is computed once,
+    however many of the requested drugs depend on it. LLM explanations
+    for all drugs are fetched concurrently.
+    """
+    _validate_vcf_upload(file, index)
+    rules = active_rules()
+    drug_genes, skipped_drugs = _resolve_drug_list(drug, rules)
+
+    async with analyze_admission.admit(not llm_configured()):
+        vcf_parsing_success, variants = await _parse_vcf_upload(
+            file, index, await _upload_cache_key(file, index)
+        )
+        payload = await _analyze_drug_list(
+            drug_genes, skipped_drugs, vcf_parsing_success, variants, rules
+        )
+    return respond(payload, MultiDrugAnalysisResponse)
+
+
+@app.post("/analyze/batch")
+@instrumented
+async def analyze_batch(
+    files: List[UploadFile] = File(...),
+    drug: str = Form(...),
+) -> StreamingResponse:
+    """
+    Analyze many patient VCFs (or zip archives of VCFs) against a drug list.
+
+    Uploads are spooled to disk and each VCF is streamed (and decompressed)
+    by a process pool worker under the BATCH_MAX_* limits; one NDJSON line
+    per patient is streamed back as soon as that patient's analysis
+    finishes.
+    """
+    rules = active_rules()
+    drug_genes, skipped_drugs = _resolve_drug_list(drug, rules)
+
+    # Everything the stream holds on to (the admission slot, the spooled
+    # uploads, in-flight parses) is released through one exit stack, either
+    # when the stream ends or, if the client goes away first, in the
+    # response's background task.
+    pending: Set[asyncio.Future[BatchResult]] = set()
+    async with AsyncExitStack() as setup:
+        await setup.enter_async_context(analyze_admission.admit(not llm_configured()))
+        directory = tempfile.mkdtemp(prefix="pharmaguard-batch-")
+        setup.push_async_callback(asyncio.to_thread, shutil.rmtree, directory, True)
+        setup.callback(_cancel_futures, pending)
+        entries = await asyncio.to_thread(
+            spool_batch_uploads,
+            [(upload.filename or "", upload.file) for upload in files],
+            directory,
+        )
+        if not entries:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail={"error": "No VCF files uploaded"},
+            )
+        cleanup = setup.pop_all()
+
+    async def stream_results() -> AsyncIterator[bytes]:
+        loop = asyncio.get_running_loop()
+        executor = get_batch_executor()
+        queued = iter(entries)
+        total_bytes = 0
+        try:
+            while True:
+                # Keep a bounded window in flight so the uncompressed total
+                # is checked before more entries are started.
+                over_budget = bool(BATCH_MAX_TOTAL_BYTES) and (
+                    total_bytes > BATCH_MAX_TOTAL_BYTES
+                )
+                while not over_budget and len(pending) < BATCH_PARSE_WORKERS * 2:
+                    entry = next(queued, None)
+                    if entry is None:
+                        break
+                    pending.add(loop.run_in_executor(executor, parse_batch_vcf, *entry))
+                if not pending:
+                    break
+
+                done, _ = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                pending.difference_update(done)
+                for future in done:
+                    filename, parsed, error, read_bytes = future.result()
+                    total_bytes += read_bytes
+                    if parsed is not None:
+                        VARIANTS_PARSED.inc(len(parsed[1]))
+                    if parsed is not None and not parsed[1]:
+                        error = "No pharmacogenomic variants found"
+                    if error is not None:
+                        item = {"filename": filename, "status": "error", "error": error}
+                    else:
+                        vcf_parsing_success, variants = parsed
+                        analysis = await _analyze_drug_list(
+                            drug_genes,
+                            list(skipped_drugs),
+                            vcf_parsing_success,
+                            variants,
+                            rules,
+                        )
+                        item = {
+                            "filename": filename,
+                            "status": "ok",
+                            "analysis": analysis,
+                        }
+                    yield encode_line(item, BatchAnalysisItem)
+
+            for filename, _, _ in queued:
+                item = {
+                    "filename": filename,
+                    "status": "error",
+                    "error": "Batch exceeds the total size limit",
+                }
+                yield encode_line(item, BatchAnalysisItem)
+        finally:
+            await cleanup.aclose()
+
+    return StreamingResponse(
+        stream_results(),
+        media_type="application/x-ndjson",
+        background=BackgroundTask(cleanup.aclose),
+    )
+
+
+@app.post(
+    "/analyze/cohort",
+    response_model=CohortAnalysisResponse,
+    response_model_exclude_none=True,
+)
+@instrumented
+async def analyze_cohort(
+    file: UploadFile = File(...),
+    drug: str = Form(...),
+    index: Optional[UploadFile] = File(None),
+) -> Union[CohortAnalysisResponse, Response]:
+    """
+    Analyze every sample column of a multi-sample (joint-called) VCF
+    against a target drug, returning one result per sample.
+    """
+    # NumPy is only needed here; keep it off the cold-start import path.
+    from .cohort import (
+        assess_cohort_risk,
+        carried_rsids_by_sample,
+        determine_cohort_phenotypes,
+    )
+
+    _validate_vcf_upload(file, index)
+    rules = active_rules()
+    primary_drug, primary_gene = _resolve_primary_drug(drug, rules)
+
+    async with analyze_admission.admit(not llm_configured()):
+        try:
+            cohort = await _run_upload_parser(parse_vcf_cohort_source, file, index)
+        except HTTPException:
+            raise
+        except Exception as exc:  # pragma: no cover - defensive
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail={"error": "Internal VCF parsing error"},
+            ) from exc
+        VARIANTS_PARSED.inc(len(cohort.genes))
+
+        # Diplotype, phenotype and risk are computed once per distinct
+        # diplotype and broadcast to samples via phenotype codes.
+        with timed_stage("phenotype"):
+            phenotypes = determine_cohort_phenotypes(primary_gene, cohort, rules)
+        with timed_stage("risk"):
+            risks = assess_cohort_risk(primary_drug, phenotypes, rules)
+        recommendations = [
+            _build_clinical_recommendation(primary_drug, phenotype, risk)
+            for phenotype, risk in zip(phenotypes.phenotypes, risks)
+        ]
+        explanations = await asyncio.gather(
+            *(
+                generate_explanation(
+                    gene=primary_gene,
+                    diplotype=diplotype,
+                    phenotype=phenotype,
+                    drug=primary_drug,
+                )
+                for diplotype, phenotype in zip(
+                    phenotypes.diplotypes, phenotypes.phenotypes
+                )
+            )
+        )
+
+    variant_counts, gene_rsids = carried_rsids_by_sample(primary_gene, cohort)
+
+    timestamp = json_timestamp(get_current_timestamp())
+    results = []
+    samples_without_variants = []
+    for i, sample_id in enumerate(cohort.sample_ids):
+        if not gene_rsids[i]:
+            samples_without_variants.append(sample_id)
+            continue
+
+        code = int(phenotypes.codes[i])
+        results.append(
+            _build_analysis_payload(
+                patient_id=sample_id,
+                drug=drug,
+                timestamp=timestamp,
+                gene=primary_gene,
+                diplotype=phenotypes.diplotypes[code],
+                phenotype=phenotypes.phenotypes[code],
+                risk=risks[code],
+                recommendation=recommendations[code],
+                explanation=explanations[code],
+                detected_rsids=gene_rsids[i],
+                vcf_parsing_success=True,
+                variants_detected_count=int(variant_counts[i]),
+                rule_set_version=rules.version,
+            )
+        )
+
+    return respond(
+        {
+            "drug": drug,
+            "timestamp": timestamp,
+            "sample_count": len(cohort.sample_ids),
+            "results": results,
+            "samples_without_variants": samples_without_variants,
+        },
+        CohortAnalysisResponse,
+    )
+
+
+@app.post(
+    "/jobs/analyze",
+    status_code=status.HTTP_202_ACCEPTED,
+    response_model=AnalysisJobResponse,
+    response_model_exclude_none=True,
+)
+async def submit_analysis_job(
+    file: UploadFile = File(...),
+    drug: str = Form(...),
+    index: Optional[UploadFile] = File(None),
+    explanation_mode: str = Form("inline"),
+) -> Union[AnalysisJobResponse, Response]:
+    """
+    Queue an `/analyze` request and return its job id at once. The upload
+    is spooled to a temporary file and analyzed by a background worker;
+    poll `/jobs/{job_id}` for progress and the final `AnalysisResponse`.
+    """
+    _validate_explanation_mode(explanation_mode)
+    _validate_vcf_upload(file, index)
+    _resolve_primary_drug(drug, active_rules())
+
+    # As for /analyze, the size limit applies to full scans (and to index
+    # files), not to bgzipped VCFs of which only the indexed loci are read.
+    job_file = UploadFile(
+        await asyncio.to_thread(_spool_upload, file, index is None),
+        filename=file.filename,
+    )
+    job_index: Optional[UploadFile] = None
+    if index is not None:
+        try:
+            job_index = UploadFile(
+                await asyncio.to_thread(_spool_upload, index), filename=index.filename
+            )
+        except BaseException:
+            job_file.file.close()
+            raise
+    # Jobs hold an admission slot while they run, like /analyze requests.
+    deterministic = explanation_mode == "deferred" or not llm_configured()
+
+    async def run() -> Dict[str, object]:
+        async with analyze_admission.admit(deterministic):
+            return await _analyze_upload(job_file, job_index, drug, explanation_mode)
+
+    def cleanup() -> None:
+        job_file.file.close()
+        if job_index is not None:
+            job_index.file.close()
+
+    job = analysis_jobs.submit(run, cleanup=cleanup)
+    return respond(
+        _build_job_payload(job),
+        AnalysisJobResponse,
+        status_code=status.HTTP_202_ACCEPTED,
+    )
+
+
+@app.get(
+    "/jobs/{job_id}",
+    response_model=AnalysisJobResponse,
+    response_model_exclude_none=True,
+)
+async def get_analysis_job(job_id: str) -> Union[AnalysisJobResponse, Response]:
+    """
+    Poll a queued analysis: its state, the pipeline stages finished so far
+    (milliseconds each), and the result or error once it has finished.
+    """
+    job = analysis_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={"error": "Unknown or expired job id"},
+        )
+    return respond(_build_job_payload(job), AnalysisJobResponse)
+
+
+@app.get(
+    "/explanations/{explanation_id}",
+    response_model=ExplanationStatusResponse,
+    response_model_exclude_none=True,
+)
+async def get_explanation(explanation_id: str) -> ExplanationStatusResponse:
+    """
+    Poll a deferred LLM explanation.
+    """
+    job_status = explanation_jobs.status(explanation_id)
+    if job_status is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={"error": "Unknown or expired explanation id"},
+        )
+    state, explanation = job_status
+    return ExplanationStatusResponse(
+        explanation_id=explanation_id,
+        status=state,
+        explanation=LLMExplanation(**explanation) if explanation else None,
+    )
+
+
+@app.get("/explanations/{explanation_id}/events")
+async def stream_explanation(explanation_id: str) -> StreamingResponse:
+    """
+    Server-Sent Events stream that emits a single `explanation` event once
+    the deferred LLM explanation is ready. Comment lines are sent as
+    keep-alives while it is pending.
+    """
+    if explanation_jobs.status(explanation_id) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={"error": "Unknown or expired explanation id"},
+        )
+
+    async def events() -> AsyncIterator[str]:
+        while True:
+            explanation = await explanation_jobs.wait(
+                explanation_id, timeout=SSE_KEEPALIVE_SECONDS
+            )
+            if explanation is not None:
+                payload = ExplanationStatusResponse(
+                    explanation_id=explanation_id,
+                    status="ready",
+                    explanation=LLMExplanation(**explanation),
+                )
+                yield f"event: explanation\ndata: {payload.model_dump_json()}\n\n"
+                return
+            if explanation_jobs.status(explanation_id) is None:
+                yield "event: expired\ndata: {}\n\n"
+                return
+            yield ": keep-alive\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _resolve_drug_list(
+    drug: str, rules: RuleSet
+) -> Tuple[List[Tuple[str, str]], List[Dict[str, str]]]:
+    """
+    Split a comma-separated drug list into supported (drug, gene) pairs
+    and skipped unsupported drugs.
+    """
     normalized_drugs = normalize_drug_input(drug)
     if not normalized_drugs:
         raise HTTPException(
@@ -79,100 +899,370 @@ async def analyze(
             detail={"error": "No drug specified"},
         )
 
-    primary_drug = None
-    primary_gene = None
-    for d in normalized_drugs:
-        gene = map_drug_to_gene(d)
+    skipped_drugs: List[Dict[str, str]] = []
+    drug_genes: List[Tuple[str, str]] = []
+    for d in dict.fromkeys(normalized_drugs):
+        gene = map_drug_to_gene(d, rules)
         if gene:
-            primary_drug = d
-            primary_gene = gene
-            break
+            drug_genes.append((d, gene))
+        else:
+            skipped_drugs.append({"drug": d, "reason": "Unsupported drug"})
 
-    if not primary_drug or not primary_gene:
+    if not drug_genes:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail={"error": "Unsupported drug"},
         )
+    return drug_genes, skipped_drugs
+
+
+async def _analyze_drug_list(
+    drug_genes: List[Tuple[str, str]],
+    skipped_drugs: List[Dict[str, str]],
+    vcf_parsing_success: bool,
+    variants: VariantTable,
+    rules: RuleSet,
+) -> Dict[str, object]:
+    """
+    Assess every (drug, gene) pair against one patient's parsed variants,
+    computing each gene phenotype once and fetching explanations concurrently.
+    Returns a `MultiDrugAnalysisResponse`-shaped payload.
+    """
+    phenotype_by_gene: Dict[str, PhenotypeResult] = {}
+    assessed: List[Tuple[str, str, Dict[str, object]]] = []
+    for d, gene in drug_genes:
+        if not variants.has_gene(gene):
+            skipped_drugs.append(
+                {"drug": d, "reason": f"No pharmacogenomic variants found for {gene}"}
+            )
+            continue
+        if gene not in phenotype_by_gene:
+            with timed_stage("phenotype"):
+                phenotype_by_gene[gene] = determine_gene_phenotype(
+                    gene, variants, rules
+                )
+        phenotype = phenotype_by_gene[gene]["phenotype"]
+        with timed_stage("risk"):
+            assessed.append((d, gene, assess_risk(d, phenotype, rules)))
+
+    explanations = await asyncio.gather(
+        *(
+            generate_explanation(
+                gene=gene,
+                diplotype=phenotype_by_gene[gene]["diplotype"],
+                phenotype=phenotype_by_gene[gene]["phenotype"],
+                drug=d,
+            )
+            for d, gene, _risk in assessed
+        )
+    )
+
+    patient_id = generate_patient_id()
+    timestamp = json_timestamp(get_current_timestamp())
+    results = []
+    for (d, gene, risk), explanation in zip(assessed, explanations):
+        phenotype_result = phenotype_by_gene[gene]
+        results.append(
+            _build_analysis_payload(
+                patient_id=patient_id,
+                drug=d,
+                timestamp=timestamp,
+                gene=gene,
+                diplotype=phenotype_result["diplotype"],
+                phenotype=phenotype_result["phenotype"],
+                risk=risk,
+                recommendation=_build_clinical_recommendation(
+                    d, phenotype_result["phenotype"], risk
+                ),
+                explanation=explanation,
+                detected_rsids=variants.rsids_for_gene(gene),
+                vcf_parsing_success=vcf_parsing_success,
+                variants_detected_count=len(variants),
+                rule_set_version=rules.version,
+            )
+        )
 
-    # Read and validate VCF contents
-    vcf_text = await read_and_validate_vcf_file(file)
+    return {
+        "patient_id": patient_id,
+        "timestamp": timestamp,
+        "results": results,
+        "skipped_drugs": skipped_drugs,
+    }
 
+
+def _build_analysis_payload(
+    *,
+    patient_id: str,
+    drug: str,
+    timestamp: str,
+    gene: str,
+    diplotype: str,
+    phenotype: str,
+    risk: Dict[str, object],
+    recommendation: str,
+    explanation: Optional[Dict[str, str]],
+    detected_rsids: List[str],
+    vcf_parsing_success: bool,
+    variants_detected_count: int,
+    rule_set_version: str,
+    pending_explanation: Optional[Dict[str, str]] = None,
+) -> Dict[str, object]:
+    """
+    An `AnalysisResponse` as its JSON-ready dict: keys in model field order,
+    None fields omitted and values coerced as the model would, so encoding
+    it gives the same bytes as serializing the validated model.
+    """
+    payload: Dict[str, object] = {
+        "patient_id": patient_id,
+        "drug": drug,
+        "timestamp": timestamp,
+        "risk_assessment": {
+            "risk_label": risk["risk_label"],
+            "confidence_score": float(risk["confidence_score"]),
+            "severity": risk["severity"],
+        },
+        "pharmacogenomic_profile": {
+            "primary_gene": gene,
+            "diplotype": diplotype,
+            "phenotype": phenotype,
+            "detected_variants": [{"rsid": rsid} for rsid in detected_rsids],
+        },
+        "clinical_recommendation": {"recommendation": recommendation},
+    }
+    if explanation is not None:
+        payload["llm_generated_explanation"] = {
+            "summary": explanation["summary"],
+            "mechanism": explanation["mechanism"],
+            "clinical_guideline_reference": explanation["clinical_guideline_reference"],
+        }
+    if pending_explanation is not None:
+        payload["pending_explanation"] = pending_explanation
+    payload["quality_metrics"] = {
+        "vcf_parsing_success": bool(vcf_parsing_success),
+        "variants_detected_count": int(variants_detected_count),
+    }
+    payload["rule_set_version"] = rule_set_version
+    return payload
+
+
+def _build_profile_payload(stored: StoredProfile) -> Dict[str, object]:
+    """
+    A `PatientProfileResponse` as its JSON-ready dict.
+    """
+    return {
+        "patient_id": stored.patient_id,
+        "updated_at": json_timestamp(
+            datetime.fromtimestamp(stored.updated_at, timezone.utc)
+        ),
+        "allele_definitions_version": stored.allele_definitions_version,
+        "genes": [
+            {
+                "gene": g.gene,
+                "diplotype": g.diplotype,
+                "phenotype": g.phenotype,
+                "detected_variants": [{"rsid": rsid} for rsid in g.detected_rsids],
+            }
+            for g in stored.genes
+        ],
+        "quality_metrics": {
+            "vcf_parsing_success": stored.vcf_parsing_success,
+            "variants_detected_count": stored.variants_detected_count,
+        },
+    }
+
+
+def _build_job_payload(job: AnalysisJob) -> Dict[str, object]:
+    """
+    An `AnalysisJobResponse` as its JSON-ready dict.
+    """
+    payload: Dict[str, object] = {
+        "job_id": job.job_id,
+        "status": job.state,
+        "submitted_at": json_timestamp(
+            datetime.fromtimestamp(job.submitted_at, timezone.utc)
+        ),
+        "status_url": f"/jobs/{job.job_id}",
+        "stages": job.stage_durations_ms(),
+    }
+    if job.result is not None:
+        payload["result"] = job.result
+    if job.error is not None:
+        payload["error"] = job.error
+    return payload
+
+
+def _spool_upload(file: UploadFile, limited: bool = True) -> BinaryIO:
+    """
+    Copy an upload to an anonymous temporary file that outlives the
+    request (the form's own files are closed once the response is sent).
+    With `limited`, the streamed size limit is enforced as it goes.
+    """
+    spooled = tempfile.TemporaryFile()
     try:
-        vcf_parsing_success, variants = parse_vcf_contents(vcf_text)
-    except HTTPException:
-        # Propagate HTTPExceptions as-is
+        file.file.seek(0)
+        size = 0
+        while True:
+            chunk = file.file.read(VCF_STREAM_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if limited:
+                check_streamed_vcf_size(size)
+            spooled.write(chunk)
+    except BaseException:
+        spooled.close()
         raise
-    except Exception as exc:  # pragma: no cover - defensive
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail={"error": "Internal VCF parsing error"},
-        ) from exc
+    spooled.seek(0)
+    return spooled
+
+
+def _cancel_futures(futures: Set[asyncio.Future[Any]]) -> None:
+    for future in futures:
+        future.cancel()
+
+
+def _unknown_patient() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail={"error": "Unknown patient id"},
+    )
+
+
+async def _upload_cache_key(file: UploadFile, index: Optional[UploadFile]) -> str:
+    """
+    Content address of an upload: the VCF digest, plus the index digest
+    when only the indexed loci are read. Hashing runs in a worker thread.
+    """
+    with timed_stage("hash"):
+        index_digest = (
+            await asyncio.to_thread(hash_upload_file, index)
+            if index is not None
+            else "full"
+        )
+        file_digest = await asyncio.to_thread(hash_upload_file, file)
+    return result_cache.make_key(file_digest, index_digest)
+
+
+async def _parse_vcf_upload(
+    file: UploadFile, index: Optional[UploadFile], upload_key: str
+) -> Tuple[bool, VariantTable]:
+    """
+    Parse an uploaded VCF, rejecting files without any pharmacogene variants.
+    Parsed variants are cached under `upload_key` for repeated uploads.
+    """
+
+    async def compute() -> Dict[str, object]:
+        # Parsing runs on the parse pool; only pharmacogene records are kept
+        try:
+            # Without an index, the digest keys the file's offset index.
+            content_sha256 = upload_key.split(":", 1)[0] if index is None else None
+            has_header, parsed = await _run_upload_parser(
+                parse_vcf_source, file, index, content_sha256
+            )
+        except HTTPException:
+            # Propagate HTTPExceptions as-is
+            raise
+        except Exception as exc:  # pragma: no cover - defensive
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail={"error": "Internal VCF parsing error"},
+            ) from exc
+        VARIANTS_PARSED.inc(len(parsed))
+        return {
+            "vcf_parsing_success": has_header,
+            "variants": parsed.rows(),
+        }
+
+    cached = await result_cache.get_or_compute(
+        result_cache.make_key("variants", VariantTable.ROW_FORMAT, upload_key), compute
+    )
+    vcf_parsing_success = bool(cached["vcf_parsing_success"])
+    variants = VariantTable.from_rows(cached["variants"])
 
     if vcf_parsing_success and not variants:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail={"error": "No pharmacogenomic variants found"},
         )
+    return vcf_parsing_success, variants
+
 
-    # Filter variants for primary gene
-    primary_gene_variants = [v for v in variants if v.gene == primary_gene]
-    if not primary_gene_variants:
+def _validate_explanation_mode(explanation_mode: str) -> None:
+    if explanation_mode not in ("inline", "deferred"):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail={"error": f"No pharmacogenomic variants found for {primary_gene}"},
+            detail={"error": "explanation_mode must be 'inline' or 'deferred'"},
         )
 
-    # Determine diplotype and phenotype
-    phenotype_result = determine_gene_phenotype(primary_gene, variants)
-    diplotype = phenotype_result["diplotype"]
-    phenotype = phenotype_result["phenotype"]
 
-    # Assess risk using deterministic rules
-    risk = assess_risk(primary_drug, phenotype)
+def _validate_vcf_upload(file: UploadFile, index: Optional[UploadFile]) -> None:
+    filename = file.filename or ""
+    if not (filename.lower().endswith(".vcf") or is_compressed_vcf_filename(filename)):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"error": "Uploaded file must be a VCF file"},
+        )
 
-    # Clinical recommendation text (simple deterministic mapping)
-    recommendation_text = _build_clinical_recommendation(primary_drug, phenotype, risk)
+    if index is not None:
+        if not is_compressed_vcf_filename(filename):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail={"error": "An index requires a bgzipped .vcf.gz file"},
+            )
+        if not is_vcf_index_filename(index.filename or ""):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail={"error": "Index file must be a .tbi or .csi file"},
+            )
 
-    # LLM explanation (optional)
-    llm_result_dict = await generate_explanation(
-        gene=primary_gene,
-        diplotype=diplotype,
-        phenotype=phenotype,
-        drug=primary_drug,
-    )
 
-    llm_explanation = LLMExplanation(**llm_result_dict)
+def _resolve_primary_drug(drug: str, rules: RuleSet) -> Tuple[str, str]:
+    """
+    Return (drug, gene) for the first supported drug in the request.
+    """
+    # Normalize and validate drug input
+    normalized_drugs = normalize_drug_input(drug)
+    if not normalized_drugs:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"error": "No drug specified"},
+        )
 
-    detected_variant_models = [
-        DetectedVariant(rsid=v.rsid) for v in primary_gene_variants
-    ]
+    for d in normalized_drugs:
+        gene = map_drug_to_gene(d, rules)
+        if gene:
+            return d, gene
 
-    response = AnalysisResponse(
-        patient_id=generate_patient_id(),
-        drug=drug,
-        timestamp=get_current_timestamp(),
-        risk_assessment=RiskAssessment(
-            risk_label=risk["risk_label"],
-            confidence_score=risk["confidence_score"],
-            severity=risk["severity"],
-        ),
-        pharmacogenomic_profile=PharmacogenomicProfile(
-            primary_gene=primary_gene,
-            diplotype=diplotype,
-            phenotype=phenotype,
-            detected_variants=detected_variant_models,
-        ),
-        clinical_recommendation=ClinicalRecommendation(
-            recommendation=recommendation_text,
-        ),
-        llm_generated_explanation=llm_explanation,
-        quality_metrics=QualityMetrics(
-            vcf_parsing_success=vcf_parsing_success,
-            variants_detected_count=len(variants),
-        ),
+    raise HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail={"error": "Unsupported drug"},
     )
 
-    return response
+
+async def _run_upload_parser(
+    parser: Callable[..., T],
+    file: UploadFile,
+    index: Optional[UploadFile],
+    *args: Any,
+) -> T:
+    """
+    Run `parser` over an upload on the parse pool: the indexed pharmacogene
+    loci when an index was sent, otherwise the whole (optionally gzipped)
+    file, streamed. `args` are passed after the index bytes.
+    """
+    index_bytes = await index.read() if index is not None else None
+    compressed = is_compressed_vcf_filename(file.filename or "")
+    if parse_executor.uses_processes:
+        # Worker processes cannot share the spooled upload; send its bytes.
+        await file.seek(0)
+        source: VcfSource = await file.read()
+    else:
+        source = file.file
+    # Streaming fuses reading, decompression, decoding and parsing.
+    with timed_stage("parse"):
+        return await parse_executor.run(
+            parser, source, compressed, index_bytes, *args
+        )
 
 
 def _build_clinical_recommendation(
@@ -210,10 +1300,34 @@ def _build_clinical_recommendation(
     )
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> PlainTextResponse:
+    """
+    Prometheus text-format metrics: per-stage latency histograms, request
+    latency by route, in-flight requests, parsed variant and LLM fallback
+    counters, and cache hit/miss counters.
+    """
+    return PlainTextResponse(
+        REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
 @app.get("/health")
 async def health() -> dict:
     """
     Simple health check endpoint.
     """
-    return {"status": "ok", "env": "development" if os.getenv("DEBUG") else "production"}
+    return {
+        "status": "ok",
+        "env": "development" if os.getenv("DEBUG") else "production",
+        "explanation_cache": explanation_cache.stats(),
+        "result_cache": result_cache.stats(),
+        "offset_index": offset_index_store.stats(),
+        "admission": analyze_admission.stats(),
+        "parse_executor": parse_executor.stats(),
+        "analysis_jobs": analysis_jobs.stats(),
+        "llm_backend": llm_client_stats(),
+        "profile_store": profile_store.stats(),
+        "rules": rule_registry.stats(),
+    }
 
@@ -0,0 +1,405 @@
+from __future__ import annotations
+
+import bisect
+import functools
+import inspect
+import threading
+import time
+import typing
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    MutableMapping,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+
+LabelValues = Tuple[str, ...]
+
+# Seconds; spans sub-millisecond rule lookups up to slow LLM calls.
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Sequence[str] = ()
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Sequence[str] = ()
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [per-bucket counts (non-cumulative) + overflow, sum]
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = ([0] * (len(self.buckets) + 1), [0.0])
+                self._values[key] = entry
+            entry[0][index] += 1
+            entry[1][0] += value
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, (list(c), s[0])) for k, (c, s) in self._values.items())
+        lines = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                labels = _format_labels(
+                    self.labelnames + ("le",), key + (_format_value(bound),)
+                )
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Minimal Prometheus text-format registry. Metrics are registered once at
+    import; collectors are callables that produce extra metric families at
+    scrape time (e.g. from the caches' own counters).
+    """
+
+    def __init__(self) -> None:
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], List[str]]] = []
+
+    def register(self, metric: _Metric) -> Any:
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], List[str]]) -> None:
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS: Histogram = REGISTRY.register(
+    Histogram(
+        "pharmaguard_stage_duration_seconds",
+        "Time spent in each analysis pipeline stage.",
+        ["stage"],
+    )
+)
+REQUEST_SECONDS: Histogram = REGISTRY.register(
+    Histogram(
+        "pharmaguard_request_duration_seconds",
+        "HTTP request latency until the response starts, by route.",
+        ["route", "method", "status"],
+    )
+)
+REQUESTS_IN_FLIGHT: Gauge = REGISTRY.register(
+    Gauge("pharmaguard_requests_in_flight", "HTTP requests currently being served.")
+)
+VARIANTS_PARSED: Counter = REGISTRY.register(
+    Counter(
+        "pharmaguard_variants_parsed_total",
+        "Pharmacogene variants extracted from parsed VCFs.",
+    )
+)
+ADMISSION_REJECTIONS: Counter = REGISTRY.register(
+    Counter(
+        "pharmaguard_admission_rejections_total",
+        "Analysis requests shed with a 503 by admission control.",
+        ["reason"],
+    )
+)
+LLM_FALLBACKS: Counter = REGISTRY.register(
+    Counter(
+        "pharmaguard_llm_fallbacks_total",
+        "Explanations served from the static template instead of the LLM.",
+        ["reason"],
+    )
+)
+
+
+def stats_collector(
+    prefix: str, label: str, sources: Dict[str, Callable[[], Dict[str, object]]]
+) -> Callable[[], List[str]]:
+    """
+    Build a collector that exposes counters already kept by components such
+    as the caches (their `stats()` dicts), one metric family per numeric
+    field, labelled by source. `size`/`max_entries` are gauges; every other
+    field is a monotonically increasing counter.
+    """
+
+    def collect() -> List[str]:
+        families: Dict[str, Tuple[str, List[str]]] = {}
+        for source, stats in sources.items():
+            for field, value in stats().items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                kind = "gauge" if field in ("size", "max_entries") else "counter"
+                name = f"{prefix}_{field}" + ("_total" if kind == "counter" else "")
+                labels = _format_labels((label,), (source,))
+                families.setdefault(name, (kind, []))[1].append(
+                    f"{name}{labels} {_format_value(value)}"
+                )
+
+        lines: List[str] = []
+        for name, (kind, samples) in families.items():
+            lines.append(f"# HELP {name} {name} by {label}.")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples)
+        return lines
+
+    return collect
+
+
+class RequestTimings:
+    """
+    Per-request stage durations, accumulated for the Server-Timing header.
+    """
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.handler_started: Optional[float] = None
+        self.handler_finished: Optional[float] = None
+        self.stages: Dict[str, float] = {}
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def server_timing(self, total: float) -> str:
+        entries = [
+            f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.stages.items()
+        ]
+        entries.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(entries)
+
+
+_request_timings: ContextVar[Optional[RequestTimings]] = ContextVar(
+    "pharmaguard_request_timings", default=None
+)
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+
+@contextmanager
+def collect_stage_timings() -> Iterator[RequestTimings]:
+    """
+    Accumulate the stages timed inside the block (e.g. a background job)
+    into a fresh `RequestTimings`.
+    """
+    timings = RequestTimings()
+    token = _request_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _request_timings.reset(token)
+
+
+@contextmanager
+def timed_stage(stage: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started)
+
+
+def instrumented(
+    endpoint: Callable[..., Awaitable[Any]]
+) -> Callable[..., Awaitable[Any]]:
+    """
+    Mark when an async endpoint starts and returns, so the middleware can
+    report request-body handling (`upload`) and response serialization
+    (`serialize`) as separate stages.
+    """
+
+    @functools.wraps(endpoint)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.handler_started = time.perf_counter()
+            record_stage("upload", timings.handler_started - timings.started)
+        try:
+            return await endpoint(*args, **kwargs)
+        finally:
+            if timings is not None:
+                timings.handler_finished = time.perf_counter()
+
+    # FastAPI evaluates string annotations against the wrapper's module, so
+    # hand it the endpoint's signature with annotations already resolved.
+    hints = typing.get_type_hints(endpoint)
+    signature = inspect.signature(endpoint)
+    wrapper.__signature__ = signature.replace(  # type: ignore[attr-defined]
+        parameters=[
+            p.replace(annotation=hints.get(p.name, p.annotation))
+            for p in signature.parameters.values()
+        ],
+        return_annotation=hints.get("return", signature.return_annotation),
+    )
+    return wrapper
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware tracking in-flight requests and latency per route, and
+    adding a `Server-Timing` header with the request's stage durations.
+    """
+
+    def __init__(self, app: Callable[..., Awaitable[None]]) -> None:
+        self.app = app
+
+    async def __call__(
+        self,
+        scope: MutableMapping[str, Any],
+        receive: Callable[[], Awaitable[Any]],
+        send: Callable[[Any], Awaitable[None]],
+    ) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _request_timings.set(timings)
+        status_code = 500
+
+        async def send_with_timing(message: MutableMapping[str, Any]) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                now = time.perf_counter()
+                status_code = message["status"]
+                if timings.handler_finished is not None:
+                    record_stage("serialize", now - timings.handler_finished)
+                headers = list(message.get("headers", []))
+                headers.append(
+                    (
+                        b"server-timing",
+                        timings.server_timing(now - timings.started).encode("latin-1"),
+                    )
+                )
+                message["headers"] = headers
+                REQUEST_SECONDS.observe(
+                    now - timings.started,
+                    route=_route_template(scope),
+                    method=scope.get("method", ""),
+                    status=str(status_code),
+                )
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            _request_timings.reset(token)
+
+
+def _route_template(scope: MutableMapping[str, Any]) -> str:
+    # Route templates keep label cardinality bounded (e.g. /explanations/{id}).
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
@@ -1,17 +1,21 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import List, Literal
+from typing import Dict, List, Literal, Optional
 
 from pydantic import BaseModel, ConfigDict, Field
 
 
+RiskLabel = Literal["Safe", "Adjust Dosage", "Toxic", "Ineffective", "Unknown"]
+Severity = Literal["none", "low", "moderate", "high", "critical"]
+
+
 class RiskAssessment(BaseModel):
     model_config = ConfigDict(extra="forbid")
 
-    risk_label: Literal["Safe", "Adjust Dosage", "Toxic", "Ineffective", "Unknown"]
+    risk_label: RiskLabel
     confidence_score: float
-    severity: Literal["none", "low", "moderate", "high", "critical"]
+    severity: Severity
 
 
 class DetectedVariant(BaseModel):
@@ -43,6 +47,23 @@ class LLMExplanation(BaseModel):
     clinical_guideline_reference: str
 
 
+class PendingExplanation(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    explanation_id: str
+    status: Literal["pending"]
+    poll_url: str
+    stream_url: str
+
+
+class ExplanationStatusResponse(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    explanation_id: str
+    status: Literal["pending", "ready"]
+    explanation: Optional[LLMExplanation] = None
+
+
 class QualityMetrics(BaseModel):
     model_config = ConfigDict(extra="forbid")
 
@@ -59,6 +80,73 @@ class AnalysisResponse(BaseModel):
     risk_assessment: RiskAssessment
     pharmacogenomic_profile: PharmacogenomicProfile
     clinical_recommendation: ClinicalRecommendation
-    llm_generated_explanation: LLMExplanation
+    llm_generated_explanation: Optional[LLMExplanation] = None
+    pending_explanation: Optional[PendingExplanation] = None
     quality_metrics: QualityMetrics
+    rule_set_version: str
+
+
+class SkippedDrug(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    drug: str
+    reason: str
+
+
+class MultiDrugAnalysisResponse(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    patient_id: str
+    timestamp: datetime
+    results: List[AnalysisResponse]
+    skipped_drugs: List[SkippedDrug]
+
+
+class BatchAnalysisItem(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    filename: str
+    status: Literal["ok", "error"]
+    analysis: Optional[MultiDrugAnalysisResponse] = None
+    error: Optional[str] = None
+
+
+class CohortAnalysisResponse(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    drug: str
+    timestamp: datetime
+    sample_count: int = Field(ge=0)
+    results: List[AnalysisResponse]
+    samples_without_variants: List[str]
+
+
+class GeneProfileEntry(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    gene: str
+    diplotype: str
+    phenotype: str
+    detected_variants: List[DetectedVariant]
+
+
+class PatientProfileResponse(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    patient_id: str
+    updated_at: datetime
+    allele_definitions_version: str
+    genes: List[GeneProfileEntry]
+    quality_metrics: QualityMetrics
+
+
+class AnalysisJobResponse(BaseModel):
+    model_config = ConfigDict(extra="forbid")
 
+    job_id: str
+    status: Literal["queued", "running", "succeeded", "failed"]
+    submitted_at: datetime
+    status_url: str
+    stages: Dict[str, float]
+    result: Optional[AnalysisResponse] = None
+    error: Optional[str] = None
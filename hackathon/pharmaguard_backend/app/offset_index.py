@@ -0,0 +1,316 @@
+"""
+Sidecar pharmacogene offset indexes for VCF files that are analyzed
+repeatedly.
+
+An index records, per gene in SUPPORTED_GENES, the byte offsets of the
+records that yielded variants, keyed by the SHA-256 of the uncompressed VCF.
+A later analysis of the same bytes reads only those lines instead of
+rescanning the whole file.
+
+Indexes for files already on disk can be built ahead of time (from the
+pharmaguard_backend directory):
+
+    VCF_OFFSET_INDEX_DIR=/var/lib/pharmaguard/offsets \
+        python -m app.offset_index /data/vcf/*.vcf
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+from array import array
+from typing import Dict, List, Optional, Tuple, Union
+
+from fastapi import HTTPException
+
+from .gene_rules import SUPPORTED_GENES
+from .vcf_parser import (
+    GeneOffsets,
+    VariantTable,
+    parse_vcf_buffer_offsets,
+    parse_vcf_offsets,
+)
+
+
+_MAGIC = b"PGXOFF1\n"
+_HEADER_LENGTH = struct.Struct("<I")
+
+
+class VcfOffsetIndex:
+    """
+    Offsets of the pharmacogene records of one VCF, stored as uint64 arrays
+    (8 bytes per record) behind a small JSON header.
+
+    `variant_count` is the number of variants the full scan produced; a
+    replay that yields a different count means the index is stale.
+    """
+
+    __slots__ = ("content_sha256", "size", "variant_count", "gene_offsets")
+
+    def __init__(
+        self,
+        content_sha256: str,
+        size: int,
+        variant_count: int,
+        gene_offsets: Dict[str, array],
+    ) -> None:
+        self.content_sha256 = content_sha256
+        self.size = size
+        self.variant_count = variant_count
+        self.gene_offsets = gene_offsets
+
+    @classmethod
+    def from_offsets(
+        cls, content_sha256: str, size: int, variant_count: int, offsets: GeneOffsets
+    ) -> "VcfOffsetIndex":
+        gene_offsets = {
+            gene: array("Q", offsets[gene])
+            for gene in SUPPORTED_GENES
+            if gene in offsets
+        }
+        return cls(content_sha256, size, variant_count, gene_offsets)
+
+    def offsets(self) -> List[int]:
+        """
+        Offsets of every indexed record line, in file order.
+        """
+        merged = set()
+        for gene_offsets in self.gene_offsets.values():
+            merged.update(gene_offsets)
+        return sorted(merged)
+
+    def to_bytes(self) -> bytes:
+        header = json.dumps(
+            {
+                "sha256": self.content_sha256,
+                "size": self.size,
+                "variants": self.variant_count,
+                "genes": {gene: len(o) for gene, o in self.gene_offsets.items()},
+            }
+        ).encode("utf-8")
+        parts = [_MAGIC, _HEADER_LENGTH.pack(len(header)), header]
+        for gene_offsets in self.gene_offsets.values():
+            if sys.byteorder != "little":
+                gene_offsets = array("Q", gene_offsets)
+                gene_offsets.byteswap()
+            parts.append(gene_offsets.tobytes())
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "VcfOffsetIndex":
+        """
+        Raises ValueError for anything that is not a complete index.
+        """
+        if not data.startswith(_MAGIC):
+            raise ValueError("not a VCF offset index")
+        pos = len(_MAGIC)
+        try:
+            (length,) = _HEADER_LENGTH.unpack_from(data, pos)
+            pos += _HEADER_LENGTH.size
+            header = json.loads(data[pos : pos + length])
+            pos += length
+            gene_offsets: Dict[str, array] = {}
+            for gene, count in header["genes"].items():
+                end = pos + 8 * int(count)
+                if gene not in SUPPORTED_GENES or end > len(data):
+                    raise ValueError(f"bad gene entry {gene!r}")
+                offsets = array("Q")
+                offsets.frombytes(data[pos:end])
+                if sys.byteorder != "little":
+                    offsets.byteswap()
+                gene_offsets[gene] = offsets
+                pos = end
+            if pos != len(data):
+                raise ValueError("trailing bytes")
+            return cls(
+                str(header["sha256"]),
+                int(header["size"]),
+                int(header["variants"]),
+                gene_offsets,
+            )
+        except (struct.error, KeyError, TypeError, AttributeError) as exc:
+            raise ValueError(str(exc)) from exc
+
+
+class OffsetIndexStore:
+    """
+    Offset indexes kept as one small file per content hash in `directory`
+    (shared by workers on the same host). Disabled when `directory` is None.
+
+    An index is only trusted for bytes of the recorded size whose replay
+    lands on record lines and yields the recorded variant count; anything
+    else invalidates (deletes) it and the caller falls back to a full scan,
+    which writes a fresh index. Writes are best-effort and atomic
+    (write-then-rename); the oldest files beyond `max_entries` are evicted.
+    """
+
+    def __init__(self, directory: Optional[str], max_entries: int = 4096) -> None:
+        self.directory = directory
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.writes = 0
+
+        if self.directory:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+            except OSError:
+                self.directory = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.directory is not None
+
+    def parse(
+        self, buf: Union[bytes, mmap.mmap], content_sha256: str
+    ) -> Tuple[bool, VariantTable]:
+        """
+        Parse an uncompressed VCF buffer whose SHA-256 is `content_sha256`,
+        reading only the indexed records when a valid index exists and
+        indexing the file during a full scan otherwise.
+        """
+        index = self.load(content_sha256)
+        if index is not None:
+            variants = None
+            if index.size == len(buf):
+                variants = parse_vcf_offsets(buf, index.offsets())
+            if variants is not None and len(variants) == index.variant_count:
+                self._count("hits")
+                return True, variants
+            self.invalidate(content_sha256)
+        else:
+            self._count("misses")
+
+        has_header, variants, offsets = parse_vcf_buffer_offsets(buf)
+        index = VcfOffsetIndex.from_offsets(
+            content_sha256, len(buf), len(variants), offsets
+        )
+        self.save(index)
+        return has_header, variants
+
+    def load(self, content_sha256: str) -> Optional[VcfOffsetIndex]:
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(content_sha256), "rb") as fh:
+                index = VcfOffsetIndex.from_bytes(fh.read())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            self.invalidate(content_sha256)
+            return None
+        if index.content_sha256 != content_sha256:
+            self.invalidate(content_sha256)
+            return None
+        return index
+
+    def save(self, index: VcfOffsetIndex) -> None:
+        if not self.directory:
+            return
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(index.to_bytes())
+            os.replace(tmp_path, self._path(index.content_sha256))
+            self._count("writes")
+            self._evict()
+        except OSError:
+            pass
+
+    def invalidate(self, content_sha256: str) -> None:
+        if not self.directory:
+            return
+        try:
+            os.remove(self._path(content_sha256))
+        except OSError:
+            pass
+        self._count("invalidations")
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "writes": self.writes,
+            }
+
+    def _count(self, field: str) -> None:
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def _path(self, content_sha256: str) -> str:
+        return os.path.join(self.directory or "", f"{content_sha256}.pgxoff")
+
+    def _evict(self) -> None:
+        with os.scandir(self.directory) as it:
+            files = [e for e in it if e.name.endswith(".pgxoff") and e.is_file()]
+        excess = len(files) - self.max_entries
+        if excess <= 0:
+            return
+        files.sort(key=lambda e: e.stat().st_mtime)
+        for e in files[:excess]:
+            try:
+                os.remove(e.path)
+            except OSError:
+                pass
+
+
+offset_index_store = OffsetIndexStore(
+    directory=os.getenv("VCF_OFFSET_INDEX_DIR") or None,
+    max_entries=int(os.getenv("VCF_OFFSET_INDEX_MAX_ENTRIES", "4096")),
+)
+
+
+def index_vcf_file(path: str, store: OffsetIndexStore) -> VcfOffsetIndex:
+    """
+    Build (or validate) the offset index of an uncompressed VCF on disk.
+    """
+    with open(path, "rb") as fh:
+        digest = hashlib.sha256()
+        for chunk in iter(lambda: fh.read(1024 * 1024), b""):
+            digest.update(chunk)
+        content_sha256 = digest.hexdigest()
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            store.parse(buf, content_sha256)
+    index = store.load(content_sha256)
+    if index is None:
+        raise OSError(f"could not write the index to {store.directory}")
+    return index
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Build pharmacogene offset indexes into VCF_OFFSET_INDEX_DIR."
+    )
+    parser.add_argument("paths", nargs="+", help="uncompressed .vcf files")
+    args = parser.parse_args()
+
+    if not offset_index_store.enabled:
+        parser.error("set VCF_OFFSET_INDEX_DIR to a writable directory")
+    failed = False
+    for path in args.paths:
+        try:
+            index = index_vcf_file(path, offset_index_store)
+        except (OSError, ValueError, HTTPException) as exc:
+            detail = getattr(exc, "detail", exc)
+            print(f"{path}: {detail}", file=sys.stderr)
+            failed = True
+            continue
+        genes = ", ".join(f"{g}={len(o)}" for g, o in index.gene_offsets.items())
+        print(f"{path}: {index.content_sha256[:12]} {genes or 'no variants'}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
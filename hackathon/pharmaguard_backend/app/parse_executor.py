@@ -0,0 +1,256 @@
+from __future__ import annotations
+
+import asyncio
+import io
+import mmap
+import os
+import threading
+from contextlib import contextmanager
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    BinaryIO,
+    Callable,
+    Dict,
+    Iterator,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from fastapi import HTTPException, status
+
+from .gene_rules import PHARMACOGENE_LOCI
+from .offset_index import offset_index_store
+from .utils import iter_vcf_file_chunks, map_vcf_file
+from .vcf_parser import (
+    VariantTable,
+    iter_indexed_vcf_lines,
+    parse_vcf_lines,
+    screen_vcf_buffer,
+    screen_vcf_chunks,
+)
+
+if TYPE_CHECKING:
+    from concurrent.futures import Executor
+
+    from .cohort import CohortGenotypes
+
+
+# "thread" (default) streams uploads straight from their spooled files;
+# "process" sidesteps the GIL but ships each upload's bytes to a worker.
+PARSE_EXECUTOR_KIND = os.getenv("PARSE_EXECUTOR_KIND", "thread").lower()
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", "0")) or min(4, os.cpu_count() or 1)
+# Parse jobs allowed to wait for a worker; beyond this requests get a 503.
+PARSE_QUEUE_DEPTH = int(os.getenv("PARSE_QUEUE_DEPTH", "32"))
+PARSE_RETRY_AFTER_SECONDS = int(os.getenv("PARSE_RETRY_AFTER_SECONDS", "1"))
+
+
+VcfSource = Union[BinaryIO, bytes]
+
+
+@contextmanager
+def _vcf_buffer(
+    source: VcfSource, compressed: bool
+) -> Iterator[Union[bytes, mmap.mmap, None]]:
+    """
+    The whole uncompressed VCF as one buffer, without copying it: raw bytes
+    as they are, or a memory map of the spooled upload. None for gzip
+    streams, in-memory uploads and empty files, which are read in chunks.
+    """
+    if compressed:
+        yield None
+    elif isinstance(source, bytes):
+        yield source or None
+    else:
+        mapped = map_vcf_file(source)
+        try:
+            yield mapped
+        finally:
+            if mapped is not None:
+                mapped.close()
+
+
+def _screened_vcf_lines(source: VcfSource, compressed: bool) -> Iterator[str]:
+    """
+    Candidate lines of a full scan. Uncompressed sources are screened in
+    place, so the file is never copied into Python buffers as a whole or in
+    chunks.
+    """
+    with _vcf_buffer(source, compressed) as buf:
+        if buf is not None:
+            yield from screen_vcf_buffer(buf)
+            return
+    fileobj = io.BytesIO(source) if isinstance(source, bytes) else source
+    yield from screen_vcf_chunks(iter_vcf_file_chunks(fileobj, compressed))
+
+
+def parse_vcf_source(
+    source: VcfSource,
+    compressed: bool,
+    index_bytes: Optional[bytes] = None,
+    content_sha256: Optional[str] = None,
+) -> Tuple[bool, VariantTable]:
+    """
+    Parse a VCF given as a binary file object or raw bytes; with
+    `index_bytes`, only the indexed pharmacogene loci are read. With the
+    SHA-256 of the uploaded bytes, uncompressed files go through the offset
+    index store, which reads only the records indexed by an earlier scan.
+    Module-level so it can run in a worker process.
+    """
+    if index_bytes is not None:
+        fileobj = io.BytesIO(source) if isinstance(source, bytes) else source
+        fileobj.seek(0)
+        return parse_vcf_lines(
+            iter_indexed_vcf_lines(fileobj, index_bytes, PHARMACOGENE_LOCI)
+        )
+    if content_sha256 is not None and offset_index_store.enabled:
+        with _vcf_buffer(source, compressed) as buf:
+            if buf is not None:
+                return offset_index_store.parse(buf, content_sha256)
+    # Full scans skip irrelevant records before decoding them.
+    return parse_vcf_lines(_screened_vcf_lines(source, compressed))
+
+
+def parse_vcf_cohort_source(
+    source: VcfSource, compressed: bool, index_bytes: Optional[bytes] = None
+) -> CohortGenotypes:
+    """
+    Multi-sample counterpart of `parse_vcf_source`.
+    """
+    # NumPy is only needed here; keep it off the cold-start import path.
+    from .cohort import parse_vcf_cohort_lines
+
+    if index_bytes is not None:
+        fileobj = io.BytesIO(source) if isinstance(source, bytes) else source
+        fileobj.seek(0)
+        lines = iter_indexed_vcf_lines(fileobj, index_bytes, PHARMACOGENE_LOCI)
+    else:
+        lines = _screened_vcf_lines(source, compressed)
+    return parse_vcf_cohort_lines(lines)
+
+
+class _ProcessError:
+    """
+    HTTPException raised in a worker process; HTTPException itself does not
+    round-trip through pickling.
+    """
+
+    def __init__(self, status_code: int, detail: Any) -> None:
+        self.status_code = status_code
+        self.detail = detail
+
+
+def _call_in_process(fn: Callable[..., Any], args: Tuple[Any, ...]) -> Any:
+    try:
+        return fn(*args)
+    except HTTPException as exc:
+        return _ProcessError(exc.status_code, exc.detail)
+
+
+class ParseExecutor:
+    """
+    Runs CPU-bound VCF parsing off the event loop on a bounded pool.
+
+    At most `max_workers` jobs run at once and up to `queue_depth` more may
+    wait for a worker. When both are full, `run` fails fast with a 503 and
+    a `Retry-After` header instead of queueing without bound.
+    """
+
+    def __init__(self, kind: str, max_workers: int, queue_depth: int) -> None:
+        self.kind = kind if kind in ("thread", "process") else "thread"
+        self.max_workers = max_workers
+        self.queue_depth = queue_depth
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self._running_threads = 0
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    @property
+    def uses_processes(self) -> bool:
+        return self.kind == "process"
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+            if self.uses_processes:
+                try:
+                    self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+                except (OSError, NotImplementedError):
+                    # Runtimes without process support fall back to threads.
+                    self.kind = "thread"
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="vcf-parse"
+                )
+        return self._executor
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        with self._lock:
+            if self.pending >= self.max_workers + self.queue_depth:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail={"error": "Server is busy parsing other uploads; retry shortly"},
+                    headers={"Retry-After": str(PARSE_RETRY_AFTER_SECONDS)},
+                )
+            self.pending += 1
+
+        try:
+            executor = self._get_executor()
+            if self.uses_processes:
+                future = executor.submit(_call_in_process, fn, args)
+            else:
+                future = executor.submit(self._run_counted, fn, args)
+        except BaseException:
+            self._job_done(None)
+            raise
+        # Released when the job finishes or is cancelled before starting,
+        # even if the awaiting request has gone away.
+        future.add_done_callback(self._job_done)
+        result = await asyncio.wrap_future(future)
+        if isinstance(result, _ProcessError):
+            raise HTTPException(status_code=result.status_code, detail=result.detail)
+        return result
+
+    def _run_counted(self, fn: Callable[..., Any], args: Tuple[Any, ...]) -> Any:
+        with self._lock:
+            self._running_threads += 1
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self._running_threads -= 1
+
+    def _job_done(self, _future: Any) -> None:
+        with self._lock:
+            self.pending -= 1
+            self.completed += 1
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            if self.uses_processes:
+                # Worker processes do not report back when a job starts.
+                running = min(self.pending, self.max_workers)
+            else:
+                running = self._running_threads
+            return {
+                "kind": self.kind,
+                "workers": self.max_workers,
+                "queue_depth": self.queue_depth,
+                "running": running,
+                "queued": self.pending - running,
+                "completed": self.completed,
+                "rejected": self.rejected,
+            }
+
+
+parse_executor = ParseExecutor(PARSE_EXECUTOR_KIND, PARSE_WORKERS, PARSE_QUEUE_DEPTH)
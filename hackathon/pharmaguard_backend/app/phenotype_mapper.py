@@ -1,13 +1,11 @@
 from __future__ import annotations
 
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple, Union
 
-from .gene_rules import (
-    SUPPORTED_GENES,
-    construct_diplotype_from_alleles,
-    map_diplotype_to_phenotype,
-)
-from .vcf_parser import ParsedVariant
+from .allele_caller import call_diplotype
+from .gene_rules import SUPPORTED_GENES
+from .rule_set import RuleSet, active_rules
+from .vcf_parser import ParsedVariant, VariantTable
 
 
 class PhenotypeResult(Dict[str, str]):
@@ -16,10 +14,16 @@ class PhenotypeResult(Dict[str, str]):
     phenotype: str
 
 
-def build_gene_allele_map(variants: List[ParsedVariant]) -> Dict[str, List[str]]:
+Variants = Union[VariantTable, List[ParsedVariant]]
+
+
+def build_gene_allele_map(variants: Variants) -> Dict[str, List[str]]:
     """
     Group star alleles by gene.
     """
+    if isinstance(variants, VariantTable):
+        return {g: variants.stars_for_gene(g) for g in SUPPORTED_GENES}
+
     gene_to_alleles: Dict[str, List[str]] = {g: [] for g in SUPPORTED_GENES}
     for var in variants:
         if var.gene in gene_to_alleles:
@@ -27,17 +31,41 @@ def build_gene_allele_map(variants: List[ParsedVariant]) -> Dict[str, List[str]]
     return gene_to_alleles
 
 
+def map_diplotype_to_phenotype(
+    gene: str, diplotype: str, rules: Optional[RuleSet] = None
+) -> Tuple[str, str]:
+    """
+    Map (gene, diplotype) to a phenotype code.
+
+    Returns:
+        (phenotype_code, description)
+    """
+    return (rules or active_rules()).phenotype_for(gene, diplotype)
+
+
 def determine_gene_phenotype(
-    gene: str, variants: List[ParsedVariant]
+    gene: str, variants: Variants, rules: Optional[RuleSet] = None
 ) -> PhenotypeResult:
     """
     Determine diplotype and phenotype for a given gene based on parsed variants.
+
+    Alleles completed by the observed variants are called from the
+    definition table (see `allele_caller`), limited to the alleles the
+    diplotype table of `rules` (default: the active rule set) maps; records
+    they do not explain contribute their STAR annotations.
     """
     gene = gene.upper()
-    gene_to_alleles = build_gene_allele_map(variants)
-    alleles = gene_to_alleles.get(gene, [])
-    diplotype = construct_diplotype_from_alleles(alleles)
-    phenotype, _description = map_diplotype_to_phenotype(gene, diplotype)
+    rules = rules or active_rules()
+    if isinstance(variants, VariantTable):
+        # Indexed lookup of this gene's rows; no regrouping needed.
+        observations = variants.observations_for_gene(gene)
+        stars = variants.stars_for_gene(gene)
+    else:
+        rows = [v for v in variants if v.gene == gene]
+        observations = [(v.rsid, v.position, v.alt, v.dosage) for v in rows]
+        stars = [v.star for v in rows]
+    diplotype = call_diplotype(gene, observations, stars, rules.alleles_for(gene))
+    phenotype, _description = map_diplotype_to_phenotype(gene, diplotype, rules)
     return {
         "gene": gene,
         "diplotype": diplotype,
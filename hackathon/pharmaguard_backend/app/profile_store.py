@@ -0,0 +1,262 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class GeneProfile(NamedTuple):
+    gene: str
+    diplotype: str
+    phenotype: str
+    detected_rsids: List[str]
+
+
+class StoredProfile(NamedTuple):
+    patient_id: str
+    genes: List[GeneProfile]
+    vcf_parsing_success: bool
+    variants_detected_count: int
+    allele_definitions_version: str
+    updated_at: float
+
+
+class ProfileLookup(NamedTuple):
+    """
+    Result of a single-gene query: `gene` is None when the patient exists
+    but has no variants in that gene.
+    """
+
+    gene: Optional[GeneProfile]
+    vcf_parsing_success: bool
+    variants_detected_count: int
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS patients (
+    patient_id TEXT PRIMARY KEY,
+    vcf_parsing_success INTEGER NOT NULL,
+    variants_detected_count INTEGER NOT NULL,
+    allele_definitions_version TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS gene_profiles (
+    patient_id TEXT NOT NULL REFERENCES patients (patient_id) ON DELETE CASCADE,
+    gene TEXT NOT NULL,
+    diplotype TEXT NOT NULL,
+    phenotype TEXT NOT NULL,
+    detected_rsids TEXT NOT NULL,
+    PRIMARY KEY (patient_id, gene)
+) WITHOUT ROWID;
+"""
+
+
+class ProfileStore:
+    """
+    Per-patient genotype profiles (diplotype, phenotype and detected rsIDs
+    per gene) in an embedded SQLite database, keyed by a stable patient ID.
+
+    Profiles are written once per VCF and then read by primary key, so a
+    drug-risk query is a single indexed lookup with no upload or parsing.
+    One connection, opened on first use, is shared and serialized by a
+    lock; lookups take tens of microseconds, but a write can wait on other
+    workers' transactions, so async callers go through `asyncio.to_thread`.
+    If the database file cannot be opened, the store logs a warning and
+    falls back to an in-memory database for the life of the process.
+
+    `stats()` never touches the database: the patient count is read when
+    the connection opens and kept up to date by this process's writes
+    (writes by other workers sharing the file show up after a restart).
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn_: Optional[sqlite3.Connection] = None
+        self.patients: Optional[int] = None
+        self.lookups = 0
+        self.misses = 0
+        self.writes = 0
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        # Callers hold self._lock.
+        if self._conn_ is None:
+            try:
+                self._conn_ = self._connect(self.path)
+            except sqlite3.Error as exc:
+                logger.warning(
+                    "Profile store %s cannot be opened (%s); profiles are kept "
+                    "in memory and lost on restart",
+                    self.path,
+                    exc,
+                )
+                self.path = ":memory:"
+                self._conn_ = self._connect(self.path)
+            (self.patients,) = self._conn_.execute(
+                "SELECT COUNT(*) FROM patients"
+            ).fetchone()
+        return self._conn_
+
+    @staticmethod
+    def _connect(path: str) -> sqlite3.Connection:
+        if path != ":memory:":
+            directory = os.path.dirname(path)
+            if directory:
+                try:
+                    os.makedirs(directory, exist_ok=True)
+                except OSError as exc:
+                    raise sqlite3.OperationalError(str(exc)) from exc
+        conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA foreign_keys = ON")
+        if path != ":memory:":
+            # WAL lets readers in other workers proceed during writes.
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+        conn.executescript(_SCHEMA)
+        return conn
+
+    def save(
+        self,
+        patient_id: str,
+        genes: List[GeneProfile],
+        vcf_parsing_success: bool,
+        variants_detected_count: int,
+        allele_definitions_version: str,
+    ) -> StoredProfile:
+        """
+        Store (or replace) a patient's profile.
+        """
+        updated_at = time.time()
+        with self._lock:
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                replaced = conn.execute(
+                    "DELETE FROM patients WHERE patient_id = ?", (patient_id,)
+                ).rowcount
+                conn.execute(
+                    "INSERT INTO patients VALUES (?, ?, ?, ?, ?)",
+                    (
+                        patient_id,
+                        int(vcf_parsing_success),
+                        variants_detected_count,
+                        allele_definitions_version,
+                        updated_at,
+                    ),
+                )
+                conn.executemany(
+                    "INSERT INTO gene_profiles VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (
+                            patient_id,
+                            g.gene,
+                            g.diplotype,
+                            g.phenotype,
+                            json.dumps(g.detected_rsids),
+                        )
+                        for g in genes
+                    ],
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            self.writes += 1
+            if not replaced:
+                self.patients = (self.patients or 0) + 1
+        return StoredProfile(
+            patient_id=patient_id,
+            genes=sorted(genes, key=lambda g: g.gene),
+            vcf_parsing_success=vcf_parsing_success,
+            variants_detected_count=variants_detected_count,
+            allele_definitions_version=allele_definitions_version,
+            updated_at=updated_at,
+        )
+
+    def lookup(self, patient_id: str, gene: str) -> Optional[ProfileLookup]:
+        """
+        One gene of a stored profile; None if the patient is unknown.
+        """
+        with self._lock:
+            self.lookups += 1
+            row = self._conn.execute(
+                "SELECT p.vcf_parsing_success, p.variants_detected_count,"
+                " g.diplotype, g.phenotype, g.detected_rsids"
+                " FROM patients p LEFT JOIN gene_profiles g"
+                " ON g.patient_id = p.patient_id AND g.gene = ?"
+                " WHERE p.patient_id = ?",
+                (gene, patient_id),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+        success, count, diplotype, phenotype, rsids = row
+        gene_profile = (
+            GeneProfile(gene, diplotype, phenotype, json.loads(rsids))
+            if diplotype is not None
+            else None
+        )
+        return ProfileLookup(gene_profile, bool(success), count)
+
+    def get(self, patient_id: str) -> Optional[StoredProfile]:
+        with self._lock:
+            patient = self._conn.execute(
+                "SELECT vcf_parsing_success, variants_detected_count,"
+                " allele_definitions_version, updated_at"
+                " FROM patients WHERE patient_id = ?",
+                (patient_id,),
+            ).fetchone()
+            if patient is None:
+                return None
+            rows = self._conn.execute(
+                "SELECT gene, diplotype, phenotype, detected_rsids"
+                " FROM gene_profiles WHERE patient_id = ? ORDER BY gene",
+                (patient_id,),
+            ).fetchall()
+        success, count, version, updated_at = patient
+        return StoredProfile(
+            patient_id=patient_id,
+            genes=[GeneProfile(g, d, p, json.loads(r)) for g, d, p, r in rows],
+            vcf_parsing_success=bool(success),
+            variants_detected_count=count,
+            allele_definitions_version=version,
+            updated_at=updated_at,
+        )
+
+    def delete(self, patient_id: str) -> bool:
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM patients WHERE patient_id = ?", (patient_id,)
+            )
+            deleted = cursor.rowcount > 0
+            if deleted and self.patients:
+                self.patients -= 1
+            return deleted
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn_ is not None:
+                self._conn_.close()
+                self._conn_ = None
+
+    def stats(self) -> Dict[str, object]:
+        # Plain counter reads: never waits behind a write holding the lock,
+        # and `size` is None until the database has been opened.
+        return {
+            "path": self.path,
+            "size": self.patients,
+            "lookups": self.lookups,
+            "misses": self.misses,
+            "writes": self.writes,
+        }
+
+
+# Patient data is only written to disk when a path is configured.
+profile_store = ProfileStore(os.getenv("PROFILE_STORE_PATH", ":memory:"))
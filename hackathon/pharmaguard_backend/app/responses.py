@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, Type, Union
+
+from fastapi.responses import Response
+from pydantic import BaseModel
+from pydantic_core import to_json
+
+try:  # Optional: faster encoder with the same compact output.
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+
+# Response bodies built from the server's own computed values are trusted:
+# with this on (default), endpoints return pre-encoded JSON and FastAPI's
+# response_model validation/serialization is skipped. Set to "0" to send
+# every response through the Pydantic models again.
+FAST_RESPONSE_SERIALIZATION = os.getenv("FAST_RESPONSE_SERIALIZATION", "1") != "0"
+
+
+def dumps(payload: Any) -> bytes:
+    """
+    Encode a JSON-ready payload exactly as FastAPI's JSONResponse would:
+    compact separators, UTF-8, non-ASCII characters unescaped.
+    """
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(
+        payload,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def json_timestamp(value: datetime) -> str:
+    """
+    A datetime rendered the way Pydantic serializes it (e.g. a trailing
+    "Z" for UTC), so payloads match the models' JSON.
+    """
+    return to_json(value).decode("utf-8")[1:-1]
+
+
+class TrustedJSONResponse(Response):
+    """
+    JSON response for payloads the server built itself; FastAPI returns
+    Response instances as-is, without re-validating them.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def respond(
+    payload: Dict[str, Any], model: Type[BaseModel], status_code: int = 200
+) -> Union[TrustedJSONResponse, BaseModel]:
+    """
+    Return `payload` (shaped like `model` with None fields omitted) as a
+    pre-encoded response, or as a validated model when the fast path is off
+    (the route's own `status_code` then applies).
+    """
+    if FAST_RESPONSE_SERIALIZATION:
+        return TrustedJSONResponse(payload, status_code=status_code)
+    return model.model_validate(payload)
+
+
+def encode_line(payload: Dict[str, Any], model: Type[BaseModel]) -> bytes:
+    """
+    One NDJSON line for a streamed response.
+    """
+    if FAST_RESPONSE_SERIALIZATION:
+        return dumps(payload) + b"\n"
+    return model.model_validate(payload).model_dump_json(exclude_none=True).encode(
+        "utf-8"
+    ) + b"\n"
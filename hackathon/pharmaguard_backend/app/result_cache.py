@@ -0,0 +1,287 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+
+CacheEntry = Tuple[float, Any]
+
+
+class ResultCache:
+    """
+    Two-tier cache for per-upload analysis results, keyed by strings built
+    from the SHA-256 of the uploaded VCF bytes.
+
+    The memory tier is a bounded LRU. When `directory` is set, entries are
+    also written there as JSON files (one per key) and read back on memory
+    misses, so results survive restarts and are shared between workers on
+    the same host. Both tiers honour the same TTL; the disk tier evicts its
+    oldest files beyond `max_disk_entries`. Values must be JSON-serializable.
+
+    Disk writes are queued to a single background writer thread, which
+    keeps an in-memory index of this process's files in write order so
+    eviction never rescans the directory. `get` reads the disk tier on the
+    calling thread; async callers use `aget`/`get_or_compute`, which read it
+    in a worker thread.
+
+    `get_or_compute` coalesces concurrent misses for the same key so only
+    one caller runs the computation and the others await its result.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        ttl_seconds: float = 3600,
+        directory: Optional[str] = None,
+        max_disk_entries: int = 4096,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.directory = directory
+        self.max_disk_entries = max_disk_entries
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, "asyncio.Future[Any]"] = {}
+        self._writer: Optional[ThreadPoolExecutor] = None
+        # Disk file names, oldest write first; loaded by the writer thread.
+        self._disk_index: "Optional[OrderedDict[str, None]]" = None
+        self._disk_lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+        if self.directory:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+            except OSError:
+                self.directory = None
+
+    @staticmethod
+    def make_key(*parts: str) -> str:
+        return ":".join(parts)
+
+    def get(self, key: str) -> Optional[Any]:
+        """Look `key` up, reading the disk tier on this thread on a miss."""
+        now = time.time()
+        found, value = self._get_memory(key, now)
+        if found:
+            return value
+        return self._finish_disk_lookup(key, self._read_disk(key, now))
+
+    async def aget(self, key: str) -> Optional[Any]:
+        """`get` for the event loop: disk tier misses are read in a thread."""
+        now = time.time()
+        found, value = self._get_memory(key, now)
+        if found:
+            return value
+        entry = None
+        if self.directory:
+            entry = await asyncio.to_thread(self._read_disk, key, now)
+        return self._finish_disk_lookup(key, entry)
+
+    def put(self, key: str, value: Any) -> None:
+        """Store `value`; the disk copy is written by the background writer."""
+        entry = (time.time() + self.ttl_seconds, value)
+        with self._lock:
+            self._store_memory(key, entry)
+        if self.directory:
+            self._disk_writer().submit(self._write_disk, key, entry)
+
+    def flush(self) -> None:
+        """Wait for queued disk writes and stop the writer thread."""
+        with self._lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            writer.shutdown(wait=True)
+
+    async def get_or_compute(
+        self, key: str, compute: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        while True:
+            value = await self.aget(key)
+            if value is not None:
+                return value
+
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                break
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                # The leading request was cancelled; take over unless we were.
+                if not inflight.cancelled():
+                    raise
+
+        future: "asyncio.Future[Any]" = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await compute()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            future.exception()  # mark retrieved when nobody else is waiting
+            raise
+        finally:
+            del self._inflight[key]
+
+        self.put(key, value)
+        future.set_result(value)
+        return value
+
+    def keys(self, prefix: str = "") -> List[str]:
+        """
+        Unexpired memory-tier keys starting with `prefix`, least recently
+        used first. Does not count as a hit or touch LRU order.
+        """
+        now = time.time()
+        with self._lock:
+            return [
+                key
+                for key, (expires_at, _value) in self._entries.items()
+                if key.startswith(prefix) and expires_at > now
+            ]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "disk_enabled": self.directory is not None,
+            }
+
+    def _get_memory(self, key: str, now: float) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._entries[key]
+        return False, None
+
+    def _finish_disk_lookup(
+        self, key: str, entry: Optional[CacheEntry]
+    ) -> Optional[Any]:
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._store_memory(key, entry)
+        return entry[1]
+
+    def _store_memory(self, key: str, entry: CacheEntry) -> None:
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _disk_writer(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._writer is None:
+                self._writer = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix="result-cache-writer"
+                )
+            return self._writer
+
+    @staticmethod
+    def _disk_name(key: str) -> str:
+        return hashlib.sha256(key.encode("utf-8")).hexdigest() + ".json"
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.directory or "", self._disk_name(key))
+
+    def _read_disk(self, key: str, now: float) -> Optional[CacheEntry]:
+        if not self.directory:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as fh:
+                raw = json.load(fh)
+            if raw["key"] != key:
+                return None
+            expires_at = float(raw["expires_at"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        if expires_at <= now:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            with self._disk_lock:
+                if self._disk_index is not None:
+                    self._disk_index.pop(self._disk_name(key), None)
+            return None
+        return expires_at, raw["value"]
+
+    def _write_disk(self, key: str, entry: CacheEntry) -> None:
+        expires_at, value = entry
+        try:
+            # Write-then-rename so readers never see a partial entry.
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                json.dump({"key": key, "expires_at": expires_at, "value": value}, fh)
+            os.replace(tmp_path, self._disk_path(key))
+            self._evict_disk(self._disk_name(key))
+        except (OSError, TypeError, ValueError):
+            # Persistence is best-effort; the memory tier stays valid.
+            pass
+
+    def _evict_disk(self, written: str) -> None:
+        """
+        Record `written` as the newest file and delete the oldest ones
+        beyond `max_disk_entries`. The directory is scanned only once, to
+        seed the index with files left by earlier runs.
+        """
+        with self._disk_lock:
+            if self._disk_index is None:
+                with os.scandir(self.directory) as it:
+                    files = [e for e in it if e.name.endswith(".json") and e.is_file()]
+                files.sort(key=lambda e: e.stat().st_mtime)
+                self._disk_index = OrderedDict((e.name, None) for e in files)
+            index = self._disk_index
+            index[written] = None
+            index.move_to_end(written)
+            stale = [
+                index.popitem(last=False)[0]
+                for _ in range(len(index) - self.max_disk_entries)
+            ]
+        for name in stale:
+            try:
+                os.remove(os.path.join(self.directory or "", name))
+            except OSError:
+                pass
+
+result_cache = ResultCache(
+    max_entries=int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "256")),
+    ttl_seconds=float(os.getenv("RESULT_CACHE_TTL_SECONDS", "3600")),
+    directory=os.getenv("RESULT_CACHE_DIR") or None,
+    max_disk_entries=int(os.getenv("RESULT_CACHE_DISK_MAX_ENTRIES", "4096")),
+)
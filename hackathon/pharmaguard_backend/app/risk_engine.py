@@ -1,23 +1,18 @@
 from __future__ import annotations
 
-from typing import Dict
+from typing import Dict, List, Optional, Sequence
 
+from .rule_set import RuleSet, active_rules
 
-# Deterministic confidence scores by phenotype
-PHENOTYPE_CONFIDENCE: Dict[str, float] = {
-    "PM": 0.95,
-    "IM": 0.85,
-    "NM": 0.90,
-    "Unknown": 0.60,
-}
 
+# Phenotype confidence scores and the drug × phenotype rules are part of the
+# versioned rule set (data/rule_tables.json, data/risk_rules.json) and are
+# compiled into frozen lookups by `rule_set`.
 
-def _base_confidence_for_phenotype(phenotype: str) -> float:
-    phenotype_norm = phenotype or "Unknown"
-    return PHENOTYPE_CONFIDENCE.get(phenotype_norm, PHENOTYPE_CONFIDENCE["Unknown"])
 
-
-def assess_risk(drug: str, phenotype: str) -> Dict[str, object]:
+def assess_risk(
+    drug: str, phenotype: str, rules: Optional[RuleSet] = None
+) -> Dict[str, object]:
     """
     Deterministic rule-based risk engine.
 
@@ -28,113 +23,35 @@ def assess_risk(drug: str, phenotype: str) -> Dict[str, object]:
           "confidence_score": float,
         }
     """
-    drug = drug.upper()
-    phenotype_norm = phenotype or "Unknown"
-    confidence = _base_confidence_for_phenotype(phenotype_norm)
-
-    risk_label = "Unknown"
-    severity = "low"
-
-    # Example detailed logic for CLOPIDOGREL (CYP2C19)
-    if drug == "CLOPIDOGREL":
-        if phenotype_norm == "PM":
-            risk_label = "Ineffective"
-            severity = "high"
-        elif phenotype_norm == "IM":
-            risk_label = "Adjust Dosage"
-            severity = "moderate"
-        elif phenotype_norm == "NM":
-            risk_label = "Safe"
-            severity = "none"
-        else:
-            risk_label = "Unknown"
-            severity = "low"
-
-    # CODEINE (CYP2D6)
-    elif drug == "CODEINE":
-        if phenotype_norm == "PM":
-            risk_label = "Ineffective"
-            severity = "high"
-        elif phenotype_norm in ("URM", "RM"):
-            risk_label = "Toxic"
-            severity = "critical"
-        elif phenotype_norm == "IM":
-            risk_label = "Adjust Dosage"
-            severity = "moderate"
-        elif phenotype_norm == "NM":
-            risk_label = "Safe"
-            severity = "none"
-        else:
-            risk_label = "Unknown"
-            severity = "low"
-
-    # WARFARIN (CYP2C9)
-    elif drug == "WARFARIN":
-        if phenotype_norm == "PM":
-            risk_label = "Toxic"
-            severity = "high"
-        elif phenotype_norm == "IM":
-            risk_label = "Adjust Dosage"
-            severity = "moderate"
-        elif phenotype_norm == "NM":
-            risk_label = "Safe"
-            severity = "none"
-        else:
-            risk_label = "Unknown"
-            severity = "low"
-
-    # SIMVASTATIN (SLCO1B1)
-    elif drug == "SIMVASTATIN":
-        if phenotype_norm == "PM":
-            risk_label = "Toxic"
-            severity = "high"
-        elif phenotype_norm == "IM":
-            risk_label = "Adjust Dosage"
-            severity = "moderate"
-        elif phenotype_norm == "NM":
-            risk_label = "Safe"
-            severity = "none"
-        else:
-            risk_label = "Unknown"
-            severity = "low"
-
-    # AZATHIOPRINE (TPMT)
-    elif drug == "AZATHIOPRINE":
-        if phenotype_norm == "PM":
-            risk_label = "Toxic"
-            severity = "critical"
-        elif phenotype_norm == "IM":
-            risk_label = "Adjust Dosage"
-            severity = "high"
-        elif phenotype_norm == "NM":
-            risk_label = "Safe"
-            severity = "none"
-        else:
-            risk_label = "Unknown"
-            severity = "low"
+    rules = rules or active_rules()
+    rule = rules.risk_table.get((drug, phenotype)) or rules.risk_rule(drug, phenotype)
+    return {
+        "risk_label": rule.risk_label,
+        "severity": rule.severity,
+        "confidence_score": rule.confidence_score,
+    }
 
-    # FLUOROURACIL (DPYD)
-    elif drug == "FLUOROURACIL":
-        if phenotype_norm == "PM":
-            risk_label = "Toxic"
-            severity = "critical"
-        elif phenotype_norm == "IM":
-            risk_label = "Adjust Dosage"
-            severity = "high"
-        elif phenotype_norm == "NM":
-            risk_label = "Safe"
-            severity = "none"
-        else:
-            risk_label = "Unknown"
-            severity = "low"
 
-    # For RM/URM phenotypes, reuse NM confidence level when known
-    if phenotype_norm in ("RM", "URM"):
-        confidence = PHENOTYPE_CONFIDENCE.get("NM", confidence)
+def assess_risk_bulk(
+    drugs: Sequence[str], phenotypes: Sequence[str], rules: Optional[RuleSet] = None
+) -> Dict[str, List[object]]:
+    """
+    Score many (drug, phenotype) pairs in one call.
 
+    Returns column lists aligned with the inputs:
+        {"risk_label": [...], "severity": [...], "confidence_score": [...]}
+    """
+    if len(drugs) != len(phenotypes):
+        raise ValueError("drugs and phenotypes must have the same length")
+
+    # Inline the exact-match probe; only unnormalized pairs take the slow path.
+    rules = rules or active_rules()
+    table_get = rules.risk_table.get
+    matched = [
+        table_get((d, p)) or rules.risk_rule(d, p) for d, p in zip(drugs, phenotypes)
+    ]
     return {
-        "risk_label": risk_label,
-        "severity": severity,
-        "confidence_score": float(confidence),
+        "risk_label": [r.risk_label for r in matched],
+        "severity": [r.severity for r in matched],
+        "confidence_score": [r.confidence_score for r in matched],
     }
-
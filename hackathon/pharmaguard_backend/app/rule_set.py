@@ -0,0 +1,457 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from types import MappingProxyType
+from typing import (
+    Callable,
+    Dict,
+    FrozenSet,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    get_args,
+)
+
+from .gene_rules import SUPPORTED_GENES
+from .models import RiskLabel, Severity
+
+
+RULES_PATH = Path(
+    os.getenv("RULES_PATH") or Path(__file__).parent / "data" / "rule_tables.json"
+)
+# How often the rule file is checked for a new version; 0 disables reloads.
+RULES_RELOAD_INTERVAL_SECONDS = float(os.getenv("RULES_RELOAD_INTERVAL_SECONDS", "30"))
+
+# Responses skip model validation (see responses.py), so the risk table is
+# checked against the response schema's values when it is compiled.
+RISK_LABELS = frozenset(get_args(RiskLabel))
+SEVERITIES = frozenset(get_args(Severity))
+
+
+class RiskRule(NamedTuple):
+    risk_label: str
+    severity: str
+    confidence_score: float
+
+
+class RuleSet:
+    """
+    One compiled, immutable version of the rule tables: drug → gene,
+    (gene, diplotype) → (phenotype, description), phenotype confidence and
+    (drug, phenotype) → RiskRule.
+
+    Keys are normalized (upper-case drugs and genes) and fallbacks are
+    pre-filled at compile time, so lookups are single dict probes. A
+    request takes one RuleSet and uses it throughout, so a reload in the
+    middle of a request never mixes two versions.
+    """
+
+    __slots__ = (
+        "version",
+        "digest",
+        "drug_to_gene",
+        "diplotype_phenotypes",
+        "phenotype_descriptions",
+        "phenotype_confidence",
+        "phenotype_confidence_aliases",
+        "risk_table",
+        "default_risk",
+        "mapped_alleles",
+    )
+
+    def __init__(
+        self,
+        version: str,
+        digest: str,
+        drug_to_gene: Mapping[str, str],
+        diplotype_phenotypes: Mapping[Tuple[str, str], Tuple[str, str]],
+        phenotype_descriptions: Mapping[str, str],
+        phenotype_confidence: Mapping[str, float],
+        phenotype_confidence_aliases: Mapping[str, str],
+        risk_table: Mapping[Tuple[str, str], RiskRule],
+        default_risk: Tuple[str, str],
+    ) -> None:
+        self.version = version
+        self.digest = digest
+        self.drug_to_gene = drug_to_gene
+        self.diplotype_phenotypes = diplotype_phenotypes
+        self.phenotype_descriptions = phenotype_descriptions
+        self.phenotype_confidence = phenotype_confidence
+        self.phenotype_confidence_aliases = phenotype_confidence_aliases
+        self.risk_table = risk_table
+        self.default_risk = default_risk
+        # Star alleles each gene's diplotype table can map, for the caller.
+        mapped: Dict[str, Set[str]] = {}
+        for gene, diplotype in diplotype_phenotypes:
+            mapped.setdefault(gene, set()).update(diplotype.split("/"))
+        self.mapped_alleles: Mapping[str, FrozenSet[str]] = MappingProxyType(
+            {gene: frozenset(alleles) for gene, alleles in mapped.items()}
+        )
+
+    @property
+    def cache_key(self) -> str:
+        """
+        Version plus content digest, for keys of results derived from the
+        rules: an edited file that kept its version still gets new keys.
+        """
+        return f"{self.version}-{self.digest[:12]}"
+
+    def gene_for_drug(self, drug: str) -> Optional[str]:
+        return self.drug_to_gene.get(drug.upper())
+
+    def alleles_for(self, gene: str) -> FrozenSet[str]:
+        """
+        Star alleles that appear in `gene`'s diplotype → phenotype table.
+        """
+        return self.mapped_alleles.get(gene.upper(), frozenset())
+
+    def phenotype_for(self, gene: str, diplotype: str) -> Tuple[str, str]:
+        """
+        (phenotype code, description) for a diplotype. Unmapped diplotypes
+        are "Unknown", except the reference "*1/*1" which is normal.
+        """
+        mapped = self.diplotype_phenotypes.get((gene.upper(), diplotype))
+        if mapped is not None:
+            return mapped
+        phenotype = "NM" if diplotype == "*1/*1" else "Unknown"
+        return phenotype, self.phenotype_descriptions.get(
+            phenotype, "Unknown phenotype"
+        )
+
+    def base_confidence(self, phenotype: str) -> float:
+        phenotype_norm = phenotype or "Unknown"
+        phenotype_norm = self.phenotype_confidence_aliases.get(
+            phenotype_norm, phenotype_norm
+        )
+        confidence = self.phenotype_confidence
+        return confidence.get(phenotype_norm, confidence["Unknown"])
+
+    def risk_rule(self, drug: str, phenotype: str) -> RiskRule:
+        """
+        O(1) lookup of the compiled rule for a (drug, phenotype) pair.
+        """
+        phenotype_norm = phenotype or "Unknown"
+        rule = self.risk_table.get((drug, phenotype_norm))
+        if rule is None:
+            rule = self.risk_table.get((drug.upper(), phenotype_norm))
+        if rule is None:
+            rule = RiskRule(*self.default_risk, self.base_confidence(phenotype_norm))
+        return rule
+
+
+def _table(tables: Dict[str, object], key: str, required: bool = True) -> Dict:
+    value = tables.get(key)
+    if value is None and not required:
+        return {}
+    if not isinstance(value, dict):
+        raise ValueError(f"Invalid rule tables: {key} must be an object")
+    return value
+
+
+def compile_rule_set(
+    tables: Dict[str, object], risk_rules: Dict[str, object], digest: str = ""
+) -> RuleSet:
+    """
+    Compile rule tables (see data/rule_tables.json) and a risk rule table
+    (see data/risk_rules.json) into a RuleSet.
+
+    Raises ValueError for tables that are malformed or refer to genes
+    outside SUPPORTED_GENES.
+    """
+    version = str(tables.get("version") or "").strip()
+    if not version:
+        raise ValueError("Invalid rule tables: missing version")
+    descriptions = {
+        str(k): str(v)
+        for k, v in _table(tables, "phenotype_descriptions", required=False).items()
+    }
+    aliases = {
+        str(k): str(v)
+        for k, v in _table(
+            tables, "phenotype_confidence_aliases", required=False
+        ).items()
+    }
+    try:
+        confidence = {
+            str(k): float(v)
+            for k, v in _table(tables, "phenotype_confidence").items()
+        }
+    except (TypeError, ValueError) as exc:
+        raise ValueError(f"Invalid rule tables: {exc}") from exc
+    if "Unknown" not in confidence:
+        raise ValueError("Invalid rule tables: phenotype_confidence needs Unknown")
+
+    drug_to_gene: Dict[str, str] = {}
+    for drug, gene in _table(tables, "drug_to_gene").items():
+        gene = str(gene).upper()
+        if gene not in SUPPORTED_GENES:
+            raise ValueError(f"Invalid rule tables: {drug} maps to unsupported {gene}")
+        drug_to_gene[str(drug).upper()] = gene
+
+    diplotype_phenotypes: Dict[Tuple[str, str], Tuple[str, str]] = {}
+    for gene, mapping in _table(tables, "diplotype_phenotypes").items():
+        gene = str(gene).upper()
+        if gene not in SUPPORTED_GENES or not isinstance(mapping, dict):
+            raise ValueError(f"Invalid rule tables: bad diplotypes for {gene}")
+        for diplotype, phenotype in mapping.items():
+            phenotype = str(phenotype)
+            diplotype_phenotypes[(gene, str(diplotype))] = (
+                phenotype,
+                descriptions.get(phenotype, "Unknown phenotype"),
+            )
+
+    fields = dict(
+        version=version,
+        digest=digest,
+        drug_to_gene=MappingProxyType(drug_to_gene),
+        diplotype_phenotypes=MappingProxyType(diplotype_phenotypes),
+        phenotype_descriptions=MappingProxyType(descriptions),
+        phenotype_confidence=MappingProxyType(confidence),
+        phenotype_confidence_aliases=MappingProxyType(aliases),
+    )
+    # Risk rules default to the phenotype confidences compiled above.
+    partial = RuleSet(**fields, risk_table={}, default_risk=("Unknown", "low"))
+    risk_table, default_risk = compile_risk_rules(risk_rules, partial)
+    return RuleSet(**fields, risk_table=risk_table, default_risk=default_risk)
+
+
+def compile_risk_rules(
+    table: Dict[str, object], rules: RuleSet
+) -> Tuple[Mapping[Tuple[str, str], RiskRule], Tuple[str, str]]:
+    """
+    Compile a declarative rule table into a frozen (DRUG, phenotype) → RiskRule
+    mapping, plus the (risk_label, severity) default for unmatched pairs.
+    Rows without a confidence score use `rules.base_confidence`. Labels and
+    severities must be values of `RiskLabel` and `Severity` (models.py).
+
+    Table format (see data/risk_rules.json):
+        {
+          "default": {"risk_label": "Unknown", "severity": "low"},
+          "rules": [
+            {"drug": "CODEINE", "phenotype": "PM",
+             "risk_label": "Ineffective", "severity": "high",
+             "confidence_score": 0.95},   # optional
+            ...
+          ]
+        }
+    """
+    compiled: Dict[Tuple[str, str], RiskRule] = {}
+    try:
+        default = table.get("default") or {}
+        default_rule = _risk_outcome(
+            default.get("risk_label", "Unknown"),  # type: ignore[union-attr]
+            default.get("severity", "low"),  # type: ignore[union-attr]
+        )
+        for row in table.get("rules", []):  # type: ignore[union-attr]
+            drug = str(row["drug"]).upper()
+            phenotype = str(row["phenotype"])
+            confidence = row.get("confidence_score")
+            risk_label, severity = _risk_outcome(row["risk_label"], row["severity"])
+            compiled[(drug, phenotype)] = RiskRule(
+                risk_label=risk_label,
+                severity=severity,
+                confidence_score=float(
+                    confidence
+                    if confidence is not None
+                    else rules.base_confidence(phenotype)
+                ),
+            )
+    except (KeyError, TypeError, ValueError, AttributeError) as exc:
+        raise ValueError(f"Invalid risk rules: {exc!r}") from exc
+
+    # Pre-fill defaults for every known drug × known phenotype so the common
+    # lookups never fall through to the slow path.
+    drugs = {drug for drug, _ in compiled} | set(rules.drug_to_gene)
+    phenotypes = (
+        set(rules.phenotype_confidence)
+        | set(rules.phenotype_confidence_aliases)
+        | {phenotype for phenotype, _ in rules.diplotype_phenotypes.values()}
+        | {phenotype for _, phenotype in compiled}
+    )
+    for drug in drugs:
+        for phenotype in phenotypes:
+            compiled.setdefault(
+                (drug, phenotype),
+                RiskRule(*default_rule, rules.base_confidence(phenotype)),
+            )
+
+    return MappingProxyType(compiled), default_rule
+
+
+def _risk_outcome(risk_label: object, severity: object) -> Tuple[str, str]:
+    if risk_label not in RISK_LABELS:
+        raise ValueError(f"unknown risk_label {risk_label!r}")
+    if severity not in SEVERITIES:
+        raise ValueError(f"unknown severity {severity!r}")
+    return str(risk_label), str(severity)
+
+
+def load_rule_set(path: Path = RULES_PATH) -> RuleSet:
+    """
+    Read and compile a rule file. Its `risk_rules` entry names the risk
+    table file (relative to the rule file) or holds the table inline.
+    """
+    raw = path.read_bytes()
+    digest = hashlib.sha256(raw)
+    try:
+        tables = json.loads(raw)
+        risk_rules = tables.get("risk_rules")
+        if isinstance(risk_rules, str):
+            risk_raw = (path.parent / risk_rules).read_bytes()
+            digest.update(risk_raw)
+            risk_rules = json.loads(risk_raw)
+    except AttributeError as exc:
+        raise ValueError(f"Invalid rule tables: {exc!r}") from exc
+    if not isinstance(risk_rules, dict):
+        raise ValueError("Invalid rule tables: risk_rules must be a file or table")
+    return compile_rule_set(tables, risk_rules, digest.hexdigest())
+
+
+def rule_sources(path: Path) -> List[Path]:
+    """
+    The files a rule set is loaded from: `path` and, when it names one, the
+    risk table file. An unreadable rule file yields just `path`.
+    """
+    try:
+        risk_rules = json.loads(path.read_bytes()).get("risk_rules")
+    except (OSError, ValueError, AttributeError):
+        return [path]
+    if isinstance(risk_rules, str):
+        return [path, path.parent / risk_rules]
+    return [path]
+
+
+def _file_signature(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _signature(sources: List[Path]) -> Tuple[Optional[Tuple[int, int]], ...]:
+    return tuple(_file_signature(source) for source in sources)
+
+
+class RuleRegistry:
+    """
+    Holds the active RuleSet and swaps in new versions at runtime.
+
+    A reload reads and compiles the rule file off the event loop, then runs
+    the registered warm-up hooks against the new RuleSet (e.g. to fill
+    caches keyed by its version), and only then replaces the active
+    reference in a single assignment. Requests already running keep the
+    RuleSet they started with. A file that fails to load is reported and
+    the current rules stay active.
+
+    With a positive `reload_interval`, `start()` polls the mtime and size
+    of the rule file and of the risk table file it names; deploy a new
+    version by atomically replacing the files (or the symlink `path` points
+    to).
+    """
+
+    def __init__(self, path: Path, reload_interval: float) -> None:
+        self.path = path
+        self.reload_interval = reload_interval
+        self._sources = rule_sources(path)
+        self._signature = _signature(self._sources)
+        # Import fails loudly if the shipped rules are invalid.
+        self._active = load_rule_set(path)
+        self._warmups: List[Callable[[RuleSet], None]] = []
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.loaded_at = time.time()
+        self.reloads = 0
+        self.reload_failures = 0
+        self.last_error: Optional[str] = None
+
+    @property
+    def active(self) -> RuleSet:
+        return self._active
+
+    def add_warmup(self, warm: Callable[[RuleSet], None]) -> None:
+        """
+        Run `warm(new_rules)` before each new RuleSet becomes active.
+        """
+        self._warmups.append(warm)
+
+    def reload(self) -> RuleSet:
+        """
+        Load, warm and activate the rule file. Raises OSError or ValueError
+        (keeping the current rules) if it cannot be loaded.
+        """
+        with self._lock:
+            sources = rule_sources(self.path)
+            signature = _signature(sources)
+            try:
+                rules = load_rule_set(self.path)
+            except (OSError, ValueError) as exc:
+                # Not retried until a file changes again.
+                self._sources = sources
+                self._signature = signature
+                self.reload_failures += 1
+                self.last_error = str(exc)
+                raise
+            for warm in self._warmups:
+                warm(rules)
+            self._active = rules
+            self._sources = sources
+            self._signature = signature
+            self.loaded_at = time.time()
+            self.reloads += 1
+            self.last_error = None
+            return rules
+
+    def reload_if_changed(self) -> bool:
+        if _signature(self._sources) == self._signature:
+            return False
+        try:
+            self.reload()
+        except (OSError, ValueError):
+            return False
+        return True
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            await asyncio.to_thread(self.reload_if_changed)
+
+    def start(self) -> None:
+        if self.reload_interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._watch())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> Dict[str, object]:
+        rules = self._active
+        return {
+            "version": rules.version,
+            "digest": rules.digest[:12],
+            "path": str(self.path),
+            "loaded_at": self.loaded_at,
+            "reloads": self.reloads,
+            "reload_failures": self.reload_failures,
+            "last_error": self.last_error,
+        }
+
+
+rule_registry = RuleRegistry(RULES_PATH, RULES_RELOAD_INTERVAL_SECONDS)
+
+
+def active_rules() -> RuleSet:
+    """
+    The current RuleSet; take it once per request.
+    """
+    return rule_registry.active
@@ -0,0 +1,399 @@
+from __future__ import annotations
+
+import gzip
+import struct
+import zlib
+from dataclasses import dataclass, field
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+
+# BGZF block layout (SAM/BAM spec, section 4.1): a gzip member whose extra
+# field carries a "BC" subfield holding the total block size minus one.
+_BGZF_HEADER = struct.Struct("<4BI2BH")
+_BGZF_MAGIC = (31, 139, 8, 4)
+
+TBI_MAGIC = b"TBI\x01"
+_TBI_BIN = struct.Struct("<Ii")  # bin, n_chunk
+_CSI_BIN = struct.Struct("<IQi")  # bin, loffset, n_chunk
+CSI_MAGIC = b"CSI\x01"
+
+# Tabix indexes are CSI indexes with fixed binning parameters.
+TBI_MIN_SHIFT = 14
+TBI_DEPTH = 5
+
+# Tabix "format" field: low 16 bits are the preset, 0x10000 marks 0-based coords.
+TABIX_PRESET_VCF = 2
+TABIX_ZERO_BASED = 0x10000
+
+
+def _virtual_offset(coffset: int, uoffset: int) -> int:
+    return (coffset << 16) | uoffset
+
+
+class BgzfReader:
+    """
+    Random-access line reader over a BGZF-compressed file.
+
+    Positions are BGZF virtual offsets (compressed block offset << 16 |
+    offset inside the uncompressed block). Only the blocks actually touched
+    are decompressed; the most recently used block is kept in memory.
+    """
+
+    def __init__(self, fileobj: BinaryIO) -> None:
+        self._fileobj = fileobj
+        self._block_coffset = -1
+        self._block_data = b""
+        self._next_coffset = 0
+        self._within = 0
+
+    def _load_block(self, coffset: int) -> None:
+        if coffset == self._block_coffset:
+            return
+
+        self._fileobj.seek(coffset)
+        header = self._fileobj.read(_BGZF_HEADER.size)
+        if not header:
+            # End of file: expose an empty block so readers stop cleanly.
+            self._block_coffset = coffset
+            self._block_data = b""
+            self._next_coffset = coffset
+            return
+        if len(header) < _BGZF_HEADER.size:
+            raise ValueError("Truncated BGZF block header")
+
+        id1, id2, cm, flg, _mtime, _xfl, _os, xlen = _BGZF_HEADER.unpack(header)
+        if (id1, id2, cm, flg) != _BGZF_MAGIC:
+            raise ValueError("File is not BGZF-compressed")
+
+        extra = self._fileobj.read(xlen)
+        block_size = None
+        pos = 0
+        while pos + 4 <= len(extra):
+            (slen,) = struct.unpack_from("<H", extra, pos + 2)
+            if extra[pos : pos + 2] == b"BC" and slen == 2:
+                block_size = struct.unpack_from("<H", extra, pos + 4)[0] + 1
+                break
+            pos += 4 + slen
+        if block_size is None:
+            raise ValueError("Missing BGZF block size field")
+
+        remaining = block_size - _BGZF_HEADER.size - xlen
+        payload = self._fileobj.read(remaining)
+        if len(payload) < remaining:
+            raise ValueError("Truncated BGZF block")
+
+        # Payload is raw deflate data followed by CRC32 and ISIZE.
+        data = zlib.decompress(payload[:-8], -15)
+
+        self._block_coffset = coffset
+        self._block_data = data
+        self._next_coffset = coffset + block_size
+
+    def seek(self, virtual_offset: int) -> None:
+        coffset, uoffset = virtual_offset >> 16, virtual_offset & 0xFFFF
+        self._load_block(coffset)
+        if uoffset > len(self._block_data):
+            raise ValueError("Virtual offset outside BGZF block")
+        self._within = uoffset
+
+    def tell(self) -> int:
+        if self._within == len(self._block_data) and self._block_data:
+            # Canonical position for the end of a block is the start of the next.
+            return _virtual_offset(self._next_coffset, 0)
+        return _virtual_offset(self._block_coffset, self._within)
+
+    def readline(self) -> bytes:
+        """
+        Read one line (including its trailing newline), crossing block
+        boundaries as needed. Returns b"" at end of file.
+        """
+        parts: List[bytes] = []
+        while True:
+            if self._within >= len(self._block_data):
+                if self._next_coffset == self._block_coffset:
+                    break  # end of file
+                # Empty blocks (e.g. the BGZF EOF marker) are skipped over.
+                self._load_block(self._next_coffset)
+                self._within = 0
+                continue
+
+            newline = self._block_data.find(b"\n", self._within)
+            if newline == -1:
+                parts.append(self._block_data[self._within :])
+                self._within = len(self._block_data)
+                continue
+
+            parts.append(self._block_data[self._within : newline + 1])
+            self._within = newline + 1
+            break
+        return b"".join(parts)
+
+
+@dataclass
+class TabixIndex:
+    """
+    Tabix/CSI index over a BGZF file: the column layout of the indexed file
+    plus per-reference bins of (begin, end) virtual offset chunks.
+
+    Only the byte offset of each reference section is recorded up front;
+    bins for a reference are decoded the first time it is queried.
+    """
+
+    min_shift: int
+    depth: int
+    preset: int
+    col_seq: int
+    col_beg: int
+    col_end: int
+    meta_char: bytes
+    ref_names: List[str]
+    is_csi: bool
+    data: bytes
+    ref_offsets: List[int]
+    _ref_cache: Dict[int, Tuple[Dict[int, List[Tuple[int, int]]], List[int]]] = (
+        field(default_factory=dict, repr=False)
+    )
+
+    def ref_id(self, chrom: str) -> Optional[int]:
+        """
+        Resolve a contig name, tolerating the presence or absence of a
+        "chr" prefix in the indexed file.
+        """
+        candidates = [chrom]
+        if chrom.startswith("chr"):
+            candidates.append(chrom[3:])
+        else:
+            candidates.append(f"chr{chrom}")
+        for name in candidates:
+            if name in self.ref_names:
+                return self.ref_names.index(name)
+        return None
+
+    def _ref_bins(
+        self, rid: int
+    ) -> Tuple[Dict[int, List[Tuple[int, int]]], List[int]]:
+        cached = self._ref_cache.get(rid)
+        if cached is None:
+            ref_bins, ioffs, _ = _read_ref_section(
+                self.data, self.ref_offsets[rid], self.is_csi
+            )
+            cached = self._ref_cache[rid] = (ref_bins, ioffs)
+        return cached
+
+    def chunks_for_region(
+        self, chrom: str, start: int, end: int
+    ) -> List[Tuple[int, int]]:
+        """
+        Return merged virtual offset chunks that may contain records
+        overlapping the 1-based inclusive region chrom:start-end.
+        """
+        rid = self.ref_id(chrom)
+        if rid is None:
+            return []
+
+        beg0 = max(start - 1, 0)
+        ref_bins, ioffs = self._ref_bins(rid)
+
+        # The linear index (tabix only) gives the lowest offset of any record
+        # overlapping each 16 kb window; earlier chunks can be skipped.
+        min_offset = 0
+        if ioffs:
+            min_offset = ioffs[min(beg0 >> self.min_shift, len(ioffs) - 1)]
+
+        chunks: List[Tuple[int, int]] = []
+        for bin_id in _reg2bins(beg0, end, self.min_shift, self.depth):
+            for cnk_beg, cnk_end in ref_bins.get(bin_id, ()):
+                if cnk_end > min_offset:
+                    chunks.append((max(cnk_beg, min_offset), cnk_end))
+
+        chunks.sort()
+        merged: List[Tuple[int, int]] = []
+        for cnk_beg, cnk_end in chunks:
+            if merged and cnk_beg <= merged[-1][1]:
+                if cnk_end > merged[-1][1]:
+                    merged[-1] = (merged[-1][0], cnk_end)
+            else:
+                merged.append((cnk_beg, cnk_end))
+        return merged
+
+
+def _reg2bins(beg: int, end: int, min_shift: int, depth: int) -> Iterator[int]:
+    """
+    Yield all bins overlapping the 0-based half-open interval [beg, end),
+    following the CSI specification.
+    """
+    end -= 1
+    shift = min_shift + depth * 3
+    offset = 0
+    for level in range(depth + 1):
+        for bin_id in range(offset + (beg >> shift), offset + (end >> shift) + 1):
+            yield bin_id
+        offset += 1 << (level * 3)
+        shift -= 3
+
+
+def _parse_tabix_header(data: bytes, pos: int) -> Tuple[Dict[str, object], int]:
+    preset, col_seq, col_beg, col_end, meta, _skip, l_nm = struct.unpack_from(
+        "<7i", data, pos
+    )
+    pos += 28
+    names = data[pos : pos + l_nm].split(b"\x00")
+    pos += l_nm
+    header = {
+        "preset": preset,
+        "col_seq": col_seq,
+        "col_beg": col_beg,
+        "col_end": col_end,
+        "meta_char": bytes([meta]),
+        "ref_names": [n.decode("utf-8", errors="replace") for n in names if n],
+    }
+    return header, pos
+
+
+def _read_ref_section(
+    data: bytes, pos: int, is_csi: bool, decode: bool = True
+) -> Tuple[Dict[int, List[Tuple[int, int]]], List[int], int]:
+    """
+    Read one reference's bins (and tabix linear index) starting at `pos`.
+    With decode=False the section is only skipped over, which is how the
+    loader locates each reference without materializing every bin.
+
+    Returns (bins, linear_offsets, end_position).
+    """
+    bin_header = _CSI_BIN if is_csi else _TBI_BIN
+    (n_bin,) = struct.unpack_from("<i", data, pos)
+    pos += 4
+
+    ref_bins: Dict[int, List[Tuple[int, int]]] = {}
+    for _ in range(n_bin):
+        fields = bin_header.unpack_from(data, pos)
+        bin_id, n_chunk = fields[0], fields[-1]
+        pos += bin_header.size
+        if decode:
+            flat = struct.unpack_from(f"<{2 * n_chunk}Q", data, pos)
+            ref_bins[bin_id] = list(zip(flat[0::2], flat[1::2]))
+        pos += 16 * n_chunk
+
+    ioffs: List[int] = []
+    if not is_csi:
+        (n_intv,) = struct.unpack_from("<i", data, pos)
+        pos += 4
+        if decode:
+            ioffs = list(struct.unpack_from(f"<{n_intv}Q", data, pos))
+        pos += 8 * n_intv
+
+    return ref_bins, ioffs, pos
+
+
+def load_index(index_bytes: bytes) -> TabixIndex:
+    """
+    Parse a BGZF-compressed .tbi or .csi index.
+    """
+    try:
+        data = gzip.decompress(index_bytes)
+    except (OSError, EOFError, zlib.error) as exc:
+        raise ValueError("Index is not BGZF-compressed") from exc
+
+    if data.startswith(TBI_MAGIC):
+        is_csi = False
+    elif data.startswith(CSI_MAGIC):
+        is_csi = True
+    else:
+        raise ValueError("Unrecognized index format (expected .tbi or .csi)")
+
+    try:
+        if is_csi:
+            min_shift, depth, l_aux = struct.unpack_from("<3i", data, 4)
+            if l_aux < 28:
+                raise ValueError("CSI index lacks tabix column metadata")
+            header, _ = _parse_tabix_header(data, 16)
+            pos = 16 + l_aux
+            (n_ref,) = struct.unpack_from("<i", data, pos)
+            pos += 4
+        else:
+            min_shift, depth = TBI_MIN_SHIFT, TBI_DEPTH
+            (n_ref,) = struct.unpack_from("<i", data, 4)
+            header, pos = _parse_tabix_header(data, 8)
+
+        ref_offsets: List[int] = []
+        for _ in range(n_ref):
+            ref_offsets.append(pos)
+            pos = _read_ref_section(data, pos, is_csi, decode=False)[2]
+    except struct.error as exc:
+        raise ValueError("Truncated index file") from exc
+
+    return TabixIndex(
+        min_shift=min_shift,
+        depth=depth,
+        is_csi=is_csi,
+        data=data,
+        ref_offsets=ref_offsets,
+        **header,  # type: ignore[arg-type]
+    )
+
+
+def iter_header_lines(reader: BgzfReader, index: TabixIndex) -> Iterator[bytes]:
+    """
+    Yield the meta/header lines at the start of the compressed file.
+    """
+    reader.seek(0)
+    while True:
+        line = reader.readline()
+        if not line or not line.startswith(index.meta_char):
+            return
+        yield line
+
+
+def _record_span(cols: List[bytes], index: TabixIndex) -> Tuple[int, int]:
+    """
+    Return the 1-based inclusive span covered by a record.
+    """
+    start = int(cols[index.col_beg - 1])
+    if index.preset & TABIX_ZERO_BASED:
+        start += 1
+
+    if (index.preset & 0xFFFF) == TABIX_PRESET_VCF:
+        ref = cols[3] if len(cols) > 3 else b""
+        end = start + max(len(ref), 1) - 1
+    elif index.col_end:
+        end = int(cols[index.col_end - 1])
+    else:
+        end = start
+    return start, end
+
+
+def iter_region_lines(
+    reader: BgzfReader, index: TabixIndex, chrom: str, start: int, end: int
+) -> Iterator[Tuple[int, bytes]]:
+    """
+    Yield (virtual_offset, line) for records overlapping a 1-based inclusive
+    region, decompressing only the BGZF blocks referenced by the index.
+    """
+    rid = index.ref_id(chrom)
+    if rid is None:
+        return
+    ref_name = index.ref_names[rid].encode("utf-8")
+
+    for cnk_beg, cnk_end in index.chunks_for_region(chrom, start, end):
+        reader.seek(cnk_beg)
+        while reader.tell() < cnk_end:
+            offset = reader.tell()
+            line = reader.readline()
+            if not line:
+                break
+            if line.startswith(index.meta_char):
+                continue
+
+            cols = line.rstrip(b"\r\n").split(b"\t")
+            if len(cols) < max(index.col_seq, index.col_beg):
+                continue
+            if cols[index.col_seq - 1] != ref_name:
+                break
+
+            rec_start, rec_end = _record_span(cols, index)
+            if rec_start > end:
+                # Records are coordinate-sorted within a reference.
+                break
+            if rec_end < start:
+                continue
+            yield offset, line
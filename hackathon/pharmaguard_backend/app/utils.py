@@ -1,13 +1,32 @@
 from __future__ import annotations
 
+import gzip
+import hashlib
+import io
+import mmap
+import os
 import uuid
 from datetime import datetime, timezone
-from typing import List
+from typing import BinaryIO, Iterator, List, Optional
 
 from fastapi import HTTPException, status, UploadFile
 
 
-MAX_VCF_SIZE_BYTES = 5 * 1024 * 1024  # 5 MB
+# Streaming ingestion reads uploads in fixed-size chunks, so memory use does not
+# depend on file size. Single-file uploads are limited on their uncompressed
+# size (default 1 GB, 0 disables the limit); batches have their own limits
+# (see `batch`).
+VCF_STREAM_CHUNK_SIZE = 1024 * 1024  # 1 MB
+MAX_STREAMED_VCF_SIZE_BYTES: Optional[int] = (
+    int(os.getenv("MAX_STREAMED_VCF_SIZE_BYTES", str(1024**3))) or None
+)
+
+
+def is_serverless_runtime() -> bool:
+    """
+    True inside AWS Lambda-based runtimes (Netlify Functions included).
+    """
+    return bool(os.getenv("AWS_LAMBDA_FUNCTION_NAME"))
 
 
 def get_current_timestamp() -> datetime:
@@ -27,38 +46,112 @@ def normalize_drug_input(drug_input: str) -> List[str]:
     return [d.strip().upper() for d in drug_input.split(",") if d.strip()]
 
 
-async def read_and_validate_vcf_file(upload_file: UploadFile) -> str:
+def is_compressed_vcf_filename(filename: str) -> bool:
+    return filename.lower().endswith((".vcf.gz", ".vcf.bgz"))
+
+
+def is_vcf_index_filename(filename: str) -> bool:
+    return filename.lower().endswith((".tbi", ".csi"))
+
+
+def hash_upload_file(
+    upload_file: UploadFile, chunk_size: int = VCF_STREAM_CHUNK_SIZE
+) -> str:
     """
-    Read uploaded VCF file contents and enforce size/security constraints.
+    SHA-256 hex digest of an upload's raw bytes, leaving it rewound.
     """
-    try:
-        content = await upload_file.read()
-    except Exception as exc:  # pragma: no cover - defensive
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail={"error": "Failed to read uploaded file"},
-        ) from exc
-
-    if not content:
+    fileobj = upload_file.file
+    fileobj.seek(0)
+    digest = hashlib.sha256()
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            break
+        digest.update(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+def check_streamed_vcf_size(size: int) -> None:
+    """
+    Reject (400) a VCF of `size` bytes over the streamed size limit.
+    """
+    if MAX_STREAMED_VCF_SIZE_BYTES and size > MAX_STREAMED_VCF_SIZE_BYTES:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail={"error": "Empty VCF file"},
+            detail={"error": "VCF file exceeds configured size limit"},
         )
 
-    if len(content) > MAX_VCF_SIZE_BYTES:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail={"error": "VCF file exceeds 5MB limit"},
-        )
 
-    # Decode as UTF-8, replacing invalid bytes to avoid crashes
+def map_vcf_file(fileobj: BinaryIO) -> Optional[mmap.mmap]:
+    """
+    Memory-map an uncompressed VCF that has been spooled to disk, enforcing
+    the streamed size limit. Returns None when the file has no usable
+    descriptor (in-memory uploads, e.g. a SpooledTemporaryFile that has not
+    rolled over) or is empty, so callers fall back to reading chunks.
+    """
+    if getattr(fileobj, "_rolled", True) is False:
+        return None
+    try:
+        fileobj.flush()
+        mapped = mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+        return None
     try:
-        text = content.decode("utf-8", errors="replace")
-    except Exception as exc:  # pragma: no cover
+        check_streamed_vcf_size(len(mapped))
+    except HTTPException:
+        mapped.close()
+        raise
+    return mapped
+
+
+def iter_vcf_file_chunks(
+    fileobj: BinaryIO,
+    compressed: bool,
+    chunk_size: int = VCF_STREAM_CHUNK_SIZE,
+    max_bytes: Optional[int] = None,
+) -> Iterator[bytes]:
+    """
+    Read a (optionally gzipped) VCF file object as raw byte chunks,
+    enforcing a limit on the uncompressed size (default: the streamed size
+    limit; 0 for none) and rejecting empty files.
+    """
+    if max_bytes is None:
+        max_bytes = MAX_STREAMED_VCF_SIZE_BYTES
+    fileobj.seek(0)
+    stream = fileobj
+    if compressed:
+        # Un-indexed .vcf.gz uploads are decompressed on the fly.
+        stream = gzip.GzipFile(fileobj=fileobj, mode="rb")
+
+    total_bytes = 0
+    while True:
+        try:
+            chunk = stream.read(chunk_size)
+        except (OSError, EOFError) as exc:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail={"error": "Invalid gzip-compressed VCF file"},
+            ) from exc
+        except Exception as exc:  # pragma: no cover - defensive
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail={"error": "Failed to read uploaded file"},
+            ) from exc
+
+        if not chunk:
+            break
+
+        total_bytes += len(chunk)
+        if max_bytes and total_bytes > max_bytes:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail={"error": "VCF file exceeds configured size limit"},
+            )
+        yield chunk
+
+    if total_bytes == 0:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail={"error": "Unable to decode VCF file as UTF-8"},
-        ) from exc
-
-    return text
-
+            detail={"error": "Empty VCF file"},
+        )
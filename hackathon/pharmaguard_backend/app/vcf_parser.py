@@ -1,18 +1,207 @@
 from __future__ import annotations
 
+import mmap
+import sys
+from array import array
 from dataclasses import dataclass
-from typing import List, Dict, Tuple
+from typing import (
+    Any,
+    BinaryIO,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 
 from fastapi import HTTPException, status
 
-from .gene_rules import SUPPORTED_GENES
+from .allele_caller import Observation
+from .gene_rules import PHARMACOGENE_LOCUS_FLANK, SUPPORTED_GENES
+from .tabix import BgzfReader, iter_header_lines, iter_region_lines, load_index
 
 
-@dataclass
+@dataclass(slots=True)
 class ParsedVariant:
     gene: str
     rsid: str
     star: str
+    position: int = 0
+    alt: str = ""
+    dosage: int = 1
+
+
+# Genes are stored as one-byte codes; the order follows SUPPORTED_GENES.
+GENE_CODES: Dict[str, int] = {gene: code for code, gene in enumerate(SUPPORTED_GENES)}
+
+
+class VariantTable:
+    """
+    Compact, read-mostly container of parsed pharmacogene variants.
+
+    Each variant costs a gene code (1 byte), star-allele and ALT codes
+    (2 bytes each), an rsID number and a position (8 bytes each), a dosage
+    (1 byte) and a 4-byte row index in its gene's group, instead of a
+    ParsedVariant object with several strings. Star alleles and ALT alleles
+    are interned per table; rsIDs that are not `rs<digits>` are kept in a
+    side list and referenced by negative codes. Rows stay in file order and
+    are also indexed by gene, so per-gene lookups do not rescan the table.
+
+    Iterating or indexing yields ParsedVariant views, so the table can be
+    used wherever a list of variants was expected.
+    """
+
+    # Bumped whenever the `rows()` layout changes, e.g. in cache keys.
+    ROW_FORMAT = "v2"
+
+    __slots__ = (
+        "_genes",
+        "_stars",
+        "_rsids",
+        "_positions",
+        "_alts",
+        "_dosages",
+        "_star_names",
+        "_star_codes",
+        "_alt_names",
+        "_alt_codes",
+        "_other_rsids",
+        "_gene_rows",
+    )
+
+    def __init__(self) -> None:
+        self._genes = array("B")
+        self._stars = array("H")
+        self._rsids = array("q")
+        self._positions = array("q")
+        self._alts = array("H")
+        self._dosages = array("B")
+        self._star_names: List[str] = []
+        self._star_codes: Dict[str, int] = {}
+        self._alt_names: List[str] = []
+        self._alt_codes: Dict[str, int] = {}
+        self._other_rsids: List[str] = []
+        self._gene_rows: List[array] = [array("I") for _ in SUPPORTED_GENES]
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Sequence[Any]]) -> "VariantTable":
+        """
+        Build a table from (gene, rsid, star[, position, alt, dosage]) rows.
+        """
+        table = cls()
+        for row in rows:
+            table.append(*row)
+        return table
+
+    def append(
+        self,
+        gene: str,
+        rsid: str,
+        star: str,
+        position: int = 0,
+        alt: str = "",
+        dosage: int = 1,
+    ) -> None:
+        gene_code = GENE_CODES[gene]
+        star_code = _intern_code(star, self._star_names, self._star_codes)
+        alt_code = _intern_code(alt, self._alt_names, self._alt_codes)
+
+        self._gene_rows[gene_code].append(len(self._genes))
+        self._genes.append(gene_code)
+        self._stars.append(star_code)
+        self._rsids.append(self._encode_rsid(rsid))
+        self._positions.append(position)
+        self._alts.append(alt_code)
+        self._dosages.append(dosage)
+
+    def _encode_rsid(self, rsid: str) -> int:
+        digits = rsid[2:]
+        # Only canonical rs numbers that fit the int64 array round-trip.
+        if rsid.startswith("rs") and 0 < len(digits) <= 18 and digits.isascii():
+            if digits.isdigit() and digits[0] != "0":
+                return int(digits)
+        self._other_rsids.append(rsid)
+        return -len(self._other_rsids)
+
+    def _decode_rsid(self, code: int) -> str:
+        if code > 0:
+            return f"rs{code}"
+        return self._other_rsids[-code - 1]
+
+    def __len__(self) -> int:
+        return len(self._genes)
+
+    def __getitem__(self, row: int) -> ParsedVariant:
+        return ParsedVariant(
+            gene=SUPPORTED_GENES[self._genes[row]],
+            rsid=self._decode_rsid(self._rsids[row]),
+            star=self._star_names[self._stars[row]],
+            position=self._positions[row],
+            alt=self._alt_names[self._alts[row]],
+            dosage=self._dosages[row],
+        )
+
+    def __iter__(self) -> Iterator[ParsedVariant]:
+        for row in range(len(self._genes)):
+            yield self[row]
+
+    def rows(self) -> List[List[Any]]:
+        """
+        Plain (gene, rsid, star, position, alt, dosage) rows, e.g. for JSON
+        serialization.
+        """
+        return [[v.gene, v.rsid, v.star, v.position, v.alt, v.dosage] for v in self]
+
+    def has_gene(self, gene: str) -> bool:
+        code = GENE_CODES.get(gene)
+        return code is not None and len(self._gene_rows[code]) > 0
+
+    def stars_for_gene(self, gene: str) -> List[str]:
+        """
+        Star alleles of `gene` in file order.
+        """
+        code = GENE_CODES.get(gene)
+        if code is None:
+            return []
+        names = self._star_names
+        stars = self._stars
+        return [names[stars[row]] for row in self._gene_rows[code]]
+
+    def rsids_for_gene(self, gene: str) -> List[str]:
+        """
+        rsIDs of `gene` in file order.
+        """
+        code = GENE_CODES.get(gene)
+        if code is None:
+            return []
+        rsids = self._rsids
+        return [self._decode_rsid(rsids[row]) for row in self._gene_rows[code]]
+
+    def observations_for_gene(self, gene: str) -> List[Observation]:
+        """
+        (rsid, position, alt, dosage) of `gene`'s records, for allele calling.
+        """
+        code = GENE_CODES.get(gene)
+        if code is None:
+            return []
+        decode, rsids, positions = self._decode_rsid, self._rsids, self._positions
+        alt_names, alts, dosages = self._alt_names, self._alts, self._dosages
+        return [
+            (decode(rsids[row]), positions[row], alt_names[alts[row]], dosages[row])
+            for row in self._gene_rows[code]
+        ]
+
+
+def _intern_code(value: str, names: List[str], codes: Dict[str, int]) -> int:
+    code = codes.get(value)
+    if code is None:
+        code = len(names)
+        names.append(sys.intern(value))
+        codes[value] = code
+    return code
 
 
 def _parse_info_field(info: str) -> Dict[str, str]:
@@ -30,63 +219,362 @@ def _parse_info_field(info: str) -> Dict[str, str]:
     return result
 
 
-def parse_vcf_contents(vcf_text: str) -> Tuple[bool, List[ParsedVariant]]:
+def is_carried_genotype(genotype: str) -> bool:
+    """
+    0/0 means wild-type (normal/no mutation) and ./. a no-call; any other
+    genotype means the sample carries the variant.
+    """
+    return genotype != "0/0" and genotype != "./."
+
+
+def genotype_dosage(genotype: str) -> int:
+    """
+    Number of non-reference allele copies (0, 1 or 2) in a GT value.
+    Genotypes that `is_carried_genotype` accepts count at least once.
+    """
+    if not is_carried_genotype(genotype):
+        return 0
+    alleles = genotype.replace("|", "/").split("/")
+    copies = sum(1 for allele in alleles if allele not in ("0", "."))
+    return min(max(copies, 1), 2)
+
+
+def parse_position(value: str) -> int:
+    """
+    POS column as an int; 0 when it is not a number.
+    """
+    value = value.strip()
+    return int(value) if value.isascii() and value.isdigit() else 0
+
+
+RecordFields = Tuple[str, str, str, int, str, int]
+
+
+def _parse_record_fields(line: str) -> Optional[RecordFields]:
+    """
+    Parse a single VCF data line into (gene, rsid, star, position, alt,
+    dosage); multi-allelic sites keep their first ALT allele.
+    Returns None for lines that are not carried pharmacogene records.
+    """
+    cols = line.split("\t")
+    # Ensure line has enough columns for INFO (7) and Sample Data (9)
+    if len(cols) < 10:
+        return None
+
+    # 1. Extract Genotype (GT) from the last column (Patient Data)
+    # Genotype is the first part before the colon, e.g., "0/1:45:99..." -> "0/1"
+    genotype = cols[9].split(":")[0]
+
+    # 2. FILTER: Only process variants the patient actually has
+    if not is_carried_genotype(genotype):
+        return None
+
+    rsid_col = cols[2].strip()
+    info_col = cols[7].strip()
+
+    info_dict = _parse_info_field(info_col)
+    gene = info_dict.get("GENE")
+    star = info_dict.get("STAR")
+    rs_from_info = info_dict.get("RS")
+
+    if not gene or not star:
+        return None
+
+    gene = gene.upper()
+    if gene not in GENE_CODES:
+        return None
+
+    rsid = rs_from_info or rsid_col
+    if not rsid or rsid == ".":
+        rsid = "unknown"
+
+    alt = cols[4].strip().split(",", 1)[0]
+    return gene, rsid, star, parse_position(cols[1]), alt, genotype_dosage(genotype)
+
+
+def parse_vcf_lines(lines: Iterable[str]) -> Tuple[bool, VariantTable]:
     """
-    Parse VCF text and extract pharmacogenomic variants for supported genes.
-    Updated to filter by Genotype (GT) to ensure patient actually has the variant.
+    Parse an iterable of VCF lines (e.g. a streamed upload) and extract
+    pharmacogenomic variants for supported genes.
+    Only the matching records are kept in memory, in a compact VariantTable.
     """
-    if not vcf_text:
+    has_header = False
+    variants = VariantTable()
+    for line in lines:
+        if not line:
+            continue
+        if line.startswith("#"):
+            if line.startswith("#CHROM"):
+                has_header = True
+            continue
+
+        fields = _parse_record_fields(line)
+        if fields is not None:
+            variants.append(*fields)
+
+    if not has_header:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail={"error": "VCF file is empty"},
+            detail={"error": "Invalid VCF: missing #CHROM header"},
         )
 
-    lines = vcf_text.splitlines()
-    has_header = any(line.startswith("#CHROM") for line in lines)
+    return True, variants
+
+
+# Byte-level pre-screen: a data line can only yield a variant if it names a
+# supported gene, and only #CHROM header lines matter. Needles are searched
+# in a lower-cased copy of each chunk with `bytes.find`, which is much faster
+# than a case-insensitive regex. Lines with non-ASCII bytes are always
+# decoded because `str.upper()` can map some non-ASCII letters onto ASCII.
+_SCREEN_NEEDLES: Tuple[bytes, ...] = (b"#chrom",) + tuple(
+    gene.lower().encode() for gene in SUPPORTED_GENES
+)
+
+
+def screen_vcf_chunks(chunks: Iterable[bytes]) -> Iterator[str]:
+    """
+    Decode only the parts of a raw VCF byte stream that can matter to the
+    parsers: #CHROM headers and records mentioning a supported gene. Each
+    chunk is searched as a whole, so every other line is skipped without
+    being split, decoded or tokenized.
+
+    Feeding the result to `parse_vcf_lines` gives the same variants as
+    decoding the whole file first.
+    """
+    pending = b""
+    for chunk in chunks:
+        end = chunk.rfind(b"\n")
+        if end < 0:
+            pending += chunk
+            continue
+        # The tail after the last newline may continue in the next chunk.
+        yield from _screen_buffer(pending + chunk[: end + 1])
+        pending = chunk[end + 1 :]
+    if pending:
+        yield from _screen_buffer(pending)
+
+
+def _screen_buffer(buf: bytes) -> Iterator[str]:
+    for start in _candidate_line_starts(buf):
+        yield from _decode_raw_line(buf, start)
+
+
+def _candidate_line_starts(buf: bytes) -> List[int]:
+    """
+    Sorted offsets of the lines in `buf` that `_screen_buffer` decodes.
+    """
+    lowered = buf.lower()
+    line_starts = set()
+    for needle in _SCREEN_NEEDLES:
+        pos = lowered.find(needle)
+        while pos >= 0:
+            line_starts.add(buf.rfind(b"\n", 0, pos) + 1)
+            pos = lowered.find(needle, pos + len(needle))
+    if not buf.isascii():
+        line_starts.update(_non_ascii_line_starts(buf))
+    return sorted(line_starts)
+
+
+def _decode_raw_line(buf: Union[bytes, mmap.mmap], start: int) -> List[str]:
+    stop = buf.find(b"\n", start)
+    if stop < 0:
+        stop = len(buf)
+    # Re-split so lone "\r" and other str.splitlines() boundaries
+    # behave as in a fully decoded text scan.
+    return buf[start:stop].decode("utf-8", errors="replace").splitlines()
+
+
+def _non_ascii_line_starts(buf: bytes) -> Iterator[int]:
+    # An ASCII decode stops at the first non-ASCII byte at C speed, which is
+    # much faster than a byte-class regex scan.
+    view = memoryview(buf)
+    pos = 0
+    while True:
+        try:
+            str(view[pos:], "ascii")
+            return
+        except UnicodeDecodeError as exc:
+            bad = pos + exc.start
+        yield buf.rfind(b"\n", 0, bad) + 1
+        stop = buf.find(b"\n", bad)
+        if stop < 0:
+            return
+        pos = stop + 1
+
+
+# Mapped buffers are screened this many bytes at a time (cut at a line end),
+# so only one lowered window is held in memory alongside the mapping.
+SCREEN_WINDOW_BYTES = 1024 * 1024
+
+
+def screen_vcf_buffer(
+    buf: Union[bytes, mmap.mmap], window: int = SCREEN_WINDOW_BYTES
+) -> Iterator[str]:
+    """
+    `screen_vcf_chunks` over a whole buffer, typically a memory-mapped
+    upload. The buffer is walked in line-aligned windows instead of being
+    read into chunks and re-joined; pages of a mapping that have been
+    screened are handed back to the OS, so resident memory stays around one
+    window however large the file is.
+    """
+    for _base, chunk in _iter_buffer_windows(buf, window):
+        yield from _screen_buffer(chunk)
+
+
+def _iter_buffer_windows(
+    buf: Union[bytes, mmap.mmap], window: int
+) -> Iterator[Tuple[int, bytes]]:
+    """
+    Yield (offset, bytes) windows of `buf` that end at a line end.
+    """
+    size = len(buf)
+    release = getattr(buf, "madvise", None) if isinstance(buf, mmap.mmap) else None
+    released = 0
+    start = 0
+    while start < size:
+        stop = min(start + window, size)
+        if stop < size:
+            end = buf.rfind(b"\n", start, stop)
+            if end < 0:
+                # A single line longer than the window.
+                end = buf.find(b"\n", stop)
+            stop = size if end < 0 else end + 1
+        yield start, buf[start:stop]
+        start = stop
+        if release is not None:
+            done = start - start % mmap.PAGESIZE
+            if done > released:
+                try:
+                    release(mmap.MADV_DONTNEED, released, done - released)
+                except (AttributeError, OSError, ValueError):
+                    release = None
+                released = done
+
+
+def parse_vcf_buffer(
+    buf: Union[bytes, mmap.mmap], window: int = SCREEN_WINDOW_BYTES
+) -> Tuple[bool, VariantTable]:
+    """
+    Parse a whole in-memory or memory-mapped VCF buffer; same result as
+    `parse_vcf_lines` over `screen_vcf_chunks` of its bytes.
+    """
+    return parse_vcf_lines(screen_vcf_buffer(buf, window))
+
+
+GeneOffsets = Dict[str, List[int]]
+
+
+def parse_vcf_buffer_offsets(
+    buf: Union[bytes, mmap.mmap], window: int = SCREEN_WINDOW_BYTES
+) -> Tuple[bool, VariantTable, GeneOffsets]:
+    """
+    `parse_vcf_buffer` that also returns, per gene, the byte offsets of the
+    lines its variants came from, for `parse_vcf_offsets` to re-read later.
+    """
+    has_header = False
+    variants = VariantTable()
+    offsets: GeneOffsets = {}
+    for base, chunk in _iter_buffer_windows(buf, window):
+        for start in _candidate_line_starts(chunk):
+            for line in _decode_raw_line(chunk, start):
+                if not line:
+                    continue
+                if line.startswith("#"):
+                    if line.startswith("#CHROM"):
+                        has_header = True
+                    continue
+                fields = _parse_record_fields(line)
+                if fields is None:
+                    continue
+                variants.append(*fields)
+                gene_offsets = offsets.setdefault(fields[0], [])
+                if not gene_offsets or gene_offsets[-1] != base + start:
+                    gene_offsets.append(base + start)
+
     if not has_header:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail={"error": "Invalid VCF: missing #CHROM header"},
         )
 
-    variants: List[ParsedVariant] = []
-    for line in lines:
-        if not line or line.startswith("#"):
-            continue
+    return True, variants, offsets
 
-        cols = line.split("\t")
-        # Ensure line has enough columns for INFO (7) and Sample Data (9)
-        if len(cols) < 10:
-            continue
 
-        # 1. Extract Genotype (GT) from the last column (Patient Data)
-        # Genotype is the first part before the colon, e.g., "0/1:45:99..." -> "0/1"
-        genotype = cols[9].split(":")[0]
+def parse_vcf_offsets(
+    buf: Union[bytes, mmap.mmap], offsets: Iterable[int]
+) -> Optional[VariantTable]:
+    """
+    Parse only the lines starting at `offsets` (recorded by
+    `parse_vcf_buffer_offsets` for the same bytes), in file order.
 
-        # 2. FILTER: Only process variants the patient actually has
-        # 0/0 means wild-type (normal/no mutation). We skip these.
-        if genotype == "0/0" or genotype == "./.":
-            continue
+    Returns None if an offset is not the start of a line holding a
+    pharmacogene record, i.e. the offsets do not belong to this buffer.
+    """
+    size = len(buf)
+    variants = VariantTable()
+    for offset in sorted(set(offsets)):
+        if not 0 <= offset < size or (offset and buf[offset - 1] != 0x0A):
+            return None
+        found = False
+        for line in _decode_raw_line(buf, offset):
+            if not line or line.startswith("#"):
+                continue
+            fields = _parse_record_fields(line)
+            if fields is not None:
+                variants.append(*fields)
+                found = True
+        if not found:
+            return None
+    return variants
 
-        rsid_col = cols[2].strip()
-        info_col = cols[7].strip()
 
-        info_dict = _parse_info_field(info_col)
-        gene = info_dict.get("GENE")
-        star = info_dict.get("STAR")
-        rs_from_info = info_dict.get("RS")
+def iter_indexed_vcf_lines(
+    vcf_fileobj: BinaryIO,
+    index_bytes: bytes,
+    loci: Dict[str, Tuple[str, int, int]],
+) -> Iterator[str]:
+    """
+    Yield the header lines of a BGZF-compressed VCF followed by the records
+    overlapping the pharmacogene loci, using its .tbi/.csi index.
+    Records are yielded in file order.
+    """
+    try:
+        yield from _iter_indexed_lines(vcf_fileobj, index_bytes, loci)
+    except ValueError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"error": f"Invalid indexed VCF: {exc}"},
+        ) from exc
 
-        if not gene or not star:
-            continue
 
-        gene = gene.upper()
-        if gene not in SUPPORTED_GENES:
-            continue
+def _iter_indexed_lines(
+    vcf_fileobj: BinaryIO,
+    index_bytes: bytes,
+    loci: Dict[str, Tuple[str, int, int]],
+) -> Iterator[str]:
+    index = load_index(index_bytes)
+    reader = BgzfReader(vcf_fileobj)
+
+    for line in iter_header_lines(reader, index):
+        yield line.decode("utf-8", errors="replace").rstrip("\r\n")
 
-        rsid = rs_from_info or rsid_col
-        if not rsid or rsid == ".":
-            rsid = "unknown"
+    # Query loci in file order (reference, then position) so variants come
+    # out in the same order a full scan would produce them.
+    ordered_loci = sorted(
+        (index.ref_id(chrom), start, end, chrom)
+        for chrom, start, end in loci.values()
+        if index.ref_id(chrom) is not None
+    )
 
-        variants.append(ParsedVariant(gene=gene, rsid=rsid, star=star))
+    seen_offsets = set()
+    for _rid, start, end, chrom in ordered_loci:
+        region_start = max(start - PHARMACOGENE_LOCUS_FLANK, 1)
+        region_end = end + PHARMACOGENE_LOCUS_FLANK
+        region_lines = iter_region_lines(reader, index, chrom, region_start, region_end)
+        for offset, line in region_lines:
+            # Flanked loci may overlap; emit each record once.
+            if offset in seen_offsets:
+                continue
+            seen_offsets.add(offset)
+            yield line.decode("utf-8", errors="replace").rstrip("\r\n")
 
-    return True, variants
\ No newline at end of file
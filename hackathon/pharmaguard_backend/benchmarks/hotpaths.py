@@ -0,0 +1,564 @@
+"""
+Hot-path benchmark suite for the PharmaGuard backend.
+
+Micro benchmarks cover VCF parsing (text, streamed, gzip, pathological and
+multi-sample inputs), star-allele calling, phenotype mapping, risk
+assessment and response serialization (validated models against the
+trusted fast path); end-to-end benchmarks POST synthetic VCFs to `/analyze` through
+the raw ASGI interface.
+The LLM is stubbed by clearing `LLM_API_KEY`/`LLM_API_BASE`, so the static
+explanation template is used and no network is touched. The result cache is
+disabled so every request does the full work.
+
+Results can be written as JSON and compared with a stored baseline; the run
+exits with status 1 if any case's throughput drops, or its p95 latency
+grows, by more than the tolerance.
+
+Usage (from the pharmaguard_backend directory):
+
+    python benchmarks/hotpaths.py
+    python benchmarks/hotpaths.py --sizes 64KB,1MB,1GB --only parse_stream
+    python benchmarks/hotpaths.py --json results.json
+    python benchmarks/hotpaths.py --baseline benchmarks/baseline.json
+    python benchmarks/hotpaths.py --save-baseline benchmarks/baseline.json
+"""
+
+from __future__ import annotations
+
+import os
+
+# Configure the app before it is imported: no LLM, no .env, no result cache.
+os.environ.pop("LLM_API_KEY", None)
+os.environ.pop("LLM_API_BASE", None)
+os.environ.pop("RESULT_CACHE_DIR", None)
+os.environ["PHARMAGUARD_SKIP_DOTENV"] = "1"
+os.environ["RESULT_CACHE_MAX_ENTRIES"] = "0"
+
+import argparse  # noqa: E402
+import asyncio  # noqa: E402
+import gzip  # noqa: E402
+import json  # noqa: E402
+import random  # noqa: E402
+import statistics  # noqa: E402
+import sys  # noqa: E402
+import tempfile  # noqa: E402
+import time  # noqa: E402
+from pathlib import Path  # noqa: E402
+from typing import Callable, Dict, List, Optional, Tuple  # noqa: E402
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+from benchmarks.synthetic_vcf import (  # noqa: E402
+    parse_size,
+    synthetic_vcf_bytes,
+    write_synthetic_vcf,
+)
+
+
+DEFAULT_SIZES = "64KB,1MB,16MB"
+DEFAULT_DENSITIES = "0.001,0.05"
+# Inputs at least this large are written to a temp file and streamed from
+# disk; the whole-text parser is skipped for them.
+DISK_THRESHOLD_BYTES = 64 * 1024 * 1024
+MAX_RUNS = 1000
+
+
+class Case:
+    """
+    One benchmark: `run` is timed `repeat` times after a warm-up call and
+    processes `units` of `unit` (bytes, ops or requests) per call.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        run: Callable[[], object],
+        units: float,
+        unit: str,
+        cleanup: Optional[Callable[[], None]] = None,
+    ) -> None:
+        self.name = name
+        self.run = run
+        self.units = units
+        self.unit = unit
+        self.cleanup = cleanup
+
+
+def _percentile(ordered: List[float], fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def measure(case: Case, repeat: int, min_seconds: float) -> Dict[str, object]:
+    """
+    Time `case` at least `repeat` times and for at least `min_seconds`, so
+    fast cases get enough samples for a stable p95.
+    """
+    case.run()  # warm-up
+    durations: List[float] = []
+    deadline = time.perf_counter() + min_seconds
+    while len(durations) < repeat or (
+        time.perf_counter() < deadline and len(durations) < MAX_RUNS
+    ):
+        started = time.perf_counter()
+        case.run()
+        durations.append(time.perf_counter() - started)
+    if case.cleanup is not None:
+        case.cleanup()
+
+    ordered = sorted(durations)
+    median = statistics.median(ordered)
+    scale = 1 / (1024 * 1024) if case.unit == "bytes" else 1
+    return {
+        "unit": "MB/s" if case.unit == "bytes" else f"{case.unit}/s",
+        "throughput": round(case.units * scale / median, 3),
+        "p50_ms": round(median * 1000, 3),
+        "p95_ms": round(_percentile(ordered, 0.95) * 1000, 3),
+        "runs": len(durations),
+    }
+
+
+def _size_label(size: int) -> str:
+    for unit, factor in (("GB", 1024**3), ("MB", 1024**2), ("KB", 1024)):
+        if size >= factor and size % factor == 0:
+            return f"{size // factor}{unit}"
+    return f"{size}B"
+
+
+def _source(
+    size: int, **kwargs: object
+) -> Tuple[Callable[[], object], int, Callable[[], None]]:
+    """
+    Return (open_source, length, cleanup): `open_source()` gives bytes for
+    in-memory inputs or a fresh binary file object for on-disk inputs.
+    """
+    if size < DISK_THRESHOLD_BYTES:
+        data = synthetic_vcf_bytes(size, **kwargs)
+        return (lambda: data), len(data), (lambda: None)
+
+    handle = tempfile.NamedTemporaryFile(suffix=".vcf", delete=False)
+    with handle:
+        length = write_synthetic_vcf(handle, size, **kwargs)
+    return (
+        lambda: open(handle.name, "rb"),
+        length,
+        lambda: os.remove(handle.name),
+    )
+
+
+def _parse_source_once(open_source: Callable[[], object], compressed: bool) -> object:
+    from app.parse_executor import parse_vcf_source
+
+    source = open_source()
+    if isinstance(source, bytes):
+        return parse_vcf_source(source, compressed)
+    with source:
+        return parse_vcf_source(source, compressed)
+
+
+def parse_cases(sizes: List[int], densities: List[float]) -> List[Case]:
+    from app.vcf_parser import parse_vcf_lines
+
+    cases = []
+    for size in sizes:
+        for density in densities:
+            label = f"{_size_label(size)}/d{density}"
+            open_source, length, cleanup = _source(size, density=density)
+
+            if size < DISK_THRESHOLD_BYTES:
+                data = open_source()
+                cases.append(
+                    Case(
+                        f"parse_text/{label}",
+                        lambda data=data: parse_vcf_lines(
+                            data.decode("utf-8", errors="replace").splitlines()
+                        ),
+                        length,
+                        "bytes",
+                    )
+                )
+            cases.append(
+                Case(
+                    f"parse_stream/{label}",
+                    lambda o=open_source: _parse_source_once(o, False),
+                    length,
+                    "bytes",
+                    cleanup,
+                )
+            )
+
+    data = synthetic_vcf_bytes(1024 * 1024, density=0.01)
+    compressed = gzip.compress(data)
+    cases.append(
+        Case(
+            "parse_gzip/1MB/d0.01",
+            lambda: _parse_source_once(lambda: compressed, True),
+            len(data),
+            "bytes",
+        )
+    )
+
+    odd = synthetic_vcf_bytes(1024 * 1024, density=0.01, pathological=0.2)
+    cases.append(
+        Case(
+            "parse_pathological/1MB/p0.2",
+            lambda: _parse_source_once(lambda: odd, False),
+            len(odd),
+            "bytes",
+        )
+    )
+    return cases
+
+
+def cohort_cases() -> List[Case]:
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        return []
+    from app.parse_executor import parse_vcf_cohort_source
+
+    data = synthetic_vcf_bytes(4 * 1024 * 1024, density=0.02, samples=64)
+    return [
+        Case(
+            "parse_cohort/4MB/s64",
+            lambda: parse_vcf_cohort_source(data, False),
+            len(data),
+            "bytes",
+        )
+    ]
+
+
+def rule_cases() -> List[Case]:
+    from app.gene_rules import SUPPORTED_GENES
+    from app.parse_executor import parse_vcf_source
+    from app.phenotype_mapper import determine_gene_phenotype
+    from app.risk_engine import assess_risk
+    from app.rule_set import active_rules
+
+    _ok, variants = parse_vcf_source(
+        synthetic_vcf_bytes(1024 * 1024, density=0.05), False
+    )
+    loops = 200
+    # Requests take one RuleSet snapshot and pass it down; do the same here.
+    rules = active_rules()
+
+    def phenotypes() -> None:
+        for _ in range(loops):
+            for gene in SUPPORTED_GENES:
+                determine_gene_phenotype(gene, variants, rules)
+
+    pairs = [
+        (drug, phenotype)
+        for drug in rules.drug_to_gene
+        for phenotype in ("PM", "IM", "NM", "RM", "URM", "Unknown")
+    ]
+
+    def risks() -> None:
+        for _ in range(loops):
+            for drug, phenotype in pairs:
+                assess_risk(drug, phenotype, rules)
+
+    return [
+        Case(
+            f"phenotype/{len(variants)}variants",
+            phenotypes,
+            loops * len(SUPPORTED_GENES),
+            "ops",
+        ),
+        Case("risk/all_pairs", risks, loops * len(pairs), "ops"),
+        _allele_call_case(alleles=500, observed=40, loops=loops),
+    ]
+
+
+def _allele_call_case(alleles: int, observed: int, loops: int) -> Case:
+    from app.allele_caller import GeneAlleleIndex
+
+    # CYP2D6-scale table: hundreds of alleles over a shared variant pool,
+    # each defined by one to four core variants.
+    rng = random.Random(0)
+    pool = [f"rs{rng.randint(1, 999_999_999)}" for _ in range(alleles * 2)]
+    definitions = {
+        f"*{i + 2}": [{"rsid": rsid} for rsid in rng.sample(pool, rng.randint(1, 4))]
+        for i in range(alleles)
+    }
+    index = GeneAlleleIndex("CYP2D6", "*1", definitions)
+    observations = [
+        (rsid, 0, "", rng.choice((1, 2))) for rsid in rng.sample(pool, observed)
+    ]
+
+    def call() -> None:
+        for _ in range(loops):
+            index.call(observations)
+
+    return Case(f"allele_call/{alleles}alleles", call, loops, "ops")
+
+
+def serialize_cases() -> List[Case]:
+    """
+    Response encoding for one /analyze result and a 1000-sample cohort:
+    the validated path (models built, then re-validated and dumped as
+    FastAPI's response_model does, then json.dumps) against the trusted
+    fast path. Both must produce identical bytes.
+    """
+    from fastapi.responses import JSONResponse
+
+    from app.main import _build_analysis_payload
+    from app.models import AnalysisResponse, CohortAnalysisResponse
+    from app.responses import TrustedJSONResponse, json_timestamp
+    from app.utils import get_current_timestamp
+
+    timestamp = json_timestamp(get_current_timestamp())
+
+    def analysis(patient_id: str) -> Dict[str, object]:
+        return _build_analysis_payload(
+            patient_id=patient_id,
+            drug="CODEINE",
+            timestamp=timestamp,
+            gene="CYP2D6",
+            diplotype="*1/*4",
+            phenotype="IM",
+            risk={
+                "risk_label": "Adjust Dosage",
+                "severity": "moderate",
+                "confidence_score": 0.85,
+            },
+            recommendation="Consider an alternative analgesic.",
+            explanation={
+                "summary": "The diplotype *1/*4 in CYP2D6 reduces activation.",
+                "mechanism": "Reduced enzyme activity lowers morphine formation.",
+                "clinical_guideline_reference": "CPIC Level A",
+            },
+            detected_rsids=["rs3892097", "rs1065852", "rs1135840"],
+            vcf_parsing_success=True,
+            variants_detected_count=3,
+            rule_set_version="2024.1",
+        )
+
+    samples = 1000
+    inputs = [
+        ("analyze", AnalysisResponse, lambda: analysis("patient")),
+        (
+            f"cohort_{samples}",
+            CohortAnalysisResponse,
+            lambda: {
+                "drug": "CODEINE",
+                "timestamp": timestamp,
+                "sample_count": samples,
+                "results": [analysis(f"SAMPLE_{i:04d}") for i in range(samples)],
+                "samples_without_variants": [],
+            },
+        ),
+    ]
+
+    cases = []
+    for label, model, build in inputs:
+
+        def validated(model: type = model, build: Callable = build) -> bytes:
+            built = model.model_validate(build())
+            content = built.model_dump(exclude_none=True)
+            data = model.model_validate(content).model_dump(
+                mode="json", exclude_none=True
+            )
+            return JSONResponse(data).body
+
+        def fast(build: Callable = build) -> bytes:
+            return TrustedJSONResponse(build()).body
+
+        if validated() != fast():
+            raise RuntimeError(f"serialize/{label}: fast path output differs")
+        cases.append(Case(f"serialize_validated/{label}", validated, 1, "responses"))
+        cases.append(Case(f"serialize_fast/{label}", fast, 1, "responses"))
+    return cases
+
+
+def _multipart(
+    fields: Dict[str, str], filename: str, content: bytes
+) -> Tuple[str, bytes]:
+    boundary = "pharmaguard-benchmark-boundary"
+    parts = []
+    for name, value in fields.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n'
+            f"{value}\r\n".encode()
+        )
+    parts.append(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="file"; '
+        f'filename="{filename}"\r\nContent-Type: text/plain\r\n\r\n'.encode()
+        + content
+        + b"\r\n"
+    )
+    parts.append(f"--{boundary}--\r\n".encode())
+    return f"multipart/form-data; boundary={boundary}", b"".join(parts)
+
+
+async def _asgi_post(app: object, path: str, content_type: str, body: bytes) -> int:
+    received: List[Dict[str, object]] = []
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [
+            (b"host", b"localhost"),
+            (b"content-type", content_type.encode()),
+            (b"content-length", str(len(body)).encode()),
+        ],
+        "client": ("127.0.0.1", 0),
+        "server": ("localhost", 80),
+    }
+    sent = False
+
+    async def receive() -> Dict[str, object]:
+        nonlocal sent
+        if sent:
+            return {"type": "http.disconnect"}
+        sent = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message: Dict[str, object]) -> None:
+        received.append(message)
+
+    await app(scope, receive, send)  # type: ignore[operator]
+    return int(received[0]["status"])
+
+
+def e2e_cases(sizes: List[int]) -> List[Case]:
+    from app.main import app
+
+    loop = asyncio.new_event_loop()
+    cases = []
+    for size in sizes:
+        if size >= DISK_THRESHOLD_BYTES:
+            continue
+        data = synthetic_vcf_bytes(size, density=0.05, seed=1)
+        content_type, body = _multipart({"drug": "CODEINE"}, "patient.vcf", data)
+
+        def request(body: bytes = body, content_type: str = content_type) -> None:
+            status_code = loop.run_until_complete(
+                _asgi_post(app, "/analyze", content_type, body)
+            )
+            if status_code != 200:
+                raise RuntimeError(f"/analyze returned {status_code}")
+
+        cases.append(
+            Case(f"e2e_analyze/{_size_label(size)}", request, 1, "requests")
+        )
+    if cases:
+        cases[-1].cleanup = loop.close
+    else:
+        loop.close()
+    return cases
+
+
+def compare(
+    results: Dict[str, Dict[str, object]],
+    baseline: Dict[str, Dict[str, object]],
+    tolerance: float,
+) -> List[str]:
+    """
+    Return a message per case that regressed past `tolerance` (a fraction).
+    Cases missing from either side are ignored.
+    """
+    regressions = []
+    for name, base in baseline.items():
+        current = results.get(name)
+        if current is None:
+            continue
+        min_throughput = float(base["throughput"]) * (1 - tolerance)
+        if float(current["throughput"]) < min_throughput:
+            regressions.append(
+                f"{name}: throughput {current['throughput']} {current['unit']} "
+                f"< {min_throughput:.3f} (baseline {base['throughput']})"
+            )
+        max_p95 = float(base["p95_ms"]) * (1 + tolerance)
+        if float(current["p95_ms"]) > max_p95:
+            regressions.append(
+                f"{name}: p95 {current['p95_ms']} ms > {max_p95:.3f} "
+                f"(baseline {base['p95_ms']})"
+            )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="e.g. 64KB,1MB,1GB")
+    parser.add_argument("--densities", default=DEFAULT_DENSITIES)
+    parser.add_argument("--repeat", type=int, default=5, help="minimum timed runs")
+    parser.add_argument(
+        "--min-seconds",
+        type=float,
+        default=0.5,
+        help="keep timing each case for at least this long (default 0.5)",
+    )
+    parser.add_argument("--only", default="", help="run cases with this name prefix")
+    parser.add_argument("--json", dest="json_path", help="write results to this file")
+    parser.add_argument("--baseline", help="fail on regressions against this file")
+    parser.add_argument("--save-baseline", help="write results as the new baseline")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="allowed fractional regression (default 0.25)",
+    )
+    args = parser.parse_args()
+
+    sizes = [parse_size(s) for s in args.sizes.split(",") if s]
+    densities = [float(d) for d in args.densities.split(",") if d]
+
+    groups: List[Tuple[Tuple[str, ...], Callable[[], List[Case]]]] = [
+        (
+            ("parse_text", "parse_stream", "parse_gzip", "parse_pathological"),
+            lambda: parse_cases(sizes, densities),
+        ),
+        (("parse_cohort",), cohort_cases),
+        (("phenotype", "risk", "allele_call"), rule_cases),
+        (("serialize_validated", "serialize_fast"), serialize_cases),
+        (("e2e_analyze",), lambda: e2e_cases(sizes)),
+    ]
+    cases: List[Case] = []
+    for prefixes, build in groups:
+        # Skip building (and generating inputs for) groups --only excludes.
+        if any(p.startswith(args.only) or args.only.startswith(p) for p in prefixes):
+            cases.extend(build())
+
+    results: Dict[str, Dict[str, object]] = {}
+    for case in cases:
+        if not case.name.startswith(args.only):
+            if case.cleanup is not None:
+                case.cleanup()
+            continue
+        results[case.name] = measure(case, args.repeat, args.min_seconds)
+        r = results[case.name]
+        print(
+            f"{case.name:<34} {r['throughput']:>12} {r['unit']:<11}"
+            f"p50 {r['p50_ms']:>10} ms  p95 {r['p95_ms']:>10} ms"
+        )
+
+    report = {
+        "python": sys.version.split()[0],
+        "repeat": args.repeat,
+        "min_seconds": args.min_seconds,
+        "cases": results,
+    }
+    for path in filter(None, [args.json_path, args.save_baseline]):
+        Path(path).write_text(json.dumps(report, indent=2) + "\n")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())["cases"]
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("\nRegressions:")
+            for message in regressions:
+                print(f"  {message}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.tolerance:.0%} of {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
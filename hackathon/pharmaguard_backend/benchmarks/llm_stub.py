@@ -0,0 +1,170 @@
+"""
+Local OpenAI-compatible chat-completions stub for load tests.
+
+Answers every POST with a canned completion after a configurable latency
+(plus uniform jitter), and fails a configurable fraction of calls with a
+500, so the backend's LLM path, concurrency limit and circuit breaker can
+be exercised without network access. Standard library only.
+
+Usage (from the pharmaguard_backend directory):
+
+    python benchmarks/llm_stub.py --port 8799 --latency-ms 300 --error-rate 0.05
+
+then point the backend at it:
+
+    LLM_API_BASE=http://127.0.0.1:8799/v1/chat/completions LLM_API_KEY=stub
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+
+
+COMPLETION_TEXT = (
+    "This is a stubbed explanation generated by the local load-test LLM stub."
+)
+
+
+class LLMStub:
+    """
+    Chat-completions stub served from a background thread. Each connection
+    gets its own thread, so slow responses overlap like a real backend's.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency_ms: float = 300.0,
+        jitter_ms: float = 100.0,
+        error_rate: float = 0.0,
+        seed: int = 0,
+    ) -> None:
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1/chat/completions"
+
+    def _next_call(self) -> Tuple[float, bool]:
+        with self._lock:
+            self.calls += 1
+            jitter = self._rng.uniform(-self.jitter_ms, self.jitter_ms)
+            delay = self.latency_ms + jitter
+            fail = self._rng.random() < self.error_rate
+            if fail:
+                self.errors += 1
+        return max(0.0, delay) / 1000, fail
+
+    def _handler_class(self) -> type:
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like a real API
+
+            def do_POST(self) -> None:
+                self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                delay, fail = stub._next_call()
+                time.sleep(delay)
+                if fail:
+                    self._reply(500, {"error": {"message": "injected failure"}})
+                    return
+                self._reply(
+                    200,
+                    {
+                        "id": "chatcmpl-stub",
+                        "object": "chat.completion",
+                        "choices": [
+                            {
+                                "index": 0,
+                                "message": {
+                                    "role": "assistant",
+                                    "content": COMPLETION_TEXT,
+                                },
+                                "finish_reason": "stop",
+                            }
+                        ],
+                    },
+                )
+
+            def _reply(self, status: int, payload: Dict[str, object]) -> None:
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: object) -> None:
+                pass
+
+        return Handler
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def start(self) -> "LLMStub":
+        """
+        Serve from a daemon thread.
+        """
+        self._thread = threading.Thread(
+            target=self.serve_forever, name="llm-stub", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {"calls": self.calls, "errors": self.errors}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--jitter-ms", type=float, default=100.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    stub = LLMStub(
+        args.host,
+        args.port,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    print(f"LLM stub listening on {stub.url}")
+    try:
+        stub.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stub.stop()
+        print(f"served {stub.stats()}")
+
+
+if __name__ == "__main__":
+    main()
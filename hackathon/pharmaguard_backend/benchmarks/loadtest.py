@@ -0,0 +1,461 @@
+"""
+Load-test harness for the PharmaGuard backend.
+
+Concurrent clients POST a mix of synthetic VCFs and drugs to `/analyze` for
+a fixed duration (or request count). The app runs either in-process,
+driven over httpx's ASGI transport, or as a local uvicorn server started
+for the run (`--server`). LLM calls go to the bundled stub
+(`benchmarks/llm_stub.py`) with configurable latency and error rate, so no
+network is needed. The result and explanation caches are disabled unless
+`--with-caches` is given.
+
+Reports requests/s, p50/p95/p99 latency, status counts and error rate,
+peak RSS of the app process, the stub's call counts and the app's LLM
+fallback counters. Results can be written as JSON and compared with a
+stored baseline; the run exits with status 1 if throughput drops, or
+p95/p99 latency grows, by more than the tolerance, or the error rate rises
+by more than one percentage point.
+
+Usage (from the pharmaguard_backend directory):
+
+    python benchmarks/loadtest.py
+    python benchmarks/loadtest.py --concurrency 64 --duration 30 --llm-latency-ms 800
+    python benchmarks/loadtest.py --server --server-workers 2 --json load.json
+    python benchmarks/loadtest.py --deferred-fraction 0.5 --llm-error-rate 0.1
+    python benchmarks/loadtest.py --baseline benchmarks/load_baseline.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+from benchmarks.llm_stub import LLMStub  # noqa: E402
+from app.gene_rules import SUPPORTED_GENES  # noqa: E402
+from app.vcf_parser import parse_vcf_lines  # noqa: E402
+from benchmarks.synthetic_vcf import parse_size, synthetic_vcf_bytes  # noqa: E402
+
+
+DEFAULT_DRUGS = (
+    "CODEINE,CLOPIDOGREL,WARFARIN,SIMVASTATIN,AZATHIOPRINE,FLUOROURACIL"
+)
+SERVER_START_TIMEOUT_SECONDS = 30.0
+REQUEST_TIMEOUT_SECONDS = 120.0
+
+_FALLBACK_SAMPLE = re.compile(
+    r'^pharmaguard_llm_fallbacks_total\{reason="([^"]+)"\} ([0-9.e+]+)$', re.M
+)
+
+
+def _percentile(ordered: List[float], fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def app_environment(
+    args: argparse.Namespace, llm_url: Optional[str]
+) -> Dict[str, str]:
+    """
+    Environment for the app under test: the LLM stub (or no LLM), no .env,
+    an in-memory profile store and, by default, no caches.
+    """
+    env = dict(os.environ)
+    for name in ("LLM_API_KEY", "LLM_API_BASE", "RESULT_CACHE_DIR", "LLM_CACHE_PATH"):
+        env.pop(name, None)
+    env["PHARMAGUARD_SKIP_DOTENV"] = "1"
+    env["PROFILE_STORE_PATH"] = ":memory:"
+    if llm_url is not None:
+        env["LLM_API_BASE"] = llm_url
+        env["LLM_API_KEY"] = "loadtest-stub"
+    if not args.with_caches:
+        env["RESULT_CACHE_MAX_ENTRIES"] = "0"
+        env["LLM_CACHE_MAX_ENTRIES"] = "0"
+    return env
+
+
+def build_corpus(args: argparse.Namespace) -> List[Tuple[str, bytes]]:
+    """
+    `--vcfs` distinct synthetic files per size. Seeds whose file carries no
+    variant in some pharmacogene are skipped, so every drug can be analyzed
+    and non-200 responses reflect the server, not the input.
+    """
+    corpus = []
+    seed = args.seed * 1000
+    for size_text in filter(None, args.sizes.split(",")):
+        size = parse_size(size_text)
+        for i in range(args.vcfs):
+            while True:
+                data = synthetic_vcf_bytes(size, density=args.density, seed=seed)
+                seed += 1
+                _, variants = parse_vcf_lines(data.decode().splitlines(True))
+                if all(variants.has_gene(gene) for gene in SUPPORTED_GENES):
+                    break
+            corpus.append((f"patient_{size_text}_{i}.vcf", data))
+    return corpus
+
+
+async def drive(
+    client: httpx.AsyncClient,
+    corpus: List[Tuple[str, bytes]],
+    drugs: List[str],
+    args: argparse.Namespace,
+) -> Tuple[List[Tuple[float, int]], float]:
+    """
+    Run `--concurrency` closed-loop clients; returns (latency, status) per
+    request (status 0 for transport errors) and the wall time.
+    """
+    samples: List[Tuple[float, int]] = []
+    issued = 0
+    started = time.perf_counter()
+    deadline = started + args.duration
+
+    async def client_loop(worker: int) -> None:
+        nonlocal issued
+        rng = random.Random(args.seed * 100_003 + worker)
+        while True:
+            if args.requests:
+                if issued >= args.requests:
+                    return
+                issued += 1
+            elif time.perf_counter() >= deadline:
+                return
+            filename, data = rng.choice(corpus)
+            mode = "deferred" if rng.random() < args.deferred_fraction else "inline"
+            form = {"drug": rng.choice(drugs), "explanation_mode": mode}
+            request_started = time.perf_counter()
+            try:
+                response = await client.post(
+                    "/analyze",
+                    files={"file": (filename, data, "text/plain")},
+                    data=form,
+                )
+                status_code = response.status_code
+            except httpx.HTTPError:
+                status_code = 0
+            samples.append((time.perf_counter() - request_started, status_code))
+
+    await asyncio.gather(*(client_loop(i) for i in range(args.concurrency)))
+    return samples, time.perf_counter() - started
+
+
+def _peak_rss_mb(pid: int) -> Optional[float]:
+    """
+    High-water RSS of `pid` plus its child processes (e.g. uvicorn or parse
+    pool workers), from /proc; None where /proc is unavailable.
+    """
+    total_kb = 0
+    pending = [pid]
+    seen = set()
+    while pending:
+        current = pending.pop()
+        if current in seen:
+            continue
+        seen.add(current)
+        try:
+            status_text = Path(f"/proc/{current}/status").read_text()
+        except OSError:
+            if current == pid:
+                return None
+            continue
+        match = re.search(r"^VmHWM:\s+(\d+) kB", status_text, re.M)
+        if match:
+            total_kb += int(match.group(1))
+        for task in Path(f"/proc/{current}/task").glob("*/children"):
+            try:
+                pending.extend(int(c) for c in task.read_text().split())
+            except OSError:
+                pass
+    return round(total_kb / 1024, 1)
+
+
+def _own_peak_rss_mb() -> Optional[float]:
+    peak = _peak_rss_mb(os.getpid())
+    if peak is not None:
+        return peak
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kB on Linux, bytes on macOS.
+    return round(maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _llm_fallbacks(metrics_text: str) -> Dict[str, int]:
+    return {
+        reason: int(float(value))
+        for reason, value in _FALLBACK_SAMPLE.findall(metrics_text)
+    }
+
+
+async def run_in_process(
+    args: argparse.Namespace,
+    env: Dict[str, str],
+    corpus: List[Tuple[str, bytes]],
+    drugs: List[str],
+) -> Dict[str, object]:
+    # The app reads its configuration at import time.
+    for name in set(os.environ) - set(env):
+        del os.environ[name]
+    os.environ.update(env)
+    from app.main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(
+            transport=transport,
+            base_url="http://loadtest",
+            timeout=REQUEST_TIMEOUT_SECONDS,
+        ) as client:
+            samples, elapsed = await drive(client, corpus, drugs, args)
+            metrics_text = (await client.get("/metrics")).text
+    return {
+        "samples": samples,
+        "elapsed": elapsed,
+        "peak_rss_mb": _own_peak_rss_mb(),
+        "llm_fallbacks": _llm_fallbacks(metrics_text),
+    }
+
+
+async def run_against_server(
+    args: argparse.Namespace,
+    env: Dict[str, str],
+    corpus: List[Tuple[str, bytes]],
+    drugs: List[str],
+) -> Dict[str, object]:
+    command = [
+        sys.executable,
+        "-m",
+        "uvicorn",
+        "app.main:app",
+        "--host",
+        "127.0.0.1",
+        "--port",
+        str(args.port),
+        "--workers",
+        str(args.server_workers),
+        "--log-level",
+        "warning",
+    ]
+    server = subprocess.Popen(command, cwd=BACKEND_DIR, env=env)
+    base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency)
+        async with httpx.AsyncClient(
+            base_url=base_url, timeout=REQUEST_TIMEOUT_SECONDS, limits=limits
+        ) as client:
+            await _wait_for_health(client, server)
+            samples, elapsed = await drive(client, corpus, drugs, args)
+            # With several workers, this is one worker's counters.
+            metrics_text = (await client.get("/metrics")).text
+            peak_rss_mb = _peak_rss_mb(server.pid)
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+    return {
+        "samples": samples,
+        "elapsed": elapsed,
+        "peak_rss_mb": peak_rss_mb,
+        "llm_fallbacks": _llm_fallbacks(metrics_text),
+    }
+
+
+async def _wait_for_health(
+    client: httpx.AsyncClient, server: subprocess.Popen
+) -> None:
+    deadline = time.monotonic() + SERVER_START_TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with status {server.returncode}")
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError("uvicorn did not become healthy in time")
+
+
+def summarize(run: Dict[str, object]) -> Dict[str, object]:
+    samples: List[Tuple[float, int]] = run["samples"]  # type: ignore[assignment]
+    elapsed = float(run["elapsed"])  # type: ignore[arg-type]
+    if not samples:
+        raise RuntimeError("no requests completed")
+    ordered = sorted(latency for latency, _ in samples)
+    statuses = Counter(status for _, status in samples)
+    errors = sum(count for status, count in statuses.items() if status != 200)
+    return {
+        "requests": len(samples),
+        "duration_s": round(elapsed, 3),
+        "throughput": round(len(samples) / elapsed, 3),
+        "unit": "req/s",
+        "p50_ms": round(_percentile(ordered, 0.50) * 1000, 3),
+        "p95_ms": round(_percentile(ordered, 0.95) * 1000, 3),
+        "p99_ms": round(_percentile(ordered, 0.99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+        "status_counts": {str(s): c for s, c in sorted(statuses.items())},
+        "error_rate": round(errors / len(samples), 4),
+        "peak_rss_mb": run["peak_rss_mb"],
+        "llm_fallbacks": run["llm_fallbacks"],
+    }
+
+
+def compare(
+    result: Dict[str, object], baseline: Dict[str, object], tolerance: float
+) -> List[str]:
+    """
+    Return a message per metric that regressed past `tolerance` (a fraction).
+    """
+    regressions = []
+    min_throughput = float(baseline["throughput"]) * (1 - tolerance)
+    if float(result["throughput"]) < min_throughput:
+        regressions.append(
+            f"throughput {result['throughput']} req/s < {min_throughput:.3f} "
+            f"(baseline {baseline['throughput']})"
+        )
+    for key in ("p95_ms", "p99_ms"):
+        limit = float(baseline[key]) * (1 + tolerance)
+        if float(result[key]) > limit:
+            regressions.append(
+                f"{key} {result[key]} > {limit:.3f} (baseline {baseline[key]})"
+            )
+    max_error_rate = float(baseline["error_rate"]) + 0.01
+    if float(result["error_rate"]) > max_error_rate:
+        regressions.append(
+            f"error_rate {result['error_rate']} > {max_error_rate:.4f} "
+            f"(baseline {baseline['error_rate']})"
+        )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--server", action="store_true", help="start a local uvicorn server"
+    )
+    parser.add_argument("--server-workers", type=int, default=1)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument(
+        "--duration", type=float, default=20.0, help="seconds (default 20)"
+    )
+    parser.add_argument(
+        "--requests", type=int, default=0, help="stop after N requests instead"
+    )
+    parser.add_argument("--sizes", default="64KB,1MB", help="e.g. 64KB,1MB,16MB")
+    parser.add_argument("--vcfs", type=int, default=4, help="distinct files per size")
+    parser.add_argument("--density", type=float, default=0.05)
+    parser.add_argument("--drugs", default=DEFAULT_DRUGS)
+    parser.add_argument(
+        "--deferred-fraction",
+        type=float,
+        default=0.0,
+        help="share of requests with explanation_mode=deferred",
+    )
+    parser.add_argument("--no-llm", action="store_true", help="leave the LLM unset")
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0)
+    parser.add_argument("--llm-jitter-ms", type=float, default=100.0)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--with-caches", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_path", help="write results to this file")
+    parser.add_argument("--baseline", help="fail on regressions against this file")
+    parser.add_argument("--save-baseline", help="write results as the new baseline")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="allowed fractional regression (default 0.25)",
+    )
+    args = parser.parse_args()
+
+    drugs = [d.strip().upper() for d in args.drugs.split(",") if d.strip()]
+    corpus = build_corpus(args)
+
+    stub: Optional[LLMStub] = None
+    if not args.no_llm:
+        stub = LLMStub(
+            latency_ms=args.llm_latency_ms,
+            jitter_ms=args.llm_jitter_ms,
+            error_rate=args.llm_error_rate,
+            seed=args.seed,
+        ).start()
+    env = app_environment(args, stub.url if stub is not None else None)
+
+    runner = run_against_server if args.server else run_in_process
+    try:
+        result = summarize(asyncio.run(runner(args, env, corpus, drugs)))
+    finally:
+        if stub is not None:
+            stub.stop()
+    result["llm_stub"] = stub.stats() if stub is not None else None
+
+    fallbacks = ", ".join(f"{k}: {v}" for k, v in result["llm_fallbacks"].items())
+    print(
+        f"mode            {'uvicorn' if args.server else 'in-process'}, "
+        f"concurrency {args.concurrency}, {len(corpus)} VCFs, {len(drugs)} drugs"
+    )
+    print(
+        f"requests        {result['requests']} in {result['duration_s']} s "
+        f"({result['throughput']} req/s)"
+    )
+    print(
+        f"latency         p50 {result['p50_ms']} ms  p95 {result['p95_ms']} ms  "
+        f"p99 {result['p99_ms']} ms  max {result['max_ms']} ms"
+    )
+    print(
+        "status          "
+        + "  ".join(f"{s}: {c}" for s, c in result["status_counts"].items())
+    )
+    print(f"error rate      {result['error_rate']:.2%}")
+    print(f"peak RSS        {result['peak_rss_mb']} MB")
+    if stub is not None:
+        print(
+            f"llm stub        {result['llm_stub']['calls']} calls, "
+            f"{result['llm_stub']['errors']} injected errors"
+        )
+    print(f"llm fallbacks   {fallbacks or 'none'}")
+
+    report = {
+        "python": sys.version.split()[0],
+        "config": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("json_path", "baseline", "save_baseline")
+        },
+        "result": result,
+    }
+    for path in filter(None, [args.json_path, args.save_baseline]):
+        Path(path).write_text(json.dumps(report, indent=2) + "\n")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())["result"]
+        regressions = compare(result, baseline, args.tolerance)
+        if regressions:
+            print("\nRegressions:")
+            for message in regressions:
+                print(f"  {message}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.tolerance:.0%} of {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
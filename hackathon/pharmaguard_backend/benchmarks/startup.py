@@ -0,0 +1,168 @@
+"""
+Cold-start benchmark for the PharmaGuard backend.
+
+Each run starts a fresh interpreter, imports the app module and serves one
+request through the raw ASGI interface (no HTTP server, no test client), so
+the numbers track what a serverless cold start pays.
+
+Usage (from the pharmaguard_backend directory):
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --runs 20 --path /health --json
+    python benchmarks/startup.py --target app.handler   # needs mangum
+    python benchmarks/startup.py --server               # long-running mode
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def _child(target: str, path: str) -> None:
+    import asyncio
+    import importlib
+
+    started = time.perf_counter()
+    module = importlib.import_module(target)
+    imported = time.perf_counter()
+    app = module.app
+
+    async def first_request() -> int:
+        received: List[Dict[str, object]] = []
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": b"",
+            "root_path": "",
+            "headers": [(b"host", b"localhost")],
+            "client": ("127.0.0.1", 0),
+            "server": ("localhost", 80),
+        }
+
+        async def receive() -> Dict[str, object]:
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message: Dict[str, object]) -> None:
+            received.append(message)
+
+        await app(scope, receive, send)
+        return int(received[0]["status"])
+
+    status_code = asyncio.run(first_request())
+    finished = time.perf_counter()
+
+    print(
+        json.dumps(
+            {
+                "import_ms": (imported - started) * 1000,
+                "first_request_ms": (finished - imported) * 1000,
+                "status": status_code,
+                "modules": len(sys.modules),
+            }
+        )
+    )
+
+
+def _run_once(target: str, path: str, serverless: bool) -> Dict[str, float]:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [str(BACKEND_DIR), env.get("PYTHONPATH")])
+    )
+    if serverless:
+        env.setdefault("AWS_LAMBDA_FUNCTION_NAME", "pharmaguard-startup-benchmark")
+    else:
+        env.pop("AWS_LAMBDA_FUNCTION_NAME", None)
+
+    started = time.perf_counter()
+    out = subprocess.run(
+        [sys.executable, __file__, "--child", "--target", target, "--path", path],
+        cwd=BACKEND_DIR,
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    total_ms = (time.perf_counter() - started) * 1000
+
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result["process_ms"] = total_ms
+    return result
+
+
+def _summarize(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    p90 = ordered[min(len(ordered) - 1, int(round(0.9 * (len(ordered) - 1))))]
+    return {
+        "min": round(ordered[0], 2),
+        "median": round(statistics.median(ordered), 2),
+        "p90": round(p90, 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--target", default="app.main", help="module exposing `app`")
+    parser.add_argument("--path", default="/health", help="GET path for request 1")
+    parser.add_argument(
+        "--server",
+        action="store_true",
+        help="benchmark long-running mode instead of the serverless runtime",
+    )
+    parser.add_argument("--json", action="store_true", help="print JSON only")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args.target, args.path)
+        return
+
+    runs = [
+        _run_once(args.target, args.path, serverless=not args.server)
+        for _ in range(args.runs)
+    ]
+    report = {
+        "target": args.target,
+        "path": args.path,
+        "mode": "server" if args.server else "serverless",
+        "runs": args.runs,
+        "python": sys.version.split()[0],
+        "status": sorted({r["status"] for r in runs}),
+        "modules_loaded": max(r["modules"] for r in runs),
+        "import_ms": _summarize([r["import_ms"] for r in runs]),
+        "first_request_ms": _summarize([r["first_request_ms"] for r in runs]),
+        "process_ms": _summarize([r["process_ms"] for r in runs]),
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(
+        f"{report['target']} {report['path']} ({report['mode']}, "
+        f"{report['runs']} runs, Python {report['python']}, "
+        f"{report['modules_loaded']} modules, status {report['status']})"
+    )
+    for metric in ("import_ms", "first_request_ms", "process_ms"):
+        s = report[metric]
+        print(f"  {metric:<17} min {s['min']:>8}  median {s['median']:>8}  p90 {s['p90']:>8}")
+
+
+if __name__ == "__main__":
+    main()
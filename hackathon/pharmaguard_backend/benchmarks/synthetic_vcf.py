@@ -0,0 +1,264 @@
+"""
+Deterministic synthetic VCF generator for benchmarks.
+
+Files are built from a seeded RNG, so the same arguments always produce the
+same bytes. Background records carry no GENE annotation; a configurable
+fraction are pharmacogene records (GENE/STAR/RS in INFO) placed inside the
+loci of `PHARMACOGENE_LOCI`. Optional pathological lines exercise the
+parser's slow and edge paths.
+
+Usage (from the pharmaguard_backend directory):
+
+    python benchmarks/synthetic_vcf.py out.vcf --size 16MB
+    python benchmarks/synthetic_vcf.py cohort.vcf.gz --size 1GB --samples 64
+    python benchmarks/synthetic_vcf.py odd.vcf --size 1MB --pathological 0.2
+"""
+
+from __future__ import annotations
+
+import argparse
+import gzip
+import io
+import random
+import sys
+from pathlib import Path
+from typing import BinaryIO, Iterator, List
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+from app.gene_rules import PHARMACOGENE_LOCI  # noqa: E402
+
+
+# Star alleles drawn per gene; *1 records exercise the non-*1 filter.
+GENE_STARS = {
+    "CYP2D6": ["*1", "*2", "*3", "*4", "*5", "*10", "*41"],
+    "CYP2C19": ["*1", "*2", "*3", "*17"],
+    "CYP2C9": ["*1", "*2", "*3"],
+    "SLCO1B1": ["*1", "*5", "*15"],
+    "TPMT": ["*1", "*2", "*3A", "*3C"],
+    "DPYD": ["*1", "*2A", "*13"],
+}
+
+BACKGROUND_CHROMS = ["1", "2", "3", "6", "10", "12", "17", "22", "X"]
+GENOTYPES = ["0/0", "0/1", "1/1", "./.", "0|1", "1|0"]
+GENOTYPE_WEIGHTS = [60, 20, 8, 4, 4, 4]
+BASES = "ACGT"
+
+_SIZE_UNITS = {"": 1, "B": 1, "KB": 1024, "MB": 1024**2, "GB": 1024**3}
+
+
+def parse_size(text: str) -> int:
+    """
+    Parse sizes such as "64KB", "16MB" or "1GB" into bytes.
+    """
+    value = text.strip().upper()
+    for unit in ("GB", "MB", "KB", "B", ""):
+        if value.endswith(unit) and value[: len(value) - len(unit)]:
+            number = value[: len(value) - len(unit)]
+            try:
+                return int(float(number) * _SIZE_UNITS[unit])
+            except ValueError:
+                break
+    raise ValueError(f"Invalid size: {text!r}")
+
+
+def _header(samples: int) -> List[str]:
+    sample_ids = [f"SAMPLE_{i + 1:04d}" for i in range(samples)]
+    return [
+        "##fileformat=VCFv4.2",
+        "##source=PharmaGuardSyntheticVCF",
+        "##reference=GRCh38",
+        '##INFO=<ID=RS,Number=1,Type=String,Description="dbSNP rsID">',
+        '##INFO=<ID=GENE,Number=1,Type=String,Description="Gene symbol">',
+        '##INFO=<ID=STAR,Number=1,Type=String,Description="Star allele">',
+        '##INFO=<ID=DP,Number=1,Type=Integer,Description="Total depth">',
+        '##INFO=<ID=AF,Number=A,Type=Float,Description="Allele frequency">',
+        '##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">',
+        '##FORMAT=<ID=DP,Number=1,Type=Integer,Description="Read depth">',
+        "\t".join(
+            ["#CHROM", "POS", "ID", "REF", "ALT", "QUAL", "FILTER", "INFO", "FORMAT"]
+            + sample_ids
+        ),
+    ]
+
+
+def _sample_columns(rng: random.Random, samples: int) -> str:
+    genotypes = rng.choices(GENOTYPES, weights=GENOTYPE_WEIGHTS, k=samples)
+    return "\t".join(f"{gt}:{rng.randint(8, 90)}" for gt in genotypes)
+
+
+def _background_record(rng: random.Random, samples: int) -> str:
+    ref, alt = rng.sample(BASES, 2)
+    info = f"DP={rng.randint(10, 500)};AF={rng.random():.4f};MQ={rng.randint(20, 60)}"
+    return "\t".join(
+        [
+            rng.choice(BACKGROUND_CHROMS),
+            str(rng.randint(1, 150_000_000)),
+            f"rs{rng.randint(1, 999_999_999)}",
+            ref,
+            alt,
+            str(rng.randint(20, 99)),
+            "PASS",
+            info,
+            "GT:DP",
+            _sample_columns(rng, samples),
+        ]
+    )
+
+
+def _gene_record(rng: random.Random, samples: int) -> str:
+    gene = rng.choice(list(GENE_STARS))
+    chrom, start, end = PHARMACOGENE_LOCI[gene]
+    rsid = f"rs{rng.randint(1, 999_999_999)}"
+    ref, alt = rng.sample(BASES, 2)
+    star = rng.choice(GENE_STARS[gene])
+    info = f"RS={rsid};GENE={gene};STAR={star};DP={rng.randint(10, 500)}"
+    return "\t".join(
+        [
+            f"chr{chrom}",
+            str(rng.randint(start, end)),
+            rsid,
+            ref,
+            alt,
+            str(rng.randint(20, 99)),
+            "PASS",
+            info,
+            "GT:DP",
+            _sample_columns(rng, samples),
+        ]
+    )
+
+
+def _pathological_record(rng: random.Random, samples: int) -> str:
+    kind = rng.randrange(7)
+    if kind == 0:
+        # Very long INFO field on a background record
+        count = rng.randint(50, 400)
+        extra = ";".join(f"K{i}={rng.random():.6f}" for i in range(count))
+        return _background_record(rng, samples).replace(
+            "\tGT:DP\t", f";{extra}\tGT:DP\t", 1
+        )
+    if kind == 1:
+        # Truncated record (too few columns)
+        cols = _background_record(rng, samples).split("\t")
+        return "\t".join(cols[: rng.randint(1, 8)])
+    if kind == 2:
+        # Lower-case gene name and key, surrounding whitespace
+        return _gene_record(rng, samples).replace("GENE=", "gene= ", 1).lower()
+    if kind == 3:
+        # Gene name outside INFO (pre-screen false positive)
+        return _background_record(rng, samples).replace("PASS", "CYP2D6_region", 1)
+    if kind == 4:
+        # Non-ASCII bytes in INFO
+        return _gene_record(rng, samples).replace("DP=", "NOTE=Prüfung;DP=", 1)
+    if kind == 5:
+        # CRLF line ending
+        return _gene_record(rng, samples) + "\r"
+    # Unsupported gene annotation
+    return _background_record(rng, samples).replace(
+        "\tGT:DP\t", ";GENE=BRCA1;STAR=*2\tGT:DP\t", 1
+    )
+
+
+def iter_synthetic_vcf_lines(
+    size_bytes: int,
+    density: float = 0.01,
+    samples: int = 1,
+    pathological: float = 0.0,
+    seed: int = 0,
+) -> Iterator[str]:
+    """
+    Yield newline-terminated VCF lines until about `size_bytes` (UTF-8) have
+    been produced. `density` and `pathological` are per-record fractions.
+    """
+    rng = random.Random(seed)
+    written = 0
+    for line in _header(samples):
+        written += len(line) + 1
+        yield line + "\n"
+
+    while written < size_bytes:
+        roll = rng.random()
+        if roll < pathological:
+            line = _pathological_record(rng, samples)
+        elif roll < pathological + density:
+            line = _gene_record(rng, samples)
+        else:
+            line = _background_record(rng, samples)
+        line += "\n"
+        written += len(line.encode("utf-8"))
+        yield line
+
+
+def write_synthetic_vcf(
+    out: BinaryIO,
+    size_bytes: int,
+    density: float = 0.01,
+    samples: int = 1,
+    pathological: float = 0.0,
+    seed: int = 0,
+) -> int:
+    """
+    Write a synthetic VCF to a binary stream in 1 MB batches; returns the
+    number of uncompressed bytes written.
+    """
+    total = 0
+    batch: List[str] = []
+    batch_len = 0
+    lines = iter_synthetic_vcf_lines(size_bytes, density, samples, pathological, seed)
+    for line in lines:
+        batch.append(line)
+        batch_len += len(line)
+        if batch_len >= 1024 * 1024:
+            data = "".join(batch).encode("utf-8")
+            out.write(data)
+            total += len(data)
+            batch, batch_len = [], 0
+    data = "".join(batch).encode("utf-8")
+    out.write(data)
+    return total + len(data)
+
+
+def synthetic_vcf_bytes(
+    size_bytes: int,
+    density: float = 0.01,
+    samples: int = 1,
+    pathological: float = 0.0,
+    seed: int = 0,
+) -> bytes:
+    """
+    In-memory variant of `write_synthetic_vcf`.
+    """
+    buffer = io.BytesIO()
+    write_synthetic_vcf(buffer, size_bytes, density, samples, pathological, seed)
+    return buffer.getvalue()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("output", help="output path; a .gz suffix gzip-compresses")
+    parser.add_argument("--size", default="1MB", help="target size, e.g. 64KB, 1GB")
+    parser.add_argument("--density", type=float, default=0.01)
+    parser.add_argument("--samples", type=int, default=1)
+    parser.add_argument("--pathological", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    path = Path(args.output)
+    opener = gzip.open if path.suffix == ".gz" else open
+    with opener(path, "wb") as out:
+        written = write_synthetic_vcf(
+            out,
+            parse_size(args.size),
+            density=args.density,
+            samples=args.samples,
+            pathological=args.pathological,
+            seed=args.seed,
+        )
+    print(f"wrote {written} bytes (uncompressed) to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Shared test setup. Run from the pharmaguard_backend directory:
+
+    python -m pytest tests
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+from pathlib import Path
+from typing import Callable, List, Sequence, Tuple
+
+import pytest
+
+# Configure the app before it is imported: no LLM, no .env, no on-disk state.
+for name in (
+    "LLM_API_KEY",
+    "LLM_API_BASE",
+    "LLM_CACHE_PATH",
+    "RESULT_CACHE_DIR",
+    "VCF_OFFSET_INDEX_DIR",
+    "RULES_PATH",
+):
+    os.environ.pop(name, None)
+os.environ["PHARMAGUARD_SKIP_DOTENV"] = "1"
+os.environ["PROFILE_STORE_PATH"] = ":memory:"
+os.environ["RULES_RELOAD_INTERVAL_SECONDS"] = "0"
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+SAMPLE_VCF_DIR = BACKEND_DIR / "sample_vcf"
+
+
+@pytest.fixture
+def sample_vcf() -> bytes:
+    return (SAMPLE_VCF_DIR / "TC_P1_PATIENT_001_Normal.vcf").read_bytes()
+
+
+# (chrom, pos, rsid, ref, alt, gene, star)
+Record = Tuple[str, int, str, str, str, str, str]
+
+VCF_HEADER = (
+    "##fileformat=VCFv4.2\n"
+    "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\t{samples}\n"
+)
+
+
+def build_vcf(records: Sequence[Record], genotypes: Sequence[Sequence[str]]) -> bytes:
+    """
+    A VCF with one line per record; `genotypes[i]` holds the GT of record
+    `i` for every sample (one sample per column).
+    """
+    n_samples = len(genotypes[0]) if genotypes else 1
+    samples = "\t".join(f"S{i}" for i in range(n_samples))
+    lines: List[str] = [VCF_HEADER.format(samples=samples)]
+    for (chrom, pos, rsid, ref, alt, gene, star), gts in zip(records, genotypes):
+        info = f"RS={rsid};GENE={gene};STAR={star}"
+        cols = [chrom, str(pos), rsid, ref, alt, "99", "PASS", info, "GT"]
+        lines.append("\t".join(cols + list(gts)) + "\n")
+    return "".join(lines).encode()
+
+
+@pytest.fixture
+def make_vcf() -> Callable[..., bytes]:
+    return build_vcf
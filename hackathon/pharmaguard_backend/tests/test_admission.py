@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import asyncio
+from typing import List
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app import main
+from app.admission import AdmissionController
+
+
+def _controller(queue_depth: int = 4, queue_timeout: float = 5) -> AdmissionController:
+    return AdmissionController(
+        max_in_flight=1,
+        queue_depth=queue_depth,
+        queue_timeout=queue_timeout,
+        retry_after=7,
+    )
+
+
+async def _hold(
+    controller: AdmissionController,
+    deterministic: bool,
+    name: str,
+    order: List[str],
+    release: asyncio.Event,
+) -> None:
+    async with controller.admit(deterministic):
+        order.append(name)
+        await release.wait()
+
+
+def test_freed_slots_go_to_deterministic_requests_first() -> None:
+    async def run() -> None:
+        controller = _controller()
+        order: List[str] = []
+        releases = {name: asyncio.Event() for name in ("first", "llm", "det")}
+        tasks = [
+            asyncio.ensure_future(
+                _hold(controller, True, "first", order, releases["first"])
+            )
+        ]
+        await asyncio.sleep(0)
+        # The LLM-bound request queues before the deterministic one.
+        for name, deterministic in (("llm", False), ("det", True)):
+            tasks.append(
+                asyncio.ensure_future(
+                    _hold(controller, deterministic, name, order, releases[name])
+                )
+            )
+            await asyncio.sleep(0)
+        stats = controller.stats()
+        assert (stats["waiting_llm"], stats["waiting_deterministic"]) == (1, 1)
+
+        for name in ("first", "det", "llm"):
+            releases[name].set()
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        assert order == ["first", "det", "llm"]
+        stats = controller.stats()
+        assert (stats["in_flight"], stats["admitted"], stats["queued"]) == (0, 3, 2)
+
+    asyncio.run(run())
+
+
+def test_full_queue_and_timeouts_are_rejected_with_retry_after() -> None:
+    async def run() -> None:
+        controller = _controller(queue_depth=1, queue_timeout=0.05)
+        release = asyncio.Event()
+        holder = asyncio.ensure_future(_hold(controller, True, "a", [], release))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(_hold(controller, True, "b", [], release))
+        await asyncio.sleep(0)
+
+        # Queue full: rejected at once.
+        with pytest.raises(HTTPException) as exc:
+            async with controller.admit(True):
+                pass
+        assert exc.value.status_code == 503
+        assert exc.value.headers == {"Retry-After": "7"}
+
+        # The queued request gives up after the queue timeout.
+        with pytest.raises(HTTPException) as exc:
+            await waiter
+        assert exc.value.status_code == 503
+
+        release.set()
+        await holder
+        stats = controller.stats()
+        assert (stats["rejected"], stats["timed_out"], stats["in_flight"]) == (1, 1, 0)
+
+    asyncio.run(run())
+
+
+def test_cancelled_waiter_does_not_leak_a_slot() -> None:
+    async def run() -> None:
+        controller = _controller()
+        release = asyncio.Event()
+        holder = asyncio.ensure_future(_hold(controller, True, "a", [], release))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(_hold(controller, False, "b", [], release))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert controller.waiting == 0
+
+        release.set()
+        await holder
+        assert controller.in_flight == 0
+        async with controller.admit(False):
+            assert controller.in_flight == 1
+
+    asyncio.run(run())
+
+
+def test_analyze_answers_503_at_capacity(
+    sample_vcf: bytes, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    controller = _controller(queue_depth=0)
+    controller.in_flight = 1  # another analysis holds the only slot
+    monkeypatch.setattr(main, "analyze_admission", controller)
+    with TestClient(main.app) as client:
+        for path in ("/analyze", "/analyze/multi", "/analyze/cohort"):
+            response = client.post(
+                path, data={"drug": "CODEINE"}, files={"file": ("p.vcf", sample_vcf)}
+            )
+            assert response.status_code == 503, path
+            assert response.headers["Retry-After"] == "7"
+            assert response.json()["detail"] == {
+                "error": "Server is at capacity; retry shortly"
+            }
+        metrics = client.get("/metrics").text
+    assert 'pharmaguard_admission_rejections_total{reason="queue_full"}' in metrics
+    assert controller.stats()["rejected"] == 3
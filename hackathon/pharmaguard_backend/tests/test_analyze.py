@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import gzip
+from typing import Callable, Iterator
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main, utils
+
+
+@pytest.fixture
+def client() -> Iterator[TestClient]:
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+def _padded(sample_vcf: bytes, size: int, tag: str) -> bytes:
+    """
+    The sample VCF grown to at least `size` bytes with `tag` header comments,
+    so that no parse cached by another test answers the upload.
+    """
+    header, _, body = sample_vcf.partition(b"#CHROM")
+    line = f"##comment={tag:x<1000}\n".encode()
+    padding = line * max(0, (size - len(sample_vcf)) // len(line) + 1)
+    return header + padding + b"#CHROM" + body
+
+
+def test_default_upload_limit_is_finite() -> None:
+    assert utils.MAX_STREAMED_VCF_SIZE_BYTES == 1024**3
+
+
+@pytest.mark.parametrize("path", ["/analyze", "/analyze/multi"])
+@pytest.mark.parametrize(
+    "size, compressed",
+    # Small uploads stay in memory and are read in chunks; uploads over
+    # 1 MB are spooled to disk and memory-mapped.
+    [(10_000, False), (10_000, True), (3 * 1024 * 1024, False)],
+)
+def test_uploads_over_the_limit_are_rejected(
+    client: TestClient,
+    sample_vcf: bytes,
+    monkeypatch: pytest.MonkeyPatch,
+    path: str,
+    size: int,
+    compressed: bool,
+) -> None:
+    vcf = _padded(sample_vcf, size, f"{path}-{compressed}")
+    monkeypatch.setattr(utils, "MAX_STREAMED_VCF_SIZE_BYTES", len(vcf) - 1)
+    upload = ("p.vcf.gz", gzip.compress(vcf)) if compressed else ("p.vcf", vcf)
+    response = client.post(path, data={"drug": "CODEINE"}, files={"file": upload})
+    assert response.status_code == 400
+    assert response.json()["detail"] == {
+        "error": "VCF file exceeds configured size limit"
+    }
+
+    # At the limit, the same upload is analyzed.
+    monkeypatch.setattr(utils, "MAX_STREAMED_VCF_SIZE_BYTES", len(vcf))
+    response = client.post(path, data={"drug": "CODEINE"}, files={"file": upload})
+    assert response.status_code == 200, response.text
+
+
+def test_multi_matches_single_drug_analysis(
+    client: TestClient, make_vcf: Callable[..., bytes]
+) -> None:
+    records = [
+        ("22", 42522613, "rs3892097", "C", "T", "CYP2D6", "*4"),
+        ("10", 94781859, "rs4244285", "G", "A", "CYP2C19", "*2"),
+    ]
+    vcf = make_vcf(records, [["0/1"], ["1/1"]])
+    response = client.post(
+        "/analyze/multi",
+        data={"drug": "codeine, clopidogrel,ASPIRIN,warfarin,CODEINE"},
+        files={"file": ("p.vcf", vcf)},
+    )
+    assert response.status_code == 200, response.text
+    body = response.json()
+
+    # Duplicates collapse; unsupported drugs and drugs whose gene has no
+    # variants are skipped with a reason.
+    assert [r["drug"] for r in body["results"]] == ["CODEINE", "CLOPIDOGREL"]
+    assert body["skipped_drugs"] == [
+        {"drug": "ASPIRIN", "reason": "Unsupported drug"},
+        {"drug": "WARFARIN", "reason": "No pharmacogenomic variants found for CYP2C9"},
+    ]
+    assert {r["patient_id"] for r in body["results"]} == {body["patient_id"]}
+
+    for result in body["results"]:
+        single = client.post(
+            "/analyze", data={"drug": result["drug"]}, files={"file": ("p.vcf", vcf)}
+        ).json()
+        for field in (
+            "pharmacogenomic_profile",
+            "risk_assessment",
+            "clinical_recommendation",
+            "quality_metrics",
+        ):
+            assert result[field] == single[field], (result["drug"], field)
+
+
+def test_multi_rejects_a_list_without_supported_drugs(
+    client: TestClient, sample_vcf: bytes
+) -> None:
+    response = client.post(
+        "/analyze/multi",
+        data={"drug": "aspirin,ibuprofen"},
+        files={"file": ("p.vcf", sample_vcf)},
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == {"error": "Unsupported drug"}
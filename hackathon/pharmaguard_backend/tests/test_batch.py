@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import gzip
+import io
+import json
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterator, List, Tuple
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app import batch, main
+
+
+def _zip(members: List[Tuple[str, bytes]]) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, content in members:
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+
+def _spool(tmp_path: Path, uploads: List[Tuple[str, bytes]]) -> list:
+    return batch.spool_batch_uploads(
+        [(name, io.BytesIO(content)) for name, content in uploads], str(tmp_path)
+    )
+
+
+def test_zip_members_and_gzip_entries_stream_like_plain_files(
+    tmp_path: Path, sample_vcf: bytes
+) -> None:
+    archive = _zip(
+        [
+            ("a.vcf", sample_vcf),
+            ("b.vcf.gz", gzip.compress(sample_vcf)),
+            ("notes.txt", b"ignored"),
+        ]
+    )
+    entries = _spool(
+        tmp_path,
+        [
+            ("batch.zip", archive),
+            ("c.vcf", sample_vcf),
+            ("d.vcf.gz", gzip.compress(sample_vcf)),
+        ],
+    )
+    names = [name for name, _, _ in entries]
+    assert names == ["a.vcf", "b.vcf.gz", "c.vcf", "d.vcf.gz"]
+
+    results = [batch.parse_batch_vcf(*entry) for entry in entries]
+    expected = results[2][1]
+    assert expected is not None and expected[1]
+    for filename, parsed, error, read_bytes in results:
+        assert error is None, filename
+        assert parsed is not None and parsed[0] == expected[0]
+        assert list(parsed[1]) == list(expected[1])
+        assert read_bytes == len(sample_vcf)
+
+
+def test_entry_limit_stops_decompression(
+    tmp_path: Path, sample_vcf: bytes, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(batch, "BATCH_MAX_ENTRY_BYTES", len(sample_vcf) - 1)
+    bomb = gzip.compress(sample_vcf)
+    entries = _spool(
+        tmp_path, [("a.vcf.gz", bomb), ("b.zip", _zip([("b.vcf", sample_vcf)]))]
+    )
+    for entry in entries:
+        filename, parsed, error, _ = batch.parse_batch_vcf(*entry)
+        assert parsed is None
+        assert error == "VCF file exceeds configured size limit", filename
+
+
+def test_entry_count_and_known_sizes_are_checked_before_parsing(
+    tmp_path: Path, sample_vcf: bytes, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    archive = _zip([(f"{n}.vcf", sample_vcf) for n in range(3)])
+    monkeypatch.setattr(batch, "BATCH_MAX_ENTRIES", 2)
+    with pytest.raises(HTTPException) as exc:
+        _spool(tmp_path, [("batch.zip", archive)])
+    assert exc.value.status_code == 400
+
+    monkeypatch.setattr(batch, "BATCH_MAX_ENTRIES", 3)
+    monkeypatch.setattr(batch, "BATCH_MAX_TOTAL_BYTES", 3 * len(sample_vcf) - 1)
+    with pytest.raises(HTTPException):
+        _spool(tmp_path, [("batch.zip", archive)])
+
+
+def test_corrupt_gzip_entry_is_reported(tmp_path: Path, sample_vcf: bytes) -> None:
+    entries = _spool(tmp_path, [("a.vcf.gz", gzip.compress(sample_vcf)[:-20])])
+    _, parsed, error, _ = batch.parse_batch_vcf(*entries[0])
+    assert parsed is None
+    assert error == "Invalid gzip-compressed VCF file"
+
+
+@pytest.fixture
+def client(monkeypatch: pytest.MonkeyPatch) -> Iterator[TestClient]:
+    # Keep patched limits visible to the workers.
+    executor = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setattr(main, "get_batch_executor", lambda: executor)
+    monkeypatch.setattr(main, "BATCH_PARSE_WORKERS", 1)
+    with TestClient(main.app) as test_client:
+        yield test_client
+    executor.shutdown()
+
+
+def _post_batch(client: TestClient, uploads: List[Tuple[str, bytes]]) -> list:
+    response = client.post(
+        "/analyze/batch",
+        data={"drug": "CODEINE"},
+        files=[("files", (name, content)) for name, content in uploads],
+    )
+    assert response.status_code == 200, response.text
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_batch_matches_single_analysis(client: TestClient, sample_vcf: bytes) -> None:
+    single = client.post(
+        "/analyze",
+        data={"drug": "CODEINE"},
+        files={"file": ("p.vcf", sample_vcf)},
+    ).json()
+    items = _post_batch(
+        client,
+        [
+            ("p.vcf", sample_vcf),
+            ("p.zip", _zip([("q.vcf.gz", gzip.compress(sample_vcf))])),
+        ],
+    )
+    assert sorted(item["filename"] for item in items) == ["p.vcf", "q.vcf.gz"]
+    for item in items:
+        assert item["status"] == "ok"
+        result = item["analysis"]["results"][0]
+        assert result["pharmacogenomic_profile"] == single["pharmacogenomic_profile"]
+        assert result["risk_assessment"] == single["risk_assessment"]
+
+
+def test_entries_past_the_total_limit_are_not_parsed(
+    client: TestClient, sample_vcf: bytes, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # gzip sizes are only known once read, so the total is enforced as the
+    # stream goes: entries already in flight (two per worker) finish, later
+    # ones are skipped.
+    monkeypatch.setattr(main, "BATCH_MAX_TOTAL_BYTES", len(sample_vcf) - 1)
+    compressed = gzip.compress(sample_vcf)
+    items = _post_batch(
+        client, [(f"{name}.vcf.gz", compressed) for name in ("a", "b", "c")]
+    )
+    assert [item["status"] for item in items] == ["ok", "ok", "error"]
+    assert items[2] == {
+        "filename": "c.vcf.gz",
+        "status": "error",
+        "error": "Batch exceeds the total size limit",
+    }
+
+
+def test_empty_batch_is_rejected(client: TestClient) -> None:
+    response = client.post(
+        "/analyze/batch",
+        data={"drug": "CODEINE"},
+        files=[("files", ("batch.zip", _zip([("notes.txt", b"x")])))],
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == {"error": "No VCF files uploaded"}
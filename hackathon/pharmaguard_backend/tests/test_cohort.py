@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+from typing import Callable, Iterator, List
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main
+
+RECORDS = [
+    ("22", 42128945, "rs16947", "C", "T", "CYP2D6", "*2"),
+    ("22", 42522613, "rs3892097", "C", "T", "CYP2D6", "*4"),
+    ("10", 94781859, "rs4244285", "G", "A", "CYP2C19", "*2"),
+]
+# One column per sample; S3 carries no CYP2D6 variant.
+GENOTYPES = [
+    ["0/1", "0/0", "0/1", "0/0", "1/1"],
+    ["0/0", "0/1", "0/1", "0/0", "0/0"],
+    ["0/0", "0/0", "0/0", "0/1", "0/0"],
+]
+SAMPLES = ["S0", "S1", "S2", "S3", "S4"]
+
+
+@pytest.fixture
+def client() -> Iterator[TestClient]:
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+def _column(genotypes: List[List[str]], sample: int) -> List[List[str]]:
+    return [[row[sample]] for row in genotypes]
+
+
+def test_cohort_results_match_single_sample_analysis(
+    client: TestClient, make_vcf: Callable[..., bytes]
+) -> None:
+    response = client.post(
+        "/analyze/cohort",
+        data={"drug": "codeine"},
+        files={"file": ("cohort.vcf", make_vcf(RECORDS, GENOTYPES))},
+    )
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["drug"] == "codeine"
+    assert body["sample_count"] == len(SAMPLES)
+    assert body["samples_without_variants"] == ["S3"]
+
+    results = {result["patient_id"]: result for result in body["results"]}
+    assert sorted(results) == ["S0", "S1", "S2", "S4"]
+    for i, sample in enumerate(SAMPLES):
+        if sample not in results:
+            continue
+        single = client.post(
+            "/analyze",
+            data={"drug": "codeine"},
+            files={"file": ("p.vcf", make_vcf(RECORDS, _column(GENOTYPES, i)))},
+        ).json()
+        result = results[sample]
+        for field in ("pharmacogenomic_profile", "risk_assessment"):
+            assert result[field] == single[field], (sample, field)
+        assert result["quality_metrics"] == single["quality_metrics"], sample
+
+    profile = results["S2"]["pharmacogenomic_profile"]
+    assert (profile["diplotype"], profile["phenotype"]) == ("*2/*4", "Unknown")
+    assert results["S1"]["risk_assessment"]["risk_label"] != "Safe"
+
+
+def test_cohort_rejects_unsupported_drug(
+    client: TestClient, make_vcf: Callable[..., bytes]
+) -> None:
+    response = client.post(
+        "/analyze/cohort",
+        data={"drug": "ASPIRIN"},
+        files={"file": ("cohort.vcf", make_vcf(RECORDS, GENOTYPES))},
+    )
+    assert response.status_code == 400
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import json
+import time
+from pathlib import Path
+
+from app.explanation_cache import ExplanationCache
+
+
+def _key(drug: str):
+    return ExplanationCache.make_key("m", "CYP2D6", "*1/*2", "NM", drug)
+
+
+def test_puts_are_batched_until_flush(tmp_path: Path) -> None:
+    path = tmp_path / "cache.json"
+    cache = ExplanationCache(path=str(path), flush_seconds=3600)
+    cache.put(_key("codeine"), {"summary": "a"})
+    cache.put(_key("tramadol"), {"summary": "b"})
+    assert not path.exists()
+
+    cache.flush()
+    assert len(json.loads(path.read_text())) == 2
+    # Nothing new to write: the file is left alone.
+    path.unlink()
+    cache.flush()
+    assert not path.exists()
+
+    reloaded = ExplanationCache(path=str(path.with_name("missing.json")))
+    assert reloaded.get(_key("codeine")) is None
+    cache.put(_key("codeine"), {"summary": "c"})
+    cache.flush()
+    reloaded = ExplanationCache(path=str(path))
+    assert reloaded.get(_key("codeine")) == {"summary": "c"}
+    assert reloaded.get(_key("tramadol")) == {"summary": "b"}
+
+
+def test_timer_writes_in_the_background(tmp_path: Path) -> None:
+    path = tmp_path / "cache.json"
+    cache = ExplanationCache(path=str(path), flush_seconds=0.01)
+    cache.put(_key("codeine"), {"summary": "a"})
+    deadline = time.monotonic() + 5
+    while not path.exists() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(json.loads(path.read_text())) == 1
+    assert cache._flush_timer is None
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Dict, List, Optional
+
+import pytest
+
+from app import explanation_jobs as jobs_module
+from app.explanation_jobs import ExplanationJobStore
+
+ARGS = ("CYP2D6", "*1/*4", "IM", "CODEINE")
+TEMPLATE_START = "The diplotype *1/*4 in CYP2D6"
+
+
+class FakeLLM:
+    """
+    Stands in for `generate_explanation`: each call waits for `release`,
+    then returns an explanation or raises `error`.
+    """
+
+    def __init__(self, error: Optional[Exception] = None) -> None:
+        self.error = error
+        self.calls: List[tuple] = []
+        self.release = asyncio.Event()
+
+    async def __call__(self, **kwargs: str) -> Dict[str, str]:
+        self.calls.append(tuple(kwargs.values()))
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return {
+            "summary": "Generated.",
+            "mechanism": "m",
+            "clinical_guideline_reference": "r",
+        }
+
+
+def _install(monkeypatch: pytest.MonkeyPatch, llm: FakeLLM) -> ExplanationJobStore:
+    monkeypatch.setattr(jobs_module, "generate_explanation", llm)
+    return ExplanationJobStore(ttl_seconds=60, max_entries=10)
+
+
+def test_identical_pending_requests_share_one_job(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    async def run() -> None:
+        llm = FakeLLM()
+        store = _install(monkeypatch, llm)
+        first = store.submit(*ARGS)
+        assert store.submit(*ARGS) == first
+        other = store.submit("CYP2D6", "*1/*4", "IM", "TRAMADOL")
+        assert other != first
+        await asyncio.sleep(0)
+        assert len(llm.calls) == 2
+        assert store.status(first) == ("pending", None)
+
+        llm.release.set()
+        explanation = await store.wait(first, timeout=1)
+        assert explanation is not None and explanation["summary"] == "Generated."
+        assert store.status(first) == ("ready", explanation)
+        # A finished job is not reused: the next request is a new job.
+        assert store.submit(*ARGS) != first
+
+    asyncio.run(run())
+
+
+def test_failed_job_reports_the_static_template(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    async def run() -> None:
+        llm = FakeLLM(error=RuntimeError("boom"))
+        llm.release.set()
+        store = _install(monkeypatch, llm)
+        job_id = store.submit(*ARGS)
+        explanation = await store.wait(job_id, timeout=1)
+        assert explanation is not None
+        assert explanation["summary"].startswith(TEMPLATE_START)
+        assert store.status(job_id) == ("ready", explanation)
+
+    asyncio.run(run())
+
+
+def test_cancelled_job_reports_the_static_template(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    async def run() -> None:
+        store = _install(monkeypatch, FakeLLM())
+        job_id = store.submit(*ARGS)
+        waiter = asyncio.ensure_future(store.wait(job_id, timeout=1))
+        await asyncio.sleep(0)
+        store._jobs[job_id].task.cancel()
+        explanation = await waiter
+        assert explanation is not None
+        assert explanation["summary"].startswith(TEMPLATE_START)
+        state, polled = store.status(job_id) or (None, None)
+        assert state == "ready" and polled == explanation
+
+    asyncio.run(run())
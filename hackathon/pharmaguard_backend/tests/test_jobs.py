@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import time
+from typing import Callable, Dict, Iterator
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main, utils
+from app.admission import AdmissionController
+from app.analysis_jobs import ANALYSIS_JOB_RETRY_AFTER_SECONDS, AnalysisJobQueue
+
+
+@pytest.fixture
+def jobs(monkeypatch: pytest.MonkeyPatch) -> AnalysisJobQueue:
+    queue = AnalysisJobQueue(workers=1, queue_depth=4, ttl_seconds=60, max_entries=10)
+    monkeypatch.setattr(main, "analysis_jobs", queue)
+    return queue
+
+
+@pytest.fixture
+def admission(monkeypatch: pytest.MonkeyPatch) -> AdmissionController:
+    controller = AdmissionController(
+        max_in_flight=1, queue_depth=1, queue_timeout=5, retry_after=2
+    )
+    monkeypatch.setattr(main, "analyze_admission", controller)
+    return controller
+
+
+@pytest.fixture
+def client(
+    jobs: AnalysisJobQueue, admission: AdmissionController
+) -> Iterator[TestClient]:
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+def _submit(client: TestClient, vcf: bytes, drug: str = "CODEINE") -> Dict:
+    response = client.post(
+        "/jobs/analyze", data={"drug": drug}, files={"file": ("p.vcf", vcf)}
+    )
+    assert response.status_code == 202, response.text
+    return response.json()
+
+
+def _wait(client: TestClient, status_url: str) -> Dict:
+    deadline = time.monotonic() + 10
+    while True:
+        body = client.get(status_url).json()
+        if body["status"] in ("succeeded", "failed") or time.monotonic() > deadline:
+            return body
+        time.sleep(0.01)
+
+
+def test_job_lifecycle_matches_analyze(
+    client: TestClient,
+    jobs: AnalysisJobQueue,
+    admission: AdmissionController,
+    sample_vcf: bytes,
+) -> None:
+    # A distinct upload, so the job parses it rather than using a cached result.
+    vcf = sample_vcf + b"\n\n\n"
+    submitted = _submit(client, vcf)
+    assert submitted["status"] in ("queued", "running")
+    assert submitted["status_url"] == f"/jobs/{submitted['job_id']}"
+
+    finished = _wait(client, submitted["status_url"])
+    assert finished["status"] == "succeeded", finished
+    assert {"hash", "parse", "phenotype", "risk"} <= set(finished["stages"])
+    single = client.post(
+        "/analyze", data={"drug": "CODEINE"}, files={"file": ("p.vcf", vcf)}
+    ).json()
+    for field in ("pharmacogenomic_profile", "risk_assessment", "quality_metrics"):
+        assert finished["result"][field] == single[field], field
+
+    # The job held an admission slot while it ran, then released it.
+    assert admission.admitted == 2 and admission.in_flight == 0
+    stats = jobs.stats()
+    assert (stats["submitted"], stats["succeeded"], stats["failed"]) == (1, 1, 0)
+
+    assert client.get("/jobs/not-a-job").status_code == 404
+
+
+def test_failed_job_reports_its_error(
+    client: TestClient, make_vcf: Callable[..., bytes]
+) -> None:
+    vcf = make_vcf(
+        [("10", 94781859, "rs4244285", "G", "A", "CYP2C19", "*2")], [["0/1"]]
+    )
+    finished = _wait(client, _submit(client, vcf)["status_url"])
+    assert finished["status"] == "failed"
+    assert finished["error"] == "No pharmacogenomic variants found for CYP2D6"
+    assert "result" not in finished
+
+
+def test_oversized_upload_is_rejected_at_submission(
+    client: TestClient,
+    jobs: AnalysisJobQueue,
+    sample_vcf: bytes,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(utils, "MAX_STREAMED_VCF_SIZE_BYTES", len(sample_vcf) - 1)
+    response = client.post(
+        "/jobs/analyze", data={"drug": "CODEINE"}, files={"file": ("p.vcf", sample_vcf)}
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == {
+        "error": "VCF file exceeds configured size limit"
+    }
+    assert jobs.stats()["submitted"] == 0
+
+
+def test_full_job_queue_answers_503(
+    client: TestClient, jobs: AnalysisJobQueue, sample_vcf: bytes
+) -> None:
+    jobs.queue_depth = 0
+    response = client.post(
+        "/jobs/analyze", data={"drug": "CODEINE"}, files={"file": ("p.vcf", sample_vcf)}
+    )
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(ANALYSIS_JOB_RETRY_AFTER_SECONDS)
+    assert jobs.stats()["rejected"] == 1
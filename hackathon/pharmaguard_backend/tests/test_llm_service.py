@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Dict, Optional
+
+import pytest
+
+from app import llm_service
+from app.explanation_cache import ExplanationCache
+from app.llm_service import CircuitBreaker
+
+
+class FakeResponse:
+    def raise_for_status(self) -> None:
+        pass
+
+    def json(self) -> Dict[str, object]:
+        return {"choices": [{"message": {"content": "Generated summary."}}]}
+
+
+class FakeClient:
+    """
+    Stands in for the pooled httpx client. `post` succeeds, raises `error`,
+    or blocks until cancelled when `block` is set.
+    """
+
+    def __init__(self, error: Optional[Exception] = None, block: bool = False):
+        self.error = error
+        self.block = block
+        self.calls = 0
+
+    async def post(self, url: str, **kwargs: object) -> FakeResponse:
+        self.calls += 1
+        if self.block:
+            await asyncio.Event().wait()
+        if self.error is not None:
+            raise self.error
+        return FakeResponse()
+
+
+def _half_open_ready(breaker: CircuitBreaker) -> None:
+    breaker.state = "open"
+    breaker.opened_at = time.monotonic() - breaker.reset_seconds - 1
+
+
+@pytest.fixture
+def breaker(monkeypatch: pytest.MonkeyPatch) -> CircuitBreaker:
+    monkeypatch.setenv("LLM_API_KEY", "test-key")
+    monkeypatch.setenv("LLM_API_BASE", "http://llm.invalid/v1/chat/completions")
+    monkeypatch.setattr(llm_service, "explanation_cache", ExplanationCache())
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=30)
+    monkeypatch.setattr(llm_service, "_breaker", breaker)
+    return breaker
+
+
+def _install(
+    monkeypatch: pytest.MonkeyPatch, client: FakeClient, slots: int = 1
+) -> None:
+    monkeypatch.setattr(llm_service, "_client", client)
+    monkeypatch.setattr(llm_service, "_semaphore", asyncio.Semaphore(slots))
+
+
+def _explain() -> "asyncio.Future[Dict[str, str]]":
+    return asyncio.ensure_future(
+        llm_service.generate_explanation("CYP2D6", "*1/*4", "IM", "CODEINE")
+    )
+
+
+def test_breaker_opens_after_threshold_and_probes_after_reset() -> None:
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=30)
+    breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow_request()
+    assert breaker.rejected_calls == 1
+
+    _half_open_ready(breaker)
+    assert breaker.allow_request()
+    assert breaker.state == "half_open"
+    # Only one probe at a time.
+    assert not breaker.allow_request()
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.consecutive_failures == 0
+
+
+def test_failed_probe_reopens_with_fresh_timestamp() -> None:
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=30)
+    _half_open_ready(breaker)
+    assert breaker.allow_request()
+    before = time.monotonic()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.opened_at >= before
+
+
+def test_abort_probe_only_affects_half_open() -> None:
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=30)
+    breaker.abort_probe()
+    assert breaker.state == "closed"
+
+    _half_open_ready(breaker)
+    breaker.allow_request()
+    before = time.monotonic()
+    breaker.abort_probe()
+    assert breaker.state == "open"
+    assert breaker.opened_at >= before
+
+
+def test_successful_probe_closes_circuit(
+    breaker: CircuitBreaker, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    client = FakeClient()
+    _install(monkeypatch, client)
+    _half_open_ready(breaker)
+
+    explanation = asyncio.run(
+        llm_service.generate_explanation("CYP2D6", "*1/*4", "IM", "CODEINE")
+    )
+    assert explanation["summary"] == "Generated summary."
+    assert client.calls == 1
+    assert breaker.state == "closed"
+
+
+def test_failing_calls_trip_the_breaker(
+    breaker: CircuitBreaker, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    client = FakeClient(error=RuntimeError("upstream down"))
+    _install(monkeypatch, client)
+
+    async def run() -> None:
+        for _ in range(3):
+            await llm_service.generate_explanation("CYP2D6", "*1/*4", "IM", "CODEINE")
+
+    asyncio.run(run())
+    assert breaker.state == "open"
+    # The third call was refused without reaching the client.
+    assert client.calls == 2
+    assert breaker.rejected_calls == 1
+
+
+def test_cancelled_probe_does_not_stick_half_open(
+    breaker: CircuitBreaker, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    _install(monkeypatch, FakeClient(block=True))
+    _half_open_ready(breaker)
+    before = time.monotonic()
+
+    async def run() -> None:
+        task = _explain()
+        await asyncio.sleep(0.01)
+        assert breaker.state == "half_open"
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert breaker.state == "open"
+    assert breaker.opened_at >= before
+    assert llm_service._semaphore._value == 1
+
+    # After the reset period the next call probes again.
+    _half_open_ready(breaker)
+    _install(monkeypatch, FakeClient())
+    asyncio.run(llm_service.generate_explanation("CYP2D6", "*1/*4", "IM", "CODEINE"))
+    assert breaker.state == "closed"
+
+
+def test_probe_cancelled_while_waiting_for_a_slot(
+    breaker: CircuitBreaker, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    _install(monkeypatch, FakeClient(), slots=0)
+    _half_open_ready(breaker)
+
+    async def run() -> None:
+        task = _explain()
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert breaker.state == "open"
+
+
+def test_saturated_probe_reopens_with_fresh_timestamp(
+    breaker: CircuitBreaker, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    client = FakeClient()
+    _install(monkeypatch, client, slots=0)
+    monkeypatch.setattr(llm_service, "LLM_ACQUIRE_TIMEOUT_SECONDS", 0.01)
+    _half_open_ready(breaker)
+    before = time.monotonic()
+
+    explanation = asyncio.run(
+        llm_service.generate_explanation("CYP2D6", "*1/*4", "IM", "CODEINE")
+    )
+    assert explanation["clinical_guideline_reference"] == "CPIC Level A"
+    assert client.calls == 0
+    assert breaker.state == "open"
+    assert breaker.opened_at >= before
+    # The probe was abandoned, not failed.
+    assert breaker.consecutive_failures == 0
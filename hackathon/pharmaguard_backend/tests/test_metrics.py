@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+from typing import Dict, Iterator
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main
+
+ANALYZE_COUNT = (
+    'pharmaguard_request_duration_seconds_count{route="/analyze",method="POST",'
+    'status="200"}'
+)
+PARSE_COUNT = 'pharmaguard_stage_duration_seconds_count{stage="parse"}'
+VARIANTS = "pharmaguard_variants_parsed_total"
+FALLBACKS = 'pharmaguard_llm_fallbacks_total{reason="not_configured"}'
+
+
+@pytest.fixture
+def client() -> Iterator[TestClient]:
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+def _samples(client: TestClient) -> Dict[str, float]:
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    samples = {}
+    for line in response.text.splitlines():
+        if line and not line.startswith("#"):
+            name, _, value = line.rpartition(" ")
+            samples[name] = float(value)
+    return samples
+
+
+def _server_timing(header: str) -> Dict[str, float]:
+    entries = {}
+    for entry in header.split(", "):
+        name, _, duration = entry.partition(";dur=")
+        entries[name] = float(duration)
+    return entries
+
+
+def test_analyze_reports_stage_timings(client: TestClient, sample_vcf: bytes) -> None:
+    before = _samples(client)
+    response = client.post(
+        "/analyze",
+        data={"drug": "CODEINE"},
+        # A distinct upload, so the request is parsed rather than cached.
+        files={"file": ("p.vcf", sample_vcf + b"\n\n")},
+    )
+    assert response.status_code == 200
+
+    timings = _server_timing(response.headers["server-timing"])
+    stages = ("upload", "admission", "hash", "parse", "phenotype", "risk")
+    assert set(stages) | {"serialize", "total"} <= set(timings)
+    assert all(duration >= 0 for duration in timings.values())
+    assert timings["total"] >= sum(timings[stage] for stage in stages)
+
+    after = _samples(client)
+    assert after[ANALYZE_COUNT] == before.get(ANALYZE_COUNT, 0) + 1
+    assert after[PARSE_COUNT] == before.get(PARSE_COUNT, 0) + 1
+    # The sample VCF carries one pharmacogene variant; no LLM is configured.
+    assert after[VARIANTS] == before.get(VARIANTS, 0) + 1
+    assert after[FALLBACKS] == before.get(FALLBACKS, 0) + 1
+
+
+def test_every_response_carries_server_timing(client: TestClient) -> None:
+    response = client.get("/health")
+    assert "total" in _server_timing(response.headers["server-timing"])
+
+    response = client.post("/analyze", data={"drug": "CODEINE"})
+    assert response.status_code == 422
+    assert "total" in _server_timing(response.headers["server-timing"])
+
+    samples = _samples(client)
+    route = 'route="/analyze",method="POST",status="422"'
+    assert samples[f"pharmaguard_request_duration_seconds_count{{{route}}}"] >= 1
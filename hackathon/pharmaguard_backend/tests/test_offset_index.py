@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import hashlib
+import io
+from pathlib import Path
+from typing import List
+
+import pytest
+from fastapi import UploadFile
+
+from app.offset_index import OffsetIndexStore, VcfOffsetIndex, index_vcf_file
+from app.utils import hash_upload_file
+from app.vcf_parser import parse_vcf_buffer
+
+
+def _sha(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _rows(result) -> List[object]:
+    return [result[0], list(result[1])]
+
+
+@pytest.fixture
+def store(tmp_path: Path) -> OffsetIndexStore:
+    return OffsetIndexStore(str(tmp_path))
+
+
+def test_upload_key_is_stable_across_reuploads(sample_vcf: bytes) -> None:
+    first = UploadFile(io.BytesIO(sample_vcf), filename="a.vcf")
+    second = UploadFile(io.BytesIO(sample_vcf), filename="renamed.vcf")
+    assert hash_upload_file(first) == hash_upload_file(second) == _sha(sample_vcf)
+    # Hashing leaves the upload rewound for the parser.
+    assert first.file.read() == sample_vcf
+
+    edited = UploadFile(io.BytesIO(sample_vcf + b"\n"), filename="a.vcf")
+    assert hash_upload_file(edited) != _sha(sample_vcf)
+
+
+def test_reupload_hits_the_index(store: OffsetIndexStore, sample_vcf: bytes) -> None:
+    full = parse_vcf_buffer(sample_vcf)
+    assert _rows(store.parse(sample_vcf, _sha(sample_vcf))) == _rows(full)
+    assert store.stats()["misses"] == 1 and store.stats()["writes"] == 1
+
+    # A fresh copy of the same bytes (a re-upload) replays the index.
+    reupload = bytes(bytearray(sample_vcf))
+    assert _rows(store.parse(reupload, _sha(reupload))) == _rows(full)
+    assert store.stats()["hits"] == 1
+
+    # Another process sees the same file.
+    other = OffsetIndexStore(store.directory)
+    assert _rows(other.parse(sample_vcf, _sha(sample_vcf))) == _rows(full)
+    assert other.stats()["hits"] == 1
+
+
+def test_index_round_trips_and_rejects_damage(
+    store: OffsetIndexStore, sample_vcf: bytes
+) -> None:
+    store.parse(sample_vcf, _sha(sample_vcf))
+    index = store.load(_sha(sample_vcf))
+    assert index is not None and index.offsets()
+    data = index.to_bytes()
+    copy = VcfOffsetIndex.from_bytes(data)
+    assert copy.offsets() == index.offsets()
+    assert copy.variant_count == index.variant_count
+    assert index.variant_count == len(parse_vcf_buffer(sample_vcf)[1])
+    for damaged in (data[:-1], data + b"\0", b"X" + data[1:]):
+        with pytest.raises(ValueError):
+            VcfOffsetIndex.from_bytes(damaged)
+
+
+@pytest.mark.parametrize(
+    "damage",
+    [
+        "size",  # same key, different length
+        "offsets",  # same length, records moved
+        "count",  # stale variant count
+        "corrupt",  # unreadable file
+    ],
+)
+def test_stale_indexes_are_invalidated(
+    store: OffsetIndexStore, sample_vcf: bytes, damage: str
+) -> None:
+    key = _sha(sample_vcf)
+    store.parse(sample_vcf, key)
+    index = store.load(key)
+    assert index is not None
+    buf = sample_vcf
+    if damage == "size":
+        buf = sample_vcf + b"\n"
+    elif damage == "offsets":
+        # Shift every line by swapping two header characters for one: the
+        # stored offsets no longer land on record lines.
+        buf = sample_vcf.replace(b"##", b"#", 1) + b"\n"
+    elif damage == "count":
+        index.variant_count += 1
+        store.save(index)
+    else:
+        Path(store._path(key)).write_bytes(b"garbage")
+
+    # Parsing still gives the full-scan result and rewrites a good index.
+    assert _rows(store.parse(buf, key)) == _rows(parse_vcf_buffer(buf))
+    assert store.stats()["invalidations"] == 1
+    rebuilt = store.load(key)
+    assert rebuilt is not None and rebuilt.size == len(buf)
+    assert _rows(store.parse(buf, key)) == _rows(parse_vcf_buffer(buf))
+    assert store.stats()["hits"] == 1
+
+
+def test_disabled_store_parses_without_writing(sample_vcf: bytes) -> None:
+    store = OffsetIndexStore(None)
+    result = store.parse(sample_vcf, _sha(sample_vcf))
+    assert _rows(result) == _rows(parse_vcf_buffer(sample_vcf))
+    assert store.load(_sha(sample_vcf)) is None
+    assert store.stats()["writes"] == 0
+
+
+def test_prebuilt_index_matches_upload_key(
+    store: OffsetIndexStore, sample_vcf: bytes, tmp_path: Path
+) -> None:
+    path = tmp_path / "patient.vcf"
+    path.write_bytes(sample_vcf)
+    index = index_vcf_file(str(path), store)
+    upload = UploadFile(io.BytesIO(sample_vcf), filename="patient.vcf")
+    assert index.content_sha256 == hash_upload_file(upload)
+    store.parse(sample_vcf, hash_upload_file(upload))
+    assert store.stats()["hits"] == 1
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app import main, parse_executor as parse_executor_module
+from app.parse_executor import ParseExecutor
+
+
+def _blocking_job(started: threading.Event, release: threading.Event) -> str:
+    started.set()
+    release.wait(5)
+    return "done"
+
+
+def test_full_pool_and_queue_reject_with_retry_after() -> None:
+    async def run() -> None:
+        executor = ParseExecutor("thread", max_workers=1, queue_depth=1)
+        started, release = threading.Event(), threading.Event()
+        running = asyncio.ensure_future(executor.run(_blocking_job, started, release))
+        queued = asyncio.ensure_future(executor.run(_blocking_job, started, release))
+        await asyncio.sleep(0)
+        assert await asyncio.to_thread(started.wait, 5)
+
+        with pytest.raises(HTTPException) as exc:
+            await executor.run(_blocking_job, started, release)
+        assert exc.value.status_code == 503
+        assert exc.value.headers == {
+            "Retry-After": str(parse_executor_module.PARSE_RETRY_AFTER_SECONDS)
+        }
+        stats = executor.stats()
+        assert (stats["running"], stats["queued"], stats["rejected"]) == (1, 1, 1)
+
+        release.set()
+        assert await asyncio.gather(running, queued) == ["done", "done"]
+        stats = executor.stats()
+        assert (stats["running"], stats["queued"], stats["completed"]) == (0, 0, 2)
+        # Capacity is back once the jobs finish.
+        assert await executor.run(_blocking_job, started, release) == "done"
+        executor.shutdown()
+
+    asyncio.run(run())
+
+
+def test_abandoned_request_releases_its_slot_when_the_job_ends() -> None:
+    async def run() -> None:
+        executor = ParseExecutor("thread", max_workers=1, queue_depth=0)
+        started, release = threading.Event(), threading.Event()
+        request = asyncio.ensure_future(executor.run(_blocking_job, started, release))
+        assert await asyncio.to_thread(started.wait, 5)
+        request.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await request
+        # The worker is still busy, so the slot is still taken.
+        with pytest.raises(HTTPException):
+            await executor.run(_blocking_job, started, release)
+
+        release.set()
+        while executor.stats()["completed"] < 1:
+            await asyncio.sleep(0.01)
+        assert await executor.run(_blocking_job, started, release) == "done"
+        executor.shutdown()
+
+    asyncio.run(run())
+
+
+def test_analyze_answers_503_when_the_parse_pool_is_full(
+    sample_vcf: bytes, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    executor = ParseExecutor("thread", max_workers=1, queue_depth=0)
+    executor.pending = 1  # one job in flight
+    monkeypatch.setattr(main, "parse_executor", executor)
+    with TestClient(main.app) as client:
+        response = client.post(
+            "/analyze",
+            data={"drug": "CODEINE"},
+            # A distinct upload, so no cached parse answers it.
+            files={"file": ("p.vcf", sample_vcf + b"\n")},
+        )
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(
+        parse_executor_module.PARSE_RETRY_AFTER_SECONDS
+    )
+    assert executor.stats()["rejected"] == 1
@@ -0,0 +1,190 @@
+"""
+Diplotype and phenotype calls, pinned against the STAR-annotation calls the
+backend made before definition-based allele calling, plus the cases where
+complete definitions deliberately change the call.
+"""
+
+from __future__ import annotations
+
+from typing import Callable, Dict, List, Tuple
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main
+from app.cohort import determine_cohort_phenotypes
+from app.gene_rules import SUPPORTED_GENES
+from app.parse_executor import parse_vcf_cohort_source
+from app.phenotype_mapper import determine_gene_phenotype
+from app.vcf_parser import parse_vcf_lines
+
+RECORDS = {
+    "rs16947": ("22", 42128945, "rs16947", "C", "T", "CYP2D6", "*2"),
+    "rs1135840": ("22", 42129132, "rs1135840", "G", "C", "CYP2D6", "*4"),
+    "rs3892097": ("22", 42522613, "rs3892097", "C", "T", "CYP2D6", "*4"),
+    "rs1065852": ("22", 42523805, "rs1065852", "G", "A", "CYP2D6", "*4"),
+    "rs59421388": ("22", 42524947, "rs59421388", "C", "T", "CYP2D6", "*17"),
+    "rs4244285": ("10", 94781859, "rs4244285", "G", "A", "CYP2C19", "*2"),
+    "rs12248560": ("10", 94761900, "rs12248560", "C", "T", "CYP2C19", "*17"),
+    "rs1800460": ("6", 18133885, "rs1800460", "G", "A", "TPMT", "*3A"),
+    "rs1142345": ("6", 18143724, "rs1142345", "T", "C", "TPMT", "*3B"),
+}
+
+Case = Tuple[str, List[Tuple[str, str]], str, str]
+
+# Inputs whose definition variants are incomplete: the STAR annotations of
+# the unexplained records must give the same call as before.
+BASELINE_CASES: List[Case] = [
+    # *2 is complete, rs3892097 alone does not complete *4: keep its STAR.
+    (
+        "CYP2D6",
+        [("rs16947", "0/1"), ("rs1135840", "0/1"), ("rs3892097", "0/1")],
+        "*2/*4",
+        "Unknown",
+    ),
+    ("CYP2D6", [("rs3892097", "0/1")], "*1/*4", "IM"),
+    ("CYP2D6", [("rs16947", "0/1")], "*1/*2", "NM"),
+    ("CYP2C19", [("rs4244285", "0/1"), ("rs12248560", "0/1")], "*17/*2", "Unknown"),
+    # A homozygous record is one allele, as in the STAR-only call.
+    ("CYP2C19", [("rs4244285", "1/1")], "*1/*2", "IM"),
+    ("CYP2D6", [("rs16947", "1/1")], "*1/*2", "NM"),
+    # *10 and *3B/*3C are defined but not mapped: the STAR annotation stays.
+    ("CYP2D6", [("rs1065852", "0/1"), ("rs1135840", "0/1")], "*4/*4", "PM"),
+    ("TPMT", [("rs1800460", "0/1")], "*1/*3A", "IM"),
+    ("TPMT", [("rs1142345", "0/1")], "*1/*3B", "Unknown"),
+]
+
+# Complete definitions intentionally refine the STAR-only call (previous
+# call in the comment): the records of one haplotype make one allele.
+DEFINITION_CASES: List[Case] = [
+    # *4/*4 PM: three records of one *4 haplotype were counted twice.
+    (
+        "CYP2D6",
+        [("rs1065852", "0/1"), ("rs3892097", "0/1"), ("rs1135840", "0/1")],
+        "*1/*4",
+        "IM",
+    ),
+    # *4/*4 PM: zygosity is not used (as in the STAR-only call), so these are
+    # one *4 as well.
+    (
+        "CYP2D6",
+        [("rs1065852", "1/1"), ("rs3892097", "1/1"), ("rs1135840", "1/1")],
+        "*1/*4",
+        "IM",
+    ),
+    # *2/*4: rs1135840 is explained by *2; the unknown record keeps its STAR.
+    (
+        "CYP2D6",
+        [("rs16947", "0/1"), ("rs1135840", "0/1"), ("rs59421388", "0/1")],
+        "*17/*2",
+        "Unknown",
+    ),
+    # *3A/*3B: both variants on one haplotype define *3A.
+    ("TPMT", [("rs1800460", "0/1"), ("rs1142345", "0/1")], "*1/*3A", "IM"),
+]
+
+ALL_CASES = BASELINE_CASES + DEFINITION_CASES
+
+
+# Sample-VCF genotype edits analysed end to end, with the response the
+# STAR-only backend gave: (genotypes, drug, diplotype, phenotype, risk label).
+SAMPLE_CASES = [
+    ({"rs1800460": "0/1"}, "AZATHIOPRINE", "*1/*3A", "IM", "Adjust Dosage"),
+    ({"rs1142345": "0/1"}, "AZATHIOPRINE", "*1/*3B", "Unknown", "Unknown"),
+    ({"rs4244285": "1/1"}, "CLOPIDOGREL", "*1/*2", "IM", "Adjust Dosage"),
+    ({"rs16947": "1/1"}, "CODEINE", "*1/*2", "NM", "Safe"),
+]
+
+
+def _edit_sample_vcf(sample_vcf: bytes, genotypes: Dict[str, str]) -> bytes:
+    lines = sample_vcf.decode().splitlines(keepends=True)
+    for n, line in enumerate(lines):
+        cols = line.split("\t")
+        if len(cols) > 9 and cols[2] in genotypes:
+            cols[9] = genotypes[cols[2]] + cols[9][3:]
+            lines[n] = "\t".join(cols)
+    return "".join(lines).encode()
+
+
+def _case_vcf(make_vcf: Callable[..., bytes], genotypes: List[Tuple[str, str]]) -> str:
+    records = [RECORDS[rsid] for rsid, _gt in genotypes]
+    return make_vcf(records, [[gt] for _rsid, gt in genotypes]).decode()
+
+
+def test_sample_vcf_calls(sample_vcf: bytes) -> None:
+    ok, variants = parse_vcf_lines(sample_vcf.decode().splitlines())
+    assert ok
+    calls: Dict[str, Tuple[str, str]] = {}
+    for gene in SUPPORTED_GENES:
+        result = determine_gene_phenotype(gene, variants)
+        calls[gene] = (result["diplotype"], result["phenotype"])
+    assert calls == {
+        "CYP2D6": ("*1/*2", "NM"),
+        "CYP2C19": ("*1/*1", "NM"),
+        "CYP2C9": ("*1/*1", "NM"),
+        "SLCO1B1": ("*1/*1", "NM"),
+        "TPMT": ("*1/*1", "NM"),
+        "DPYD": ("*1/*1", "NM"),
+    }
+
+
+@pytest.mark.parametrize("gene, genotypes, diplotype, phenotype", ALL_CASES)
+def test_calls(
+    make_vcf: Callable[..., bytes],
+    gene: str,
+    genotypes: List[Tuple[str, str]],
+    diplotype: str,
+    phenotype: str,
+) -> None:
+    _ok, variants = parse_vcf_lines(_case_vcf(make_vcf, genotypes).splitlines())
+    result = determine_gene_phenotype(gene, variants)
+    assert (result["diplotype"], result["phenotype"]) == (diplotype, phenotype)
+    # The list-of-variants path gives the same call.
+    listed = determine_gene_phenotype(gene, list(variants))
+    assert listed["diplotype"] == diplotype
+
+
+def test_cohort_matches_single_sample_calls(make_vcf: Callable[..., bytes]) -> None:
+    """
+    One multi-sample VCF holding every case as a sample: the per-pattern
+    cohort calls equal the single-sample calls.
+    """
+    rsids = list(RECORDS)
+    records = [RECORDS[rsid] for rsid in rsids]
+    samples = [dict(genotypes) for _gene, genotypes, _d, _p in ALL_CASES]
+    genotypes = [[sample.get(rsid, "0/0") for sample in samples] for rsid in rsids]
+    cohort = parse_vcf_cohort_source(make_vcf(records, genotypes), False)
+
+    for gene in SUPPORTED_GENES:
+        phenotypes = determine_cohort_phenotypes(gene, cohort)
+        for i, sample in enumerate(samples):
+            single = [
+                (gt, rsid) for rsid, gt in sample.items() if RECORDS[rsid][5] == gene
+            ]
+            sample_vcf = _case_vcf(make_vcf, [(rsid, gt) for gt, rsid in single])
+            _ok, variants = parse_vcf_lines(sample_vcf.splitlines())
+            expected = determine_gene_phenotype(gene, variants)
+            assert phenotypes.diplotype_of(i) == expected["diplotype"], (gene, i)
+            assert phenotypes.phenotype_of(i) == expected["phenotype"], (gene, i)
+
+
+@pytest.mark.parametrize("genotypes, drug, diplotype, phenotype, label", SAMPLE_CASES)
+def test_sample_vcf_analysis_matches_star_calls(
+    sample_vcf: bytes,
+    genotypes: Dict[str, str],
+    drug: str,
+    diplotype: str,
+    phenotype: str,
+    label: str,
+) -> None:
+    with TestClient(main.app) as client:
+        response = client.post(
+            "/analyze",
+            data={"drug": drug},
+            files={"file": ("p.vcf", _edit_sample_vcf(sample_vcf, genotypes))},
+        )
+    assert response.status_code == 200, response.text
+    body = response.json()
+    profile = body["pharmacogenomic_profile"]
+    assert (profile["diplotype"], profile["phenotype"]) == (diplotype, phenotype)
+    assert body["risk_assessment"]["risk_label"] == label
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import logging
+from pathlib import Path
+
+import pytest
+
+from app.profile_store import GeneProfile, ProfileStore
+
+
+def _genes() -> list:
+    return [GeneProfile("CYP2D6", "*1/*4", "IM", ["rs3892097"])]
+
+
+def test_stats_do_not_open_the_database(tmp_path: Path) -> None:
+    path = tmp_path / "profiles.db"
+    store = ProfileStore(str(path))
+    stats = store.stats()
+    assert stats["size"] is None
+    assert not path.exists()
+
+
+def test_patient_count_is_tracked_without_queries(tmp_path: Path) -> None:
+    path = str(tmp_path / "profiles.db")
+    store = ProfileStore(path)
+    store.save("p1", _genes(), True, 3, "v1")
+    store.save("p2", _genes(), True, 3, "v1")
+    # Replacing a profile does not add a patient.
+    store.save("p1", _genes(), True, 4, "v1")
+    assert store.stats()["size"] == 2
+
+    assert store.delete("p2")
+    assert not store.delete("p2")
+    assert store.stats()["size"] == 1
+    assert store.stats()["writes"] == 3
+    store.close()
+
+    # A new process counts the existing rows once, when it opens the file.
+    reopened = ProfileStore(path)
+    assert reopened.stats()["size"] is None
+    assert reopened.get("p1") is not None
+    assert reopened.stats()["size"] == 1
+    reopened.close()
+
+
+def test_lookup_and_get_round_trip() -> None:
+    store = ProfileStore(":memory:")
+    store.save("p1", _genes(), True, 3, "v1")
+
+    found = store.lookup("p1", "CYP2D6")
+    assert found is not None and found.gene == _genes()[0]
+    assert found.variants_detected_count == 3
+
+    no_gene = store.lookup("p1", "TPMT")
+    assert no_gene is not None and no_gene.gene is None
+    assert store.lookup("missing", "CYP2D6") is None
+
+    stored = store.get("p1")
+    assert stored is not None and stored.genes == _genes()
+    assert store.stats()["lookups"] == 3
+    assert store.stats()["misses"] == 1
+
+
+def test_unopenable_path_falls_back_to_memory_with_a_warning(
+    tmp_path: Path, caplog: pytest.LogCaptureFixture
+) -> None:
+    blocker = tmp_path / "not-a-dir"
+    blocker.write_text("")
+    store = ProfileStore(str(blocker / "profiles.db"))
+    with caplog.at_level(logging.WARNING, logger="app.profile_store"):
+        store.save("p1", _genes(), True, 3, "v1")
+    assert store.stats()["path"] == ":memory:"
+    assert store.get("p1") is not None
+    assert "cannot be opened" in caplog.text
+    store.close()
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from app import result_cache as result_cache_module
+from app.result_cache import ResultCache
+
+
+def _disk_files(path: Path) -> list:
+    return sorted(p.name for p in path.glob("*.json"))
+
+
+def test_disk_tier_round_trip_reads_off_the_loop(tmp_path: Path) -> None:
+    writer = ResultCache(directory=str(tmp_path))
+    calls = []
+
+    async def compute() -> dict:
+        calls.append(1)
+        return {"value": 1}
+
+    assert asyncio.run(writer.get_or_compute("k", compute)) == {"value": 1}
+    writer.flush()
+    assert len(_disk_files(tmp_path)) == 1
+
+    reader = ResultCache(directory=str(tmp_path))
+    threads = []
+    read_disk = reader._read_disk
+
+    def tracking_read(key: str, now: float):
+        threads.append(threading.current_thread())
+        return read_disk(key, now)
+
+    reader._read_disk = tracking_read  # type: ignore[method-assign]
+    assert asyncio.run(reader.get_or_compute("k", compute)) == {"value": 1}
+    assert calls == [1]
+    assert reader.stats()["disk_hits"] == 1
+    assert threads and threading.main_thread() not in threads
+
+
+def test_disk_eviction_uses_the_index(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # Files left by an earlier run seed the index, oldest first.
+    seed = ResultCache(directory=str(tmp_path), max_disk_entries=10)
+    for n in range(3):
+        seed.put(f"old{n}", n)
+        seed.flush()
+        path = tmp_path / seed._disk_name(f"old{n}")
+        os.utime(path, (time.time() - 100 + n, time.time() - 100 + n))
+
+    scans = []
+    scandir = os.scandir
+    monkeypatch.setattr(
+        result_cache_module.os,
+        "scandir",
+        lambda path: scans.append(path) or scandir(path),
+    )
+    cache = ResultCache(directory=str(tmp_path), max_disk_entries=3)
+    for n in range(3):
+        cache.put(f"new{n}", n)
+    cache.flush()
+
+    assert len(scans) == 1
+    expected = sorted(cache._disk_name(f"new{n}") for n in range(3))
+    assert _disk_files(tmp_path) == expected
+
+
+def test_expired_disk_entries_are_dropped(tmp_path: Path) -> None:
+    cache = ResultCache(directory=str(tmp_path), ttl_seconds=-1)
+    cache.put("k", 1)
+    cache.flush()
+    assert cache._disk_index is not None and len(cache._disk_index) == 1
+
+    assert asyncio.run(cache.aget("k")) is None
+    assert _disk_files(tmp_path) == []
+    assert len(cache._disk_index) == 0
+    assert cache.stats()["misses"] == 1
@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, List
+
+import pytest
+
+from app.risk_engine import assess_risk, assess_risk_bulk
+from app.rule_set import RuleRegistry, RuleSet, compile_rule_set, load_rule_set
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "app" / "data"
+
+
+@pytest.fixture
+def rules_dir(tmp_path: Path) -> Path:
+    for name in ("rule_tables.json", "risk_rules.json"):
+        shutil.copy(DATA_DIR / name, tmp_path / name)
+    return tmp_path
+
+
+def _rewrite(path: Path, **changes: object) -> None:
+    """
+    Replace `path` atomically, as a deployment would, with a new mtime.
+    """
+    data = json.loads(path.read_text())
+    data.update(changes)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(data))
+    stat = path.stat()
+    os.replace(tmp, path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def _risk_rows(path: Path) -> List[Dict[str, object]]:
+    return json.loads(path.read_text())["rules"]
+
+
+def test_shipped_rules_compile() -> None:
+    rules = load_rule_set(DATA_DIR / "rule_tables.json")
+    assert rules.gene_for_drug("codeine") == "CYP2D6"
+    assert rules.phenotype_for("CYP2D6", "*4/*4")[0] == "PM"
+    assert rules.phenotype_for("CYP2D6", "*1/*1")[0] == "NM"
+    assert rules.risk_rule("CODEINE", "PM").risk_label == "Ineffective"
+    assert rules.cache_key.startswith(rules.version + "-")
+
+
+def test_reload_picks_up_rule_table_changes(rules_dir: Path) -> None:
+    registry = RuleRegistry(rules_dir / "rule_tables.json", reload_interval=0)
+    assert not registry.reload_if_changed()
+
+    _rewrite(rules_dir / "rule_tables.json", version="test.2")
+    assert registry.reload_if_changed()
+    assert registry.active.version == "test.2"
+    assert registry.reloads == 1
+
+
+def test_reload_picks_up_risk_table_changes(rules_dir: Path) -> None:
+    registry = RuleRegistry(rules_dir / "rule_tables.json", reload_interval=0)
+    before = registry.active
+    assert before.risk_rule("CODEINE", "PM").risk_label == "Ineffective"
+
+    risk_path = rules_dir / "risk_rules.json"
+    rows = _risk_rows(risk_path)
+    for row in rows:
+        if row["drug"] == "CODEINE" and row["phenotype"] == "PM":
+            row["risk_label"] = "Toxic"
+    _rewrite(risk_path, rules=rows)
+
+    assert registry.reload_if_changed()
+    after = registry.active
+    assert after.risk_rule("CODEINE", "PM").risk_label == "Toxic"
+    assert after.digest != before.digest
+    assert after.cache_key != before.cache_key
+
+
+def test_failed_reload_keeps_current_rules(rules_dir: Path) -> None:
+    registry = RuleRegistry(rules_dir / "rule_tables.json", reload_interval=0)
+    before = registry.active
+
+    risk_path = rules_dir / "risk_rules.json"
+    rows = _risk_rows(risk_path)
+    rows[0]["risk_label"] = "Ineffectve"
+    _rewrite(risk_path, rules=rows)
+
+    assert not registry.reload_if_changed()
+    assert registry.active is before
+    assert registry.reload_failures == 1
+    assert "Ineffectve" in (registry.last_error or "")
+    # Not retried until the files change again.
+    assert not registry.reload_if_changed()
+    assert registry.reload_failures == 1
+
+
+def test_warmups_run_before_the_swap(rules_dir: Path) -> None:
+    registry = RuleRegistry(rules_dir / "rule_tables.json", reload_interval=0)
+    seen: List[str] = []
+
+    def warm(rules: RuleSet) -> None:
+        # The previous version is still active while warming.
+        seen.append(f"{registry.active.version}->{rules.version}")
+
+    registry.add_warmup(warm)
+    old = registry.active.version
+    _rewrite(rules_dir / "rule_tables.json", version="test.3")
+    registry.reload()
+    assert seen == [f"{old}->test.3"]
+
+
+@pytest.mark.parametrize(
+    "field, value",
+    [("risk_label", "Ineffectve"), ("severity", "severe"), ("risk_label", None)],
+)
+def test_compile_rejects_values_outside_the_response_schema(
+    field: str, value: object
+) -> None:
+    tables = json.loads((DATA_DIR / "rule_tables.json").read_text())
+    risk_rules = json.loads((DATA_DIR / "risk_rules.json").read_text())
+    risk_rules["rules"][0][field] = value
+    with pytest.raises(ValueError, match=field):
+        compile_rule_set(tables, risk_rules)
+
+
+def test_compile_rejects_invalid_default() -> None:
+    tables = json.loads((DATA_DIR / "rule_tables.json").read_text())
+    risk_rules = json.loads((DATA_DIR / "risk_rules.json").read_text())
+    risk_rules["default"] = {"risk_label": "Unknown", "severity": "Low"}
+    with pytest.raises(ValueError, match="severity"):
+        compile_rule_set(tables, risk_rules)
+
+
+def test_bulk_scoring_matches_assess_risk() -> None:
+    rules = load_rule_set()
+    phenotypes = sorted(set(rules.phenotype_confidence)) + ["Unknown", "pm", "XYZ"]
+    drugs = sorted(rules.drug_to_gene) + ["codeine", "NOT_A_DRUG"]
+    pairs = [(drug, phenotype) for drug in drugs for phenotype in phenotypes]
+    scored = assess_risk_bulk(
+        [drug for drug, _ in pairs], [phenotype for _, phenotype in pairs], rules
+    )
+    for i, (drug, phenotype) in enumerate(pairs):
+        row = {column: values[i] for column, values in scored.items()}
+        assert row == assess_risk(drug, phenotype, rules), (drug, phenotype)
+
+    with pytest.raises(ValueError):
+        assess_risk_bulk(["CODEINE"], [], rules)
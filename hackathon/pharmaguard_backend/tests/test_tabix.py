@@ -0,0 +1,223 @@
+"""
+Indexed (BGZF + .tbi/.csi) VCF reads checked against a full scan. The
+fixtures are written here following the SAM/tabix/CSI specifications, with
+small BGZF blocks so records and region chunks span block boundaries.
+"""
+
+from __future__ import annotations
+
+import gzip
+import io
+import struct
+import zlib
+from typing import Callable, Dict, List, Tuple
+
+import pytest
+
+from app.gene_rules import PHARMACOGENE_LOCI
+from app.tabix import (
+    TABIX_PRESET_VCF,
+    TBI_DEPTH,
+    TBI_MIN_SHIFT,
+    BgzfReader,
+    iter_region_lines,
+    load_index,
+)
+from app.vcf_parser import iter_indexed_vcf_lines, parse_vcf_lines
+
+# (chrom, pos, rsid, ref, alt, gene, star); OTHER records lie outside every
+# pharmacogene locus.
+RECORDS = [
+    ("1", 5_000, "rs0001", "A", "G", "OTHER", "."),
+    ("1", 97_450_058, "rs3918290", "C", "T", "DPYD", "*2A"),
+    ("10", 1_000, "rs0002", "G", "A", "OTHER", "."),
+    ("10", 94_761_900, "rs12248560", "C", "T", "CYP2C19", "*17"),
+    ("10", 94_781_859, "rs4244285", "G", "A", "CYP2C19", "*2"),
+    ("10", 94_842_866, "rs4986893", "G", "A", "CYP2C19", "*3"),
+    ("10", 94_942_290, "rs1799853", "C", "T", "CYP2C9", "*2"),
+    ("10", 94_981_296, "rs1057910", "A", "C", "CYP2C9", "*3"),
+    ("10", 120_000_000, "rs0003", "T", "C", "OTHER", "."),
+    ("12", 21_178_615, "rs4149056", "T", "C", "SLCO1B1", "*5"),
+    ("22", 42_128_945, "rs16947", "C", "T", "CYP2D6", "*2"),
+    ("22", 42_129_132, "rs1135840", "G", "C", "CYP2D6", "*4"),
+    ("22", 42_130_692, "rs1065852", "GA", "G", "CYP2D6", "*10"),
+    ("22", 50_000_000, "rs0004", "A", "T", "OTHER", "."),
+]
+GENOTYPES = [["0/1"] for _ in RECORDS]
+BLOCK_SIZE = 200  # uncompressed bytes per BGZF block
+
+
+def _bgzf_block(data: bytes) -> bytes:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    payload = compressor.compress(data) + compressor.flush()
+    block_size = 18 + len(payload) + 8
+    header = struct.pack("<4BI2BH", 31, 139, 8, 4, 0, 0, 255, 6)
+    extra = b"BC" + struct.pack("<HH", 2, block_size - 1)
+    trailer = struct.pack("<II", zlib.crc32(data), len(data))
+    return header + extra + payload + trailer
+
+
+def _bgzip(lines: List[bytes]) -> Tuple[bytes, List[Tuple[int, int]]]:
+    """BGZF-compress `lines`, returning the file and each line's offsets."""
+    out = bytearray()
+    block = bytearray()
+    spans: List[Tuple[int, int]] = []
+    for line in lines:
+        begin = (len(out) << 16) | len(block)
+        block += line
+        if len(block) >= BLOCK_SIZE:
+            out += _bgzf_block(bytes(block))
+            block.clear()
+        spans.append((begin, (len(out) << 16) | len(block)))
+    if block:
+        out += _bgzf_block(bytes(block))
+    out += _bgzf_block(b"")  # EOF marker
+    return bytes(out), spans
+
+
+def _reg2bin(beg: int, end: int, min_shift: int, depth: int) -> int:
+    end -= 1
+    level, shift = depth, min_shift
+    first = ((1 << depth * 3) - 1) // 7
+    while level > 0:
+        if beg >> shift == end >> shift:
+            return first + (beg >> shift)
+        level -= 1
+        first -= 1 << level * 3
+        shift += 3
+    return 0
+
+
+def _build_index(
+    vcf: bytes, csi: bool, min_shift: int = TBI_MIN_SHIFT, depth: int = TBI_DEPTH
+) -> Tuple[bytes, bytes]:
+    """BGZF-compress `vcf` and build its .tbi (or .csi) index."""
+    lines = io.BytesIO(vcf).readlines()
+    data, spans = _bgzip(lines)
+
+    names: List[str] = []
+    bins: List[Dict[int, List[List[int]]]] = []
+    linear: List[List[int]] = []
+    for line, (begin, end) in zip(lines, spans):
+        if line.startswith(b"#"):
+            continue
+        cols = line.split(b"\t")
+        chrom = cols[0].decode()
+        if not names or names[-1] != chrom:
+            names.append(chrom)
+            bins.append({})
+            linear.append([])
+        beg0 = int(cols[1]) - 1
+        end0 = beg0 + len(cols[3])
+        chunks = bins[-1].setdefault(_reg2bin(beg0, end0, min_shift, depth), [])
+        if chunks and chunks[-1][1] == begin:
+            chunks[-1][1] = end
+        else:
+            chunks.append([begin, end])
+        ioffs = linear[-1]
+        last_window = (end0 - 1) >> min_shift
+        while len(ioffs) <= last_window:
+            ioffs.append(-1)
+        for window in range(beg0 >> min_shift, last_window + 1):
+            if ioffs[window] == -1:
+                ioffs[window] = begin
+
+    raw_names = b"".join(name.encode() + b"\x00" for name in names)
+    aux = struct.pack("<7i", TABIX_PRESET_VCF, 1, 2, 0, ord("#"), 0, len(raw_names))
+    aux += raw_names
+    if csi:
+        index = b"CSI\x01" + struct.pack("<3i", min_shift, depth, len(aux)) + aux
+        index += struct.pack("<i", len(names))
+    else:
+        index = b"TBI\x01" + struct.pack("<i", len(names)) + aux
+    for ref_bins, ioffs in zip(bins, linear):
+        index += struct.pack("<i", len(ref_bins))
+        for bin_id, chunks in sorted(ref_bins.items()):
+            if csi:
+                index += struct.pack("<IQi", bin_id, chunks[0][0], len(chunks))
+            else:
+                index += struct.pack("<Ii", bin_id, len(chunks))
+            for begin, end in chunks:
+                index += struct.pack("<QQ", begin, end)
+        if not csi:
+            previous = 0
+            for n, offset in enumerate(ioffs):
+                # Empty windows point at the previous record, as htslib does.
+                ioffs[n] = previous = offset if offset != -1 else previous
+            index += struct.pack("<i", len(ioffs))
+            index += struct.pack(f"<{len(ioffs)}Q", *ioffs)
+    return data, _bgzf_block(index) + _bgzf_block(b"")
+
+
+@pytest.fixture
+def vcf(make_vcf: Callable[..., bytes]) -> bytes:
+    return make_vcf(RECORDS, GENOTYPES)
+
+
+def _full_scan(vcf: bytes):
+    return parse_vcf_lines(vcf.decode().splitlines())
+
+
+@pytest.mark.parametrize(
+    "csi, min_shift, depth", [(False, TBI_MIN_SHIFT, TBI_DEPTH), (True, 12, 6)]
+)
+def test_indexed_parse_matches_full_scan(
+    vcf: bytes, csi: bool, min_shift: int, depth: int
+) -> None:
+    data, index = _build_index(vcf, csi, min_shift, depth)
+    assert load_index(index).is_csi is csi
+    # The fixture is a valid multi-member gzip file as well.
+    assert gzip.decompress(data) == vcf
+
+    lines = list(iter_indexed_vcf_lines(io.BytesIO(data), index, PHARMACOGENE_LOCI))
+    # Only the loci are read: records elsewhere never come back.
+    assert not [line for line in lines if "GENE=OTHER" in line]
+    indexed = parse_vcf_lines(lines)
+    has_header, variants = _full_scan(vcf)
+    assert indexed[0] == has_header
+    assert list(indexed[1]) == list(variants)
+    assert len(variants) == sum(1 for r in RECORDS if r[5] != "OTHER")
+
+
+@pytest.mark.parametrize("csi", [False, True])
+@pytest.mark.parametrize(
+    "chrom, start, end",
+    [
+        ("10", 94_761_900, 94_781_859),  # both ends on a record
+        ("10", 94_781_860, 94_842_865),  # between records
+        ("chr10", 1, 200_000_000),  # whole contig, "chr" prefix
+        ("22", 42_130_693, 42_130_693),  # inside a two-base REF
+        ("1", 5_001, 97_450_057),
+        ("X", 1, 1_000_000),  # contig not in the index
+    ],
+)
+def test_region_query_matches_filtered_scan(
+    vcf: bytes, csi: bool, chrom: str, start: int, end: int
+) -> None:
+    data, index = _build_index(vcf, csi)
+    reader = BgzfReader(io.BytesIO(data))
+    found = [
+        line.decode()
+        for _offset, line in iter_region_lines(
+            reader, load_index(index), chrom, start, end
+        )
+    ]
+    expected = [
+        line + "\n"
+        for line in vcf.decode().splitlines()
+        if not line.startswith("#")
+        and line.split("\t")[0] == chrom.replace("chr", "")
+        and int(line.split("\t")[1]) <= end
+        and int(line.split("\t")[1]) + len(line.split("\t")[3]) - 1 >= start
+    ]
+    assert found == expected
+
+
+def test_invalid_index_is_rejected(vcf: bytes) -> None:
+    data, index = _build_index(vcf, csi=False)
+    with pytest.raises(ValueError):
+        load_index(gzip.compress(b"BAI\x01"))
+    with pytest.raises(ValueError):
+        load_index(gzip.decompress(index))
+    with pytest.raises(ValueError):
+        load_index(gzip.compress(gzip.decompress(index)[:20]))
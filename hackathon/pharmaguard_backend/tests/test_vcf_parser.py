@@ -0,0 +1,130 @@
+"""
+Every VCF parse path (screened chunks and buffers, gzip, spooled files,
+offset replay) must give the same variants, and therefore the same
+phenotype calls, as decoding the whole file.
+"""
+
+from __future__ import annotations
+
+import gzip
+import io
+import tempfile
+from typing import Callable, Dict, List, Tuple
+
+import pytest
+
+from app.gene_rules import SUPPORTED_GENES
+from app.parse_executor import parse_vcf_source
+from app.phenotype_mapper import determine_gene_phenotype
+from app.vcf_parser import (
+    VariantTable,
+    parse_vcf_buffer,
+    parse_vcf_buffer_offsets,
+    parse_vcf_lines,
+    parse_vcf_offsets,
+    screen_vcf_chunks,
+)
+
+RECORDS = [
+    ("22", 42128945, "rs16947", "C", "T", "CYP2D6", "*2"),
+    ("22", 42129132, "rs1135840", "G", "C", "CYP2D6", "*4"),
+    ("10", 94761900, "rs12248560", "C", "T", "CYP2C19", "*17"),
+    ("10", 94781859, "rs4244285", "G", "A", "CYP2C19", "*2"),
+    ("10", 94942290, "rs1799853", "C", "T,G", "CYP2C9", "*2"),
+    ("12", 21178615, "rs4149056", "T", "C", "SLCO1B1", "*5"),
+    ("6", 18143724, "rs1142345", "T", "C", "TPMT", "*3C"),
+    ("1", 97450058, "rs3918290", "C", "T", "DPYD", "*2A"),
+    ("1", 5000, "rs0001", "A", "G", "OTHER", "."),
+]
+GENOTYPES = [
+    [gt] for gt in ("0/1", "1|1", "0/0", "1/1", "0/1", "./.", "0|1", "0/1", "0/1")
+]
+
+
+def _tricky_vcf(make_vcf: Callable[..., bytes]) -> bytes:
+    """
+    A VCF exercising the screening edge cases: non-ASCII and CRLF lines, a
+    lower-case gene, a gene name outside GENE=, and a line longer than the
+    small windows and chunks used below.
+    """
+    lines = make_vcf(RECORDS, GENOTYPES).decode().splitlines(keepends=True)
+    lines.insert(1, "##source=Laboratoire génétique\n")
+    lines[2] = lines[2].replace("\n", "\r\n")
+    lines[3] = lines[3].replace("GENE=CYP2D6", "GENE=cyp2d6")
+    lines[4] = lines[4].replace("\n", "\r\n")
+    lines[-1] = lines[-1].replace("GENE=OTHER", "NEAR=cyp2c19;GENE=OTHER")
+    lines[-2] = lines[-2].replace("STAR=*2A", "STAR=*2A;NOTE=" + "x" * 300)
+    return "".join(lines).encode()
+
+
+def _chunks(data: bytes, size: int) -> List[bytes]:
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+def _full_decode(vcf: bytes) -> Tuple[bool, VariantTable]:
+    return parse_vcf_lines(vcf.decode().splitlines())
+
+
+def _spooled(data: bytes) -> Tuple[bool, VariantTable]:
+    with tempfile.TemporaryFile() as fh:
+        fh.write(data)
+        fh.flush()
+        return parse_vcf_source(fh, False)
+
+
+def _parse_paths(data: bytes) -> Dict[str, Tuple[bool, VariantTable]]:
+    has_header, variants, offsets = parse_vcf_buffer_offsets(data, window=64)
+    replayed = parse_vcf_offsets(data, [o for g in offsets.values() for o in g])
+    assert replayed is not None
+    return {
+        "buffer": parse_vcf_buffer(data),
+        "buffer_small_windows": parse_vcf_buffer(data, window=64),
+        "chunks_1": parse_vcf_lines(screen_vcf_chunks(_chunks(data, 1))),
+        "chunks_7": parse_vcf_lines(screen_vcf_chunks(_chunks(data, 7))),
+        "bytes_source": parse_vcf_source(data, False),
+        "gzip_source": parse_vcf_source(io.BytesIO(gzip.compress(data)), True),
+        "spooled_file": _spooled(data),
+        "buffer_offsets": (has_header, variants),
+        "offset_replay": (True, replayed),
+    }
+
+
+@pytest.fixture(params=["sample", "tricky"])
+def vcf(
+    request: pytest.FixtureRequest,
+    sample_vcf: bytes,
+    make_vcf: Callable[..., bytes],
+) -> bytes:
+    return sample_vcf if request.param == "sample" else _tricky_vcf(make_vcf)
+
+
+def test_parse_paths_match_full_decode(vcf: bytes) -> None:
+    expected_header, expected = _full_decode(vcf)
+    assert len(expected)
+    for name, (has_header, variants) in _parse_paths(vcf).items():
+        assert has_header == expected_header, name
+        assert list(variants) == list(expected), name
+
+
+def test_tricky_vcf_variants(make_vcf: Callable[..., bytes]) -> None:
+    _, variants = _full_decode(_tricky_vcf(make_vcf))
+    # Non-carried and non-pharmacogene records are dropped; multi-allelic
+    # sites keep their first ALT.
+    assert [v.rsid for v in variants] == [
+        "rs16947",
+        "rs1135840",
+        "rs4244285",
+        "rs1799853",
+        "rs1142345",
+        "rs3918290",
+    ]
+    assert variants[3].alt == "T"
+
+
+def test_phenotypes_match_across_parse_paths(vcf: bytes) -> None:
+    _, expected = _full_decode(vcf)
+    calls = {gene: determine_gene_phenotype(gene, expected) for gene in SUPPORTED_GENES}
+    for name, (_, variants) in _parse_paths(vcf).items():
+        for gene in SUPPORTED_GENES:
+            call = determine_gene_phenotype(gene, variants)
+            assert call == calls[gene], (name, gene)